@@ -0,0 +1,160 @@
+"""
+Batched staple analytics.
+
+All staples are handled in one NumPy pass: sequences are one flat array of base
+indices with offsets (see sequences.encode), staple paths one flat array of base
+indices, see StrandIndex.flat_paths. Every function returns one value per staple.
+
+Example
+-------
+metrics = sequence_metrics([row[-1] for row in sorted_stap_output_ra])
+metrics['tm']
+>>>> array([ 71.2,  68.9, ...])
+"""
+
+import numpy as np
+
+import sequences
+
+# Index of A, C, G and T, 4 for every other character.
+BASE_INDEX = np.full(256, 4, dtype=np.int64)
+for _i, _bases in enumerate([b'Aa', b'Cc', b'Gg', b'Tt']):
+    BASE_INDEX[np.frombuffer(_bases, dtype=np.uint8)] = _i
+
+# SantaLucia (1998) unified nearest-neighbor parameters, dH in kcal/mol and dS in cal/(K mol),
+# indexed by 5*first + second base of a 5' to 3' dinucleotide, 0 for pairs with other characters.
+_NEAREST_NEIGHBORS = {'AA': (-7.9, -22.2), 'TT': (-7.9, -22.2), 'AT': (-7.2, -20.4), 'TA': (-7.2, -21.3),
+                      'CA': (-8.5, -22.7), 'TG': (-8.5, -22.7), 'GT': (-8.4, -22.4), 'AC': (-8.4, -22.4),
+                      'CT': (-7.8, -21.0), 'AG': (-7.8, -21.0), 'GA': (-8.2, -22.2), 'TC': (-8.2, -22.2),
+                      'CG': (-10.6, -27.2), 'GC': (-9.8, -24.4), 'GG': (-8.0, -19.9), 'CC': (-8.0, -19.9)}
+NN_ENTHALPY = np.zeros(25)
+NN_ENTROPY = np.zeros(25)
+for _pair, (_dh, _ds) in _NEAREST_NEIGHBORS.items():
+    NN_ENTHALPY[5*'ACGT'.index(_pair[0]) + 'ACGT'.index(_pair[1])] = _dh
+    NN_ENTROPY[5*'ACGT'.index(_pair[0]) + 'ACGT'.index(_pair[1])] = _ds
+# Initiation per terminal base, A/T or G/C.
+INIT_AT = (2.3, 4.1)
+INIT_GC = (0.1, -2.8)
+GAS_CONSTANT = 1.987
+
+
+def encode_bases(staple_seqs):
+    """
+    Returns the base indices (0-3 for ACGT, 4 otherwise) and offsets of a list of str.
+    """
+    codes, offsets = sequences.encode(staple_seqs)
+    return BASE_INDEX[codes], offsets
+
+
+def gc_fraction(bases, offsets):
+    """ Returns the GC fraction of every sequence, nan for empty sequences. """
+    lengths = np.diff(offsets)
+    gc_counts = np.bincount(sequences.segment_ids(offsets), weights=(bases == 1) | (bases == 2),
+                            minlength=len(lengths))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return gc_counts / lengths
+
+
+def nearest_neighbor_tm(bases, offsets, na=50.0, mg=12.5, strand_conc=1e-7):
+    """
+    Returns the nearest-neighbor melting temperature in degrees C of every sequence.
+
+    Parameters
+    ----------
+    bases, offsets : array_like
+        see encode_bases
+    na, mg : float
+        the Na+ and Mg2+ concentrations in mM, Mg2+ counts as 120*sqrt(mg) mM Na+
+    strand_conc : float
+        the total strand concentration in M
+
+    Returns
+    -------
+    tm : array_like
+        nan for empty sequences
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_seqs = len(offsets) - 1
+    lengths = np.diff(offsets)
+    segments = sequences.segment_ids(offsets)
+    # Dinucleotide p is bases p and p + 1, unless p is the last base of its sequence.
+    pairs = 5*bases[:-1] + bases[1:]
+    in_seq = segments[:-1] == segments[1:] if len(bases) else np.zeros(0, dtype=bool)
+    enthalpy = np.bincount(segments[:-1], weights=NN_ENTHALPY[pairs]*in_seq, minlength=num_seqs)
+    entropy = np.bincount(segments[:-1], weights=NN_ENTROPY[pairs]*in_seq, minlength=num_seqs)
+    nonempty = lengths > 0
+    for ends in (offsets[:-1][nonempty], offsets[1:][nonempty] - 1):
+        enthalpy[nonempty] += init_enthalpy(bases[ends])
+        entropy[nonempty] += init_entropy(bases[ends])
+    tm = melting_temperature(enthalpy, entropy, lengths, na, mg, strand_conc)
+    tm[~nonempty] = np.nan
+    return tm
+
+
+def init_enthalpy(end_bases):
+    """ Returns the initiation enthalpy of terminal bases, see INIT_AT and INIT_GC. """
+    return np.where((end_bases == 0) | (end_bases == 3), INIT_AT[0], INIT_GC[0])
+
+
+def init_entropy(end_bases):
+    """ Returns the initiation entropy of terminal bases, see INIT_AT and INIT_GC. """
+    return np.where((end_bases == 0) | (end_bases == 3), INIT_AT[1], INIT_GC[1])
+
+
+def melting_temperature(enthalpy, entropy, lengths, na=50.0, mg=12.5, strand_conc=1e-7):
+    """
+    Returns the melting temperature in degrees C from the summed nearest-neighbor and
+    initiation enthalpy and entropy of sequences, with the salt correction of their lengths,
+    see nearest_neighbor_tm.
+    """
+    sodium = (na + 120*np.sqrt(mg))/1000.0
+    entropy = entropy + 0.368*np.maximum(lengths - 1, 0)*np.log(sodium)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 1000*enthalpy/(entropy + GAS_CONSTANT*np.log(strand_conc/4)) - 273.15
+
+
+def sequence_metrics(staple_seqs, **kwargs):
+    """
+    Returns the 'length', 'gc' fraction and nearest-neighbor 'tm' of every sequence.
+
+    Parameters
+    ----------
+    staple_seqs : list
+        str, e.g. the sequences that give_sequences produces
+    kwargs
+        passed on to nearest_neighbor_tm
+    """
+    bases, offsets = encode_bases(staple_seqs)
+    return {'length': np.diff(offsets), 'gc': gc_fraction(bases, offsets),
+            'tm': nearest_neighbor_tm(bases, offsets, **kwargs)}
+
+
+def path_metrics(design):
+    """
+    Returns the metrics of the staple paths of a design, in the order of strands.keys(circular=False).
+
+    Returns
+    -------
+    metrics : dict
+        'longest_domain': the most nucleotides on one helix between two crossovers,
+        'num_domains': the number of these domains,
+        'sticky_ends': the number of ends, 0, 1 or 2, that do not pair with the scaffold.
+    """
+    order, offsets = design.strands('stap').flat_paths(circular=False)
+    num_staples = len(offsets) - 1
+    helices, bases = np.divmod(order, design.num_bases)
+    staples = sequences.segment_ids(offsets)
+    # A domain ends where the staple leaves the helix or ends.
+    new_domain = np.ones(len(order), dtype=bool)
+    new_domain[1:] = (staples[1:] != staples[:-1]) | (helices[1:] != helices[:-1]) | (np.abs(np.diff(bases)) != 1)
+    domains = np.cumsum(new_domain) - 1
+    nucleotides = (1 + design.skip.astype(np.int64) + design.loop).ravel()[order]
+    domain_lengths = np.bincount(domains, weights=nucleotides).astype(np.int64) if len(order) else np.zeros(0, np.int64)
+    longest_domain = np.zeros(num_staples, dtype=np.int64)
+    np.maximum.at(longest_domain, staples[new_domain], domain_lengths)
+    unpaired = (design.scaf.reshape(-1, 4)[order] == -1).all(axis=1)
+    nonempty = np.diff(offsets) > 0
+    sticky_ends = np.zeros(num_staples, dtype=np.int64)
+    sticky_ends[nonempty] = unpaired[offsets[:-1][nonempty]].astype(np.int64) + unpaired[offsets[1:][nonempty] - 1]
+    return {'longest_domain': longest_domain, 'num_domains': np.bincount(staples[new_domain], minlength=num_staples),
+            'sticky_ends': sticky_ends}
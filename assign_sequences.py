@@ -5,30 +5,48 @@
 
 # In[5]:
 
+from __future__ import print_function
+
+import argparse
+import concurrent.futures
+import contextlib
+import os
 import sys
+import time
 import pickle
 import copy             # !! Not used
-import json
+
+import numpy as np
+
+import cache
+import handles
+import instrumentation
+import rotations
+import seqlib
+import sequences
+import session
 
 ## !! DEFINE MODULE LEVEL CONSTANTS AT THE TOP.
 
-def load_json(file_name, period=32):
+def load_json(file_name, period=None):
     """
     Loads a .json file in the correct way, so it can still be read by cadnano2.
+    Designs that were loaded or saved before are read from the binary cache, see cache.load_design.
+    While an instrumentation recorder is active, the time and memory of the load are printed.
 
     Parameters
     ----------
     file_name : str
         The name and location of the *.json file
     period : int
-        The period of repeating segments of the staples, in the square lattice this is by default 32.
+        The period of repeating segments of the staples, by default 32 in the square and 21 in the honeycomb lattice.
 
     Returns
     -------
-    data : list
-        all data that is loaded from the *.json file
+    data : Design
+        all data that is loaded from the *.json file, stored in int32 arrays
     vstrands : list
-        vstrands data
+        vstrands data, vstrands[i]['stap'] etc. are views on the arrays of data, write to them in data.editing()
     num_helices : int
         number of helices in the design
     num_bases : int
@@ -41,18 +59,12 @@ def load_json(file_name, period=32):
     -------
     data, vstrands, num_helices, num_bases, idx, polarity, per = load_json('ruler_design_12nov_1353.json')
     """
-    with open(file_name) as f:
-        data = json.load(f)
-
-    vstrands = data['vstrands']     # !! vstrands also in outer script.
-    num_helices = len(vstrands)
-    num_bases = len(vstrands[0]['scaf'])
-    idx = {} #Generate dictionary for translating helix_num to vstrand_num
-    polarity = {}
-    for helix_num in range(num_helices):
-        idx[vstrands[helix_num]['num']] = helix_num
-        polarity[helix_num] = vstrands[idx[helix_num]]['col'] + vstrands[idx[helix_num]]['row']
-    return data, vstrands, num_helices, num_bases, idx, polarity, period, file_name
+    data = cache.load_design(file_name, period, lattice=lattice)
+    if instrumentation.enabled():
+        print(data.load_report(file_name))
+    vstrands = data.vstrands     # !! vstrands also in outer script.
+    #data.idx is the dictionary for translating helix_num to vstrand_num
+    return data, vstrands, data.num_helices, data.num_bases, data.idx, data.polarity, data.period, file_name
 
 def save_json(file_name):
     """
@@ -63,22 +75,15 @@ def save_json(file_name):
     file_name : str
         The name and location of the *.json file
     """
-    data['vstrands'] = vstrands     # !! Accessing global variables
-    with open(file_name, 'wb') as outfile:
-        json.dump(data, outfile)
+    cache.save_design(data, file_name)     # !! Accessing global variables
 
 
 def comp_seq_FN(raw_sequence):
     """
     Returns the complementary sequence and makes all characters in uppercase.
+    Characters other than ACGT are left out, use sequences.reverse_complement_batch for many sequences at once.
     """
-    uppercase = {'a':'A', 'A':'A', 'c':'C', 'C':'C', 'g':'G', 'G':'G', 't':'T', 'T':'T'}
-    complement = {'a':'T', 'A':'T', 'c':'G', 'C':'G', 'g':'C', 'G':'C', 't':'A', 'T':'A'}
-    antisense_seq = ''
-    for letter in raw_sequence:
-        if letter in uppercase:
-            antisense_seq = complement[letter] + antisense_seq
-    return antisense_seq
+    return sequences.reverse_complement(raw_sequence)
 
 def stap_color_string_FN(stap_color_int):
     return color_dc[stap_color_int]          # !! Accessing global variables
@@ -92,187 +97,249 @@ def initVars():
     stap_color_dc, null_bp = initVars()
     """
     null_bp = [-1, -1]       # !! Redefining global variables
-    # Do this in a single statement:
-    stap_color_dc  = {}
-    stap_color_dc[13369344] = 'red'
-    stap_color_dc[16204552] = 'red orange'
-    stap_color_dc[16225054] = 'light orange'
-    stap_color_dc[11184640] = 'olive'
-    stap_color_dc[5749504]  = 'light green'
-    stap_color_dc[29184]    = 'dark green'
-    stap_color_dc[243362]   = 'cyan'
-    stap_color_dc[1507550]  = 'blue'
-    stap_color_dc[7536862]  = 'purple'
-    stap_color_dc[12060012] = 'magenta'
-    stap_color_dc[3355443]  = 'dark gray'
-    stap_color_dc[8947848]  = 'light gray'
+    stap_color_dc = dict(session.COLOR_NAMES)
     return stap_color_dc, null_bp
 
 def openPickledFile(f):
-    """ Loads a pickled file """
-    input_file = file(f, 'r')       # DONT USE file() !!
-    loaded_txt = pickle.load(input_file)
-    input_file.close()
+    """ Loads a pickled file, use seqlib.open_library for the sequence libraries. """
+    with open(f, 'rb') as input_file:
+        loaded_txt = pickle.load(input_file, encoding='latin1')
     return loaded_txt
 
 def openFile(f):
     """" Opens a txt file in standard format. """
-    input_file = file(f, 'r')       # DONT USE file() !!
-    loaded_txt = input_file.read()
-    input_file.close()
+    with open(f) as input_file:
+        loaded_txt = input_file.read()
     return loaded_txt
 
+def sequencing_session(cadnano_file, scaffold_seq=None):
+    """
+    Returns a session.DesignSession of a design with the settings of this script.
+
+    Parameters
+    ----------
+    cadnano_file : str
+    scaffold_seq : str
+        the rotated maxiscaf sequence, by default maxiscaf_seq
+    """
+    return session.DesignSession.load(cadnano_file, lattice=lattice,
+                                      on_lattice_length=on_lattice_xover_scaf_loop_length,
+                                      off_lattice_length=off_lattice_xover_scaf_loop_length,
+                                      no_loop_exceptions=no_loop_exception_ra, seq_library=seq_dc,
+                                      scaffold_seq=maxiscaf_seq if scaffold_seq is None else scaffold_seq,
+                                      scaffold_name=maxiscaf_seq_filename, color_names=stap_color_dc)
+
 def give_sequences(cadnano_file):
-    data, vstrands, num_vstrands, num_helix_bases, idx, polarity, per, json_f = load_json(cadnano_file)
-    seq_counter_dc = {}
-    for seq_length in seq_dc.keys():
-            seq_counter_dc[seq_length] = 0
-
-    #Generate arrays for stap paths and scaf paths
-    scaf_path_ra = []
-    stap_path_ra = []
-    for vstrand_num in range(num_vstrands):
-        for helix_base_num in range(num_helix_bases):
-            for [parity, path_ra] in [['scaf', scaf_path_ra], ['stap', stap_path_ra]]:
-                [prev_helix_num, prev_helix_base_num, next_helix_num, next_helix_base_num] = vstrands[vstrand_num][parity][helix_base_num]
-                if ([prev_helix_num, prev_helix_base_num] == null_bp) and ([next_helix_num, next_helix_base_num] != null_bp):
-                    sub_ra = []
-                    curr_helix_num, curr_helix_base_num = vstrands[vstrand_num]['num'], helix_base_num
-                    end_of_strand = False
-                    while not end_of_strand:
-                        sub_ra.append([curr_helix_num, curr_helix_base_num])
-                        [curr_helix_num, curr_helix_base_num] = vstrands[idx[curr_helix_num]][parity][curr_helix_base_num][2:]
-                        end_of_strand = [curr_helix_num, curr_helix_base_num] == null_bp
-                    path_ra.append(sub_ra)
-
-    #Determine length of maxiscaf
-    maxiscaf_path_ra = []
-    for sub_ra in scaf_path_ra:
-        if len(sub_ra) > len(maxiscaf_path_ra):
-            maxiscaf_path_ra = sub_ra
-    maxiscaf_length = 0
-    for [helix_num, helix_base_num] in maxiscaf_path_ra:
-        maxiscaf_length += 1 + vstrands[idx[helix_num]]['skip'][helix_base_num] + vstrands[idx[helix_num]]['loop'][helix_base_num]
-        if vstrands[idx[helix_num]]['scaf'][helix_base_num][2] not in [helix_num, -1]:
-            if square_lattice and [helix_num, helix_base_num] not in no_loop_exception_ra:
-                if (helix_base_num - helix_num%2)%8 == 7:
-                    maxiscaf_length += on_lattice_xover_scaf_loop_length
-                else:
-                    maxiscaf_length += off_lattice_xover_scaf_loop_length
-
-    if len(maxiscaf_seq) < maxiscaf_length:
-        print "Error: ", maxiscaf_seq_filename, "only has ", len(maxiscaf_seq), "bases, whereas", maxiscaf_length, "bases are required for", json_filename, "."
+    """
+    Assigns sequences to a design and prints the sequence of every helix, see session.DesignSession.give_sequences.
+
+    Returns
+    -------
+    scaf_output_ra, sorted_stap_output_ra : StrandTable
+    vstrands : list
+    """
+    design_session = sequencing_session(cadnano_file)
+    if instrumentation.enabled():
+        print(design_session.design.load_report(cadnano_file))
+    try:
+        scaf_output_ra, sorted_stap_output_ra = design_session.give_sequences()
+    except session.ScaffoldTooShort as error:
+        print(error)
         sys.exit()
+    return scaf_output_ra, sorted_stap_output_ra, design_session.vstrands
 
-    print "According to", json_f, ", the maxiscaf length should be", maxiscaf_length
-    print "The maxiscaf sequence length in ", maxiscaf_seq_filename, "is", len(maxiscaf_seq)
-    seq_dc[maxiscaf_length] = [maxiscaf_seq]
-    seq_counter_dc[maxiscaf_length] = 0
-    print
-
-    #Assign scaf base sequences
-    sub_ra = ['.' for i in range(num_helix_bases)]
-    scaf_base_seq_dc = {}
-    for vstrand_num in range(num_vstrands):
-        scaf_base_seq_dc[vstrands[vstrand_num]['num']] = sub_ra[:]
-    for sub_ra in scaf_path_ra:
-        seq_length = 0
-        for [helix_num, helix_base_num] in sub_ra:
-            seq_length += 1 + vstrands[idx[helix_num]]['skip'][helix_base_num] + vstrands[idx[helix_num]]['loop'][helix_base_num]
-            if vstrands[idx[helix_num]]['scaf'][helix_base_num][2] not in [helix_num, -1]:
-                if square_lattice and [helix_num, helix_base_num] not in no_loop_exception_ra:
-                    if (helix_base_num - helix_num%2)%8 == 7:
-                        seq_length += on_lattice_xover_scaf_loop_length
-                    else:
-                        seq_length += off_lattice_xover_scaf_loop_length
-        seq = seq_dc[seq_length][seq_counter_dc[seq_length]]
-        seq_counter_dc[seq_length] += 1
-        seq_pointer = 0
-        for [helix_num, helix_base_num] in sub_ra:
-            base_length = 1 + vstrands[idx[helix_num]]['skip'][helix_base_num] + vstrands[idx[helix_num]]['loop'][helix_base_num]
-            scaf_base_seq_dc[helix_num][helix_base_num] = seq[seq_pointer:seq_pointer + base_length]
-            seq_pointer += base_length
-            if vstrands[idx[helix_num]]['scaf'][helix_base_num][2] not in [helix_num, -1]:
-                if square_lattice and [helix_num, helix_base_num] not in no_loop_exception_ra:
-                    if (helix_base_num - helix_num%2)%8 == 7:
-                        seq_pointer += on_lattice_xover_scaf_loop_length
-                    else:
-                        seq_pointer += off_lattice_xover_scaf_loop_length
-
-    #Print vstrand sequences
-    for vstrand_num in range(num_vstrands):
-        helix_num = vstrands[vstrand_num]['num']
-        if helix_num < 10:
-            helix_num_string = '0' + str(helix_num)
+def print_sequences():
+    session.print_tables(scaf_output_ra, sorted_stap_output_ra)     # !! Accessing global variables
+
+def check_handles(handle_dc, k=8):
+    """
+    Checks the handles for complementary stretches of k or more bases to the maxiscaf sequence,
+    the staples in sorted_stap_output_ra and each other, and prints a warning for every stretch.
+
+    Parameters
+    ----------
+    handle_dc : dict
+        maps a name to every handle sequence
+    k : int
+        the shortest complementary stretch that is reported
+
+    Returns
+    -------
+    hits : list
+        see crosstalk.KmerIndex.complements
+    """
+    return session.print_crosstalk(handle_dc, sorted_stap_output_ra, maxiscaf_seq, k)     # !! Accessing global variables
+
+def read_maxiscaf_seq(file_name):
+    """ Reads the maxiscaf sequence, in uppercase and without characters other than ACGT. """
+    return comp_seq_FN(comp_seq_FN(openFile(file_name)))
+
+def rotate_seq(seq, offset):
+    """
+    Returns the sequence that starts at base offset of seq and continues at its start.
+
+    Example
+    -------
+    rotate_seq('ACGTT', 2)
+    >>>> 'GTTAC'
+    """
+    offset %= max(len(seq), 1)
+    return seq[offset:] + seq[:offset]
+
+def parse_offsets(offset_strings):
+    """
+    Parses rotation offsets like '30' or 'start:stop[:step]'.
+
+    Example
+    -------
+    parse_offsets(['30', '0:100:50'])
+    >>>> [30, 0, 50]
+    """
+    offsets = []
+    for offset_string in offset_strings:
+        if ':' in offset_string:
+            offsets.extend(range(*[int(part) for part in offset_string.split(':')]))
         else:
-            helix_num_string = str(helix_num)
-        print helix_num_string, ''.join(scaf_base_seq_dc[helix_num])
-
-    #Set up stap_color_ra to help with matching caDNAno colors to staple strands
-    sub_ra = [-1 for i in range(num_helix_bases)]
-    stap_color_ra = [sub_ra[:] for vstrand_num in range(num_vstrands)]
-    for vstrand_num in range(num_vstrands):
-        for [helix_base_num, stap_color_int] in vstrands[vstrand_num]['stap_colors']:
-            stap_color_ra[vstrand_num][helix_base_num] = stap_color_int
-
-    #Generate staple strand output
-    stap_output_ra = []
-    for sub_ra in stap_path_ra:
-        seq = ''
-        for [helix_num, helix_base_num] in sub_ra:
-            seq += comp_seq_FN(scaf_base_seq_dc[helix_num][helix_base_num])
-        start_pointer = sub_ra[0]
-        end_pointer = sub_ra[-1]
-        [first_helix_num, first_helix_base_num] = start_pointer
-        stap_color_int = stap_color_ra[idx[first_helix_num]][first_helix_base_num]
-        stap_output_ra.append([stap_color_dc[stap_color_int], len(seq), start_pointer, end_pointer, seq])
-
-    #Generate scaffold strand output
-    scaf_output_ra = []
-    for sub_ra in scaf_path_ra:
-        seq = ''
-        for [helix_num, helix_base_num] in sub_ra:
-            seq += scaf_base_seq_dc[helix_num][helix_base_num]
-        start_pointer = sub_ra[0]
-        end_pointer = sub_ra[-1]
-        scaf_output_ra.append([len(seq), start_pointer, end_pointer, seq])
-
-
-    #Sort staple strands according to caDNAno color
-    sorted_stap_output_ra = sorted(stap_output_ra, key = lambda stap_output:stap_output[0])
-    return scaf_output_ra, sorted_stap_output_ra, vstrands
+            offsets.append(int(offset_string))
+    return offsets
 
-def print_sequences():
-    print
-    print
-    #Print sorted staple strand sequences with annotations
-    for sub_ra in sorted_stap_output_ra:
-        seq = sub_ra[-1]
-        note = 'stap strand\t' + str(sub_ra[0]) + '\t' + str(sub_ra[1]) + 'mer\t' + str(sub_ra[2]) + '\t' + 'start\t' + str(sub_ra[3]) + '\t' + 'end'
-        seq_note = seq + '\t' + note
-        print seq_note
-
-    #Print short scaffold-parity strand sequences with annotations
-    for sub_ra in scaf_output_ra:
-        seq = sub_ra[-1]
-        if len(seq) < 100:
-            note = ' short scaf strand\t' + str(sub_ra[0]) + 'mer\t' + str(sub_ra[1]) + '\t' + 'start\t' + str(sub_ra[2]) + '\t' + 'end'
-            seq_note = seq + '\t' + note
-            print seq_note
-
-    #Print additional miscellaneous information
-    num_stap_bases = 0
-    for sub_ra in sorted_stap_output_ra:
-        seq = sub_ra[-1]
-        num_stap_bases += len(seq)
-    print "number of stap bases is", num_stap_bases
-
-
-    num_short_scaf_bases = 0
-    for sub_ra in scaf_output_ra[1:]:
-        seq = sub_ra[-1]
-        num_short_scaf_bases += len(seq)
-    print "number of short scaf bases is", num_short_scaf_bases
+def init_worker(library_file, scaffold_seq):
+    """
+    Sets the globals of a batch worker, the sequence library is memory-mapped so all
+    workers share its pages with the OS page cache.
+    """
+    global seq_dc, maxiscaf_base_seq
+    seq_dc = seqlib.SequenceLibrary(library_file)
+    maxiscaf_base_seq = scaffold_seq
+
+def run_job(job):
+    """
+    Assigns sequences to one design with one rotation of the maxiscaf sequence and
+    writes everything give_sequences and print_sequences print to output_file.
+
+    Parameters
+    ----------
+    job : tuple
+        (cadnano_file, offset, output_file)
+
+    Returns
+    -------
+    job, error : tuple, str
+        error is None when the job succeeded
+    """
+    cadnano_file, offset, output_file = job
+    error = None
+    with open(output_file, 'w') as f:
+        with contextlib.redirect_stdout(f):
+            try:
+                design_session = sequencing_session(cadnano_file, rotate_seq(maxiscaf_base_seq, offset))
+                design_session.give_sequences()
+                design_session.print_sequences()
+            except session.ScaffoldTooShort as e:
+                print(e)
+                error = 'the maxiscaf sequence is too short, see ' + output_file
+            except Exception as e:
+                error = '%s: %s' % (type(e).__name__, e)
+    return job, error
+
+def scan_offsets(cadnano_file, scaffold_seq, num=10, **kwargs):
+    """
+    Scores all rotation offsets of the maxiscaf sequence for a design, see rotations.scan_rotations.
+
+    Parameters
+    ----------
+    cadnano_file : str
+    scaffold_seq : str
+        the maxiscaf sequence before rotation
+    num : int
+        number of best offsets that are returned
+    kwargs
+        passed on to rotations.scan_rotations, e.g. gc_range or max_homopolymer
+
+    Returns
+    -------
+    best_offsets : array_like
+    scores : dict
+        the scores of all offsets
+
+    Example
+    -------
+    best_offsets, scores = scan_offsets('7x3_output.json', read_maxiscaf_seq(maxiscaf_seq_filename))
+    """
+    design_session = sequencing_session(cadnano_file, scaffold_seq)
+    data = design_session.design
+    scaf_order, scaf_offsets, seq_pointer_ra, seq_length_ra, maxiscaf_num = design_session.scaf_layout()
+    #Position of every base in the maxiscaf sequence, -1 for bases that do not pair with the maxiscaf
+    maxiscaf = slice(scaf_offsets[maxiscaf_num], scaf_offsets[maxiscaf_num + 1]) if len(seq_length_ra) else slice(0, 0)
+    positions = np.full(data.num_helices*data.num_bases, -1, dtype=np.int64)
+    positions[scaf_order[maxiscaf]] = seq_pointer_ra[maxiscaf]
+    lengths = (1 + data.skip.astype(np.int64) + data.loop).ravel()
+    stap_order, stap_offsets = data.strands('stap').flat_paths(circular=False)
+    scores = rotations.scan_rotations(scaffold_seq, *rotations.staple_domains(stap_order, stap_offsets, positions, lengths),
+                                      **kwargs)
+    return rotations.best_rotations(scores, num), scores
+
+def print_offsets(cadnano_file, best_offsets, scores):
+    print(cadnano_file)
+    print('offset\tbad staples\tmin GC\tmax GC\tTm spread')
+    for offset in best_offsets.tolist():
+        print('%d\t%d\t%.2f\t%.2f\t%.2f' % (offset, scores['num_bad'][offset], scores['gc_min'][offset],
+                                            scores['gc_max'][offset], scores['tm_spread'][offset]))
+
+def batch_main(argv=None):
+    """
+    Assigns sequences to many designs and rotations of the maxiscaf sequence in a process pool.
+
+    Example
+    -------
+    python assign_sequences.py ruler_output.json 7x3_output.json --offsets 0:7308:100 --jobs 8
+    >>>> writes results/ruler_output_offset0.txt ... results/7x3_output_offset7300.txt
+    python assign_sequences.py 7x3_output.json --scan 10
+    >>>> prints the 10 best rotation offsets, see scan_offsets
+    """
+    parser = argparse.ArgumentParser(description='Assigns sequences to cadnano2 designs, one result file per '
+                                                 'design and rotation offset of the maxiscaf sequence.')
+    parser.add_argument('designs', nargs='+', help='cadnano2 *.json files')
+    parser.add_argument('--offsets', nargs='+', default=[str(maxiscaf_offset)],
+                        help="rotation offsets of the maxiscaf sequence, e.g. 30 or 0:7308:10 (default %(default)s)")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--output-dir', default='results', help='where the result files are written')
+    parser.add_argument('--library', default=seq_dc_filename, help='designed sequences, pickle or *.seqlib')
+    parser.add_argument('--scaffold', default=maxiscaf_seq_filename, help='maxiscaf sequence')
+    parser.add_argument('--scan', type=int, metavar='NUM',
+                        help='only score all rotation offsets and print the NUM best offsets of every design')
+    args = parser.parse_args(argv)
+
+    if args.scan:
+        scaffold_seq = read_maxiscaf_seq(args.scaffold)
+        for cadnano_file in args.designs:
+            print_offsets(cadnano_file, *scan_offsets(cadnano_file, scaffold_seq, args.scan))
+        return 0
+
+    # Convert the library and warm the design cache once, so the workers only read.
+    library_file = seqlib.open_library(args.library).file_name
+    for cadnano_file in args.designs:
+        cache.load_design(cadnano_file)
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    jobs = []
+    for cadnano_file in args.designs:
+        name = os.path.splitext(os.path.basename(cadnano_file))[0]
+        for offset in parse_offsets(args.offsets):
+            jobs.append((cadnano_file, offset, os.path.join(args.output_dir, '%s_offset%d.txt' % (name, offset))))
+
+    start_time = time.time()
+    num_failed = 0
+    with concurrent.futures.ProcessPoolExecutor(args.jobs, initializer=init_worker,
+                                                initargs=(library_file, read_maxiscaf_seq(args.scaffold))) as pool:
+        for (cadnano_file, offset, output_file), error in pool.map(run_job, jobs, chunksize=max(1, len(jobs)//(4*args.jobs))):
+            if error is None:
+                print(output_file)
+            else:
+                num_failed += 1
+                print("Error:", cadnano_file, "offset", offset, "failed,", error)
+    print(len(jobs) - num_failed, "of", len(jobs), "jobs done in %.1f s" % (time.time() - start_time))
+    return 1 if num_failed else 0
 
 
 ## Settings and files
@@ -281,56 +348,78 @@ def print_sequences():
 
 #################################################################
 #adjustable parameters
-square_lattice = True #Set to False if honeycomb lattice is used
+lattice = None #'square' or 'honeycomb', by default found from the number of bases of the design
 on_lattice_xover_scaf_loop_length = 2 #ssDNA loops at scaffold crossovers placed on the square lattice points?
 off_lattice_xover_scaf_loop_length = 0 #ssDNA loops at scaffold crossovers placed off the square lattice points?
 no_loop_exception_ra = [[17, 24], [16, 247]] #no scaffold loops allowed after the indicated base pointer positions
 prefix = 'outputfile\t'    #Annotation prefix
-
-#Read files
-##Need to read in designed sequences for every length of scaffold strand in the caDNAno json file,
-##otherwise an error will occur
-seq_dc = openPickledFile('130126_1127_designed_seqs_05-69.txt')
-stap_color_dc, null_bp = initVars() #initialize variables
+seq_dc_filename = '130126_1127_designed_seqs_05-69.txt'
 maxiscaf_seq_filename = 'p7308_cadnanoversion.txt'
-maxiscaf_seq = openFile(maxiscaf_seq_filename) #Import maxiscaf seq
-maxiscaf_seq = comp_seq_FN(comp_seq_FN(maxiscaf_seq))
-maxiscaf_seq = maxiscaf_seq[30:] + maxiscaf_seq[:30]
+maxiscaf_offset = 30 #The maxiscaf sequence starts at this base
+seq_dc = None #The designed sequences, read below or by init_worker
+trace_file = None #Set to e.g. 'assign_sequences.trace.json' to record the time and memory of every stage and print the load times, see instrumentation.py
+stap_color_dc, null_bp = initVars() #initialize variables
+
+#Run python assign_sequences.py design.json ... --offsets ... for many designs and offsets at once, see batch_main
+if __name__ == '__main__' and len(sys.argv) > 1:
+    sys.exit(batch_main())
+
+if __name__ == '__main__':
+    if trace_file:
+        instrumentation.start()
+    #Read files
+    ##Need to read in designed sequences for every length of scaffold strand in the caDNAno json file,
+    ##otherwise an error will occur
+    ##The pickle is converted once to a memory-mapped library, only the lengths that are used are read
+    seq_dc = seqlib.open_library(seq_dc_filename)
+    maxiscaf_seq = read_maxiscaf_seq(maxiscaf_seq_filename) #Import maxiscaf seq
+    maxiscaf_seq = rotate_seq(maxiscaf_seq, maxiscaf_offset)
 
 
 ## Ruler + handles
 
 # In[8]:
 
-scaf_output_ra, sorted_stap_output_ra, vstrands = give_sequences('ruler_output.json')
-eight_mers = openPickledFile('141110_1628_ortho_8mers_2303.txt')
-handle_color = {'cyan' : [0, 5], 'blue' : [1, 6], 'red orange' : [2, 7], 'light gray' : [3, 8], 'magenta' : [4, 9]}
+    scaf_output_ra, sorted_stap_output_ra, vstrands = give_sequences('ruler_output.json')
+    eight_mers = seqlib.open_library('141110_1628_ortho_8mers_2303.txt')[8]
+    handle_color = {'cyan' : [0, 5], 'blue' : [1, 6], 'red orange' : [2, 7], 'light gray' : [3, 8], 'magenta' : [4, 9]}
 
-for color, seqidx in handle_color.items():
-    for row in sorted_stap_output_ra:
-        if row[0] == color and row[3][0] in (0, 1):
-            # Add 'TT' to staple seq:
-            row[-1] += 'TT' + eight_mers[seqidx[row[3][0]]]
+    handle_rules = [{'color': color, 'end_helix': [0, 1], 'linker': 'TT', 'key': 'end_helix',
+                     'handles': {0: eight_mers[seqidx[0]], 1: eight_mers[seqidx[1]]}}
+                    for color, seqidx in handle_color.items()]
+    sorted_stap_output_ra, handle_dc = handles.attach_handles(sorted_stap_output_ra, handle_rules)
 
-print_sequences()
+    check_handles(handle_dc)
+    print_sequences()
 
 
 ## Plate
 
 # In[10]:
 
-scaf_output_ra, sorted_stap_output_ra, vstrands = give_sequences('7x3_output.json')
-eight_mers = openPickledFile('141110_1628_ortho_8mers_2303.txt')
-handle_color = {56 : [0, 5], 88 : [1, 6], 120 : [2, 7], 152 : [3, 8], 184 : [4, 9]}
-
-print "before adding handles"
-# print_sequences()
-helix_to_handle_seq_idx = {16: 0, 18: 1}
-for end_num, seqidx in handle_color.items():
-    for row in sorted_stap_output_ra:
-        # row[3] is cadnano_start coordinate (helix, basenum), e.g. [2, 200]
-        if row[3][1] == end_num and row[3][0] in (16, 18):
-            row[-1] += 'TTTT' + comp_seq_FN(eight_mers[seqidx[0 if row[3][0] == 16 else 1]])
-
-print "after adding handles"
-print_sequences()
+    scaf_output_ra, sorted_stap_output_ra, vstrands = give_sequences('7x3_output.json')
+    eight_mers = seqlib.open_library('141110_1628_ortho_8mers_2303.txt')[8]
+    handle_color = {56 : [0, 5], 88 : [1, 6], 120 : [2, 7], 152 : [3, 8], 184 : [4, 9]}
+
+    print("before adding handles")
+    # print_sequences()
+    helix_to_handle_seq_idx = {16: 0, 18: 1}
+    # Match the staples by their end coordinate (helix, basenum), e.g. [16, 56]
+    handle_rules = [{'end_helix': [16, 18], 'end_base': end_num, 'linker': 'TTTT', 'complement': True,
+                     'key': 'end_helix', 'handles': {16: eight_mers[seqidx[0]], 18: eight_mers[seqidx[1]]}}
+                    for end_num, seqidx in handle_color.items()]
+    sorted_stap_output_ra, handle_dc = handles.attach_handles(sorted_stap_output_ra, handle_rules)
+
+    print("after adding handles")
+    check_handles(handle_dc)
+    print_sequences()
+
+
+## Instrumentation
+
+# In[11]:
+
+    if trace_file:
+        recorder = instrumentation.stop()
+        recorder.print_summary()
+        recorder.write_trace(trace_file)
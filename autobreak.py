@@ -0,0 +1,209 @@
+"""
+Automatic staple breaking.
+
+Chooses where to break the staples of a design so that every staple length lies
+in a target window. A break can go between two neighbouring bases of a staple on
+the same helix (where insertBreak would put it), not at a crossover, not within
+xover_distance bases of a crossover and not in a forbidden region.
+
+For every staple the best set of breaks is found by dynamic programming over the
+cut positions of its path, the cost of a piece is its squared distance to the
+target length. All staples are processed at once: step t of the DP handles cut t
+of every staple that is long enough, so the run time is linear in the number of
+bases times the width of the window. Circular staples are first opened at their
+first allowed cut. Every piece keeps the color of the staple it was cut from,
+the pieces of circular staples are grey.
+
+Example
+-------
+breaks, unbroken = auto_break(design, 21, 49, forbidden=[([0, 2], 100, 140)])
+design.save('7x3_output.json')
+"""
+
+import numpy as np
+
+import coloring
+import edits
+
+
+def _cuts(design, order, offsets, forbidden, xover_distance):
+    """
+    Returns the cut positions of a batch of paths, cut c of a path lies before its base c.
+
+    Returns
+    -------
+    cut_offsets : array_like
+        the cuts of path i are cut_offsets[i] ... cut_offsets[i] + length_i
+    weights : array_like
+        the number of nucleotides before every cut, from the start of its path
+    allowed : array_like
+        True for the cuts that can be a break, and for the first cut of every path
+    """
+    lengths = np.diff(offsets)
+    num_paths = len(lengths)
+    cut_offsets = offsets + np.arange(num_paths + 1)
+    path_ids = np.repeat(np.arange(num_paths), lengths + 1)
+    positions = np.arange(cut_offsets[-1]) - cut_offsets[path_ids]
+    nucleotides = (1 + design.skip.astype(np.int64) + design.loop).ravel()[order]
+    cumulative = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(nucleotides, out=cumulative[1:])
+    weights = cumulative[offsets[path_ids] + positions] - cumulative[offsets[path_ids]]
+    inner = (positions > 0) & (positions < lengths[path_ids])
+    before = order[np.where(inner, offsets[path_ids] + positions - 1, 0)]
+    after = order[np.where(inner, offsets[path_ids] + positions, 0)]
+    # A cut between two bases that are not neighbours on one helix is a crossover.
+    on_helix = (before // design.num_bases == after // design.num_bases) & (np.abs(before - after) == 1)
+    crossovers = inner & ~on_helix
+    cut_nums = np.arange(len(positions))
+    last_crossover = np.maximum.accumulate(np.where(crossovers, cut_nums, -1))
+    next_crossover = np.minimum.accumulate(np.where(crossovers, cut_nums, len(positions))[::-1])[::-1]
+    near = (((last_crossover >= cut_offsets[path_ids]) & (cut_nums - last_crossover < xover_distance)) |
+            ((next_crossover <= cut_offsets[path_ids] + lengths[path_ids]) & (next_crossover - cut_nums < xover_distance)))
+    flat_forbidden = np.zeros(design.num_helices * design.num_bases, dtype=bool)
+    for helix_nums, first_base, last_base in forbidden:
+        rows = edits._rows(design, helix_nums).ravel()
+        flat_forbidden.reshape(design.num_helices, design.num_bases)[rows, first_base:last_base + 1] = True
+    allowed = inner & on_helix & ~near & ~flat_forbidden[before] & ~flat_forbidden[after]
+    allowed[cut_offsets[:-1]] = True
+    return cut_offsets, weights, allowed
+
+
+def _pointers(design, order, offsets, cut_offsets, cuts):
+    """ Returns the helix numbers and left bases of the breaks at cut indices. """
+    path_ids = np.searchsorted(cut_offsets, cuts, side='right') - 1
+    positions = cuts - cut_offsets[path_ids]
+    before = order[offsets[path_ids] + positions - 1]
+    after = order[offsets[path_ids] + positions]
+    helix_nums = np.array([design.helix_num(vstrand_num) for vstrand_num in range(design.num_helices)],
+                          dtype=np.int64)[before // design.num_bases]
+    return helix_nums, np.minimum(before, after) % design.num_bases
+
+
+def plan_breaks(weights, cut_offsets, allowed, min_length, max_length, target=None):
+    """
+    Finds the breaks that bring the pieces of every path closest to the target length.
+
+    Parameters
+    ----------
+    weights, cut_offsets, allowed : array_like
+        see _cuts
+    min_length, max_length : int
+        the window of allowed piece lengths, in nucleotides
+    target : float
+        the preferred length, by default the middle of the window
+
+    Returns
+    -------
+    cuts : array_like
+        the cut indices of all breaks
+    feasible : array_like
+        False for the paths that can not be broken into pieces within the window
+    """
+    if target is None:
+        target = (min_length + max_length) / 2.0
+    lengths = np.diff(cut_offsets) - 1
+    num_paths = len(lengths)
+    starts = cut_offsets[:-1]
+    if not num_paths:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    # The most cuts one piece can span, skipped bases weigh nothing.
+    totals = weights[cut_offsets[1:] - 1]
+    flat_weights = weights + np.repeat(np.cumsum(totals) - totals, lengths + 1)
+    span = int(min((np.searchsorted(flat_weights, flat_weights + max_length, side='right') -
+                    np.arange(len(flat_weights))).max(), lengths.max()))
+    steps = np.arange(1, span + 1)
+    cost = np.full(len(weights), np.inf)
+    cost[starts] = 0
+    choice = np.zeros(len(weights), dtype=np.int64)
+    by_length = np.argsort(-lengths, kind='stable')
+    sorted_lengths = lengths[by_length]
+    for t in range(1, lengths.max() + 1):
+        active = by_length[:np.searchsorted(-sorted_lengths, -t, side='right')]
+        cuts = starts[active] + t
+        valid = steps <= t
+        prevs = np.where(valid, cuts[:, None] - steps, cuts[:, None])
+        piece = weights[cuts][:, None] - weights[prevs]
+        ok = valid & allowed[prevs] & (piece >= min_length) & (piece <= max_length)
+        candidates = np.where(ok, cost[prevs] + (piece - target)**2, np.inf)
+        best = candidates.argmin(axis=1)
+        cost[cuts] = candidates[np.arange(len(cuts)), best]
+        choice[cuts] = best + 1
+    ends = starts + lengths
+    feasible = np.isfinite(cost[ends])
+    # Walk back from the end of every feasible path, all paths at once.
+    current, first = ends[feasible], starts[feasible]
+    breaks = []
+    while len(current):
+        current = current - choice[current]
+        inner = current > first
+        current, first = current[inner], first[inner]
+        breaks.append(current)
+    return np.sort(np.concatenate(breaks)) if breaks else np.zeros(0, dtype=np.int64), feasible
+
+
+def _color_pieces(design, base_colors):
+    """ Colors every staple with the color its 5' end had before the breaks, see auto_break. """
+    staple_colors = coloring.StapleColors(design, reset=True)
+    staple_colors.set(None, base_colors[staple_colors.vstrand_nums * design.num_bases + staple_colors.base_nums])
+    staple_colors.apply()
+
+
+def auto_break(design, min_length, max_length, target=None, forbidden=(), xover_distance=3):
+    """
+    Breaks all staples of a design into pieces of min_length to max_length nucleotides.
+
+    Parameters
+    ----------
+    design : Design
+    min_length, max_length : int
+        the window of staple lengths, skips and loops count, like in the sequences
+    target : float
+        the preferred staple length, by default the middle of the window
+    forbidden : list
+        (helix_nums, first_base, last_base) regions without breaks, e.g. where handles go
+    xover_distance : int
+        the least number of bases between a break and a crossover
+
+    Returns
+    -------
+    breaks : array_like
+        [helix_num, base_num] of every break, between base_num and base_num + 1
+    unbroken : list
+        the (helix_num, base_num) starts of the staples that could not be broken within the window,
+        these are left as they are
+    """
+    strands = design.strands('stap')
+    # The color of the staple of every base, the keys of circular staples stay grey.
+    staple_colors = np.full(len(strands.strand_of), coloring.GREY, dtype=np.int64)
+    staple_colors[strands.keys(circular=False)] = coloring.StapleColors(design).colors
+    base_colors = np.where(strands.strand_of != -1, staple_colors[strands.strand_of], coloring.GREY)
+    all_breaks = []
+    if strands.circular:
+        keys = sorted(strands.circular)
+        order = np.concatenate([strands.paths[key] for key in keys]).astype(np.int64)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(strands.paths[key]) for key in keys], out=offsets[1:])
+        cut_offsets, weights, allowed = _cuts(design, order, offsets, forbidden, xover_distance)
+        allowed[cut_offsets[:-1]] = False
+        path_ids = np.repeat(np.arange(len(keys)), np.diff(cut_offsets))
+        first_cuts = np.unique(path_ids[allowed], return_index=True)[1]
+        cuts = np.flatnonzero(allowed)[first_cuts]
+        helix_nums, base_nums = _pointers(design, order, offsets, cut_offsets, cuts)
+        if len(cuts):
+            edits.insert_breaks(design, helix_nums, base_nums.reshape(-1, 1))
+        all_breaks.append(np.column_stack([helix_nums, base_nums]))
+        strands = design.strands('stap')
+    order, offsets = strands.flat_paths(circular=False)
+    if not len(order):
+        return np.concatenate(all_breaks + [np.zeros((0, 2))]).astype(np.int64), []
+    cut_offsets, weights, allowed = _cuts(design, order, offsets, forbidden, xover_distance)
+    cuts, feasible = plan_breaks(weights, cut_offsets, allowed, min_length, max_length, target)
+    helix_nums, base_nums = _pointers(design, order, offsets, cut_offsets, cuts)
+    unbroken = [start for start, ok in zip(strands.starts(), feasible.tolist()) if not ok]
+    if len(cuts):
+        edits.insert_breaks(design, helix_nums, base_nums.reshape(-1, 1))
+    all_breaks.append(np.column_stack([helix_nums, base_nums]))
+    breaks = np.concatenate(all_breaks).astype(np.int64).reshape(-1, 2)
+    if len(breaks):
+        _color_pieces(design, base_colors)
+    return breaks, unbroken
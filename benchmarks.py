@@ -0,0 +1,294 @@
+"""
+Benchmarks of the sequence and design functions.
+
+bench_sizes() times the loading, saving, strand, sequencing and editing functions
+of the scripts on synthetic designs (see synthetic.py) of growing size, and
+records the peak memory the Python allocator traced during one run of each. The
+results are written to a JSON file, compare() reports the benchmarks that became
+slower between two such files.
+
+Example
+-------
+python benchmarks.py --sizes 10 100 1000 --output benchmarks_new.json --compare benchmarks_old.json
+python benchmarks.py --reverse-complement
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import cache
+import edits
+import lattice as lattices
+import sequences
+import synthetic
+from design import Design
+from session import DesignSession
+
+SIZES = (10, 100, 1000)
+NUM_BASES = 512
+
+
+def comp_seq_reference(raw_sequence):
+    """ The original comp_seq_FN, which prepends one base at a time. """
+    uppercase = {'a':'A', 'A':'A', 'c':'C', 'C':'C', 'g':'G', 'G':'G', 't':'T', 'T':'T'}
+    complement = {'a':'T', 'A':'T', 'c':'G', 'C':'G', 'g':'C', 'G':'C', 't':'A', 'T':'A'}
+    antisense_seq = ''
+    for letter in raw_sequence:
+        if letter in uppercase:
+            antisense_seq = complement[letter] + antisense_seq
+    return antisense_seq
+
+
+def random_sequence(length, rng=random):
+    return ''.join(rng.choice('ACGTacgt') for _ in range(length))
+
+
+def best_time(function, repeat=3, number=1):
+    """ Returns the fastest of repeat runs in seconds. """
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def bench_reverse_complement(scaffold_length=7308, num_staples=10**5, staple_length=40, seed=0):
+    """
+    Times comp_seq_reference against the str and batch reverse complements.
+
+    Returns
+    -------
+    results : list
+        [(name, seconds), ...]
+    """
+    rng = random.Random(seed)
+    scaffold = random_sequence(scaffold_length, rng)
+    staples = [random_sequence(staple_length, rng) for _ in range(num_staples)]
+    codes, offsets = sequences.encode(staples)
+    assert sequences.reverse_complement(scaffold) == comp_seq_reference(scaffold)
+    assert sequences.reverse_complement_batch(staples[:100]) == [comp_seq_reference(s) for s in staples[:100]]
+    return [
+        ('comp_seq_reference, %d nt scaffold' % scaffold_length, best_time(lambda: comp_seq_reference(scaffold))),
+        ('reverse_complement, %d nt scaffold' % scaffold_length,
+         best_time(lambda: sequences.reverse_complement(scaffold), number=100)),
+        ('comp_seq_reference, %d staples' % num_staples,
+         best_time(lambda: [comp_seq_reference(s) for s in staples], repeat=1)),
+        ('reverse_complement, %d staples' % num_staples,
+         best_time(lambda: [sequences.reverse_complement(s) for s in staples])),
+        ('reverse_complement_batch, %d staples' % num_staples,
+         best_time(lambda: sequences.reverse_complement_batch(staples))),
+        ('reverse_complement_codes, %d staples' % num_staples,
+         best_time(lambda: sequences.reverse_complement_codes(codes, offsets))),
+    ]
+
+
+def print_results(results):
+    for name, seconds in results:
+        print('%-50s %10.3f ms' % (name, seconds * 1e3))
+
+
+def measure(run, setup=None, repeat=3):
+    """
+    Times run(setup()) and measures its memory, setup is not timed and makes a fresh input for every run.
+
+    Returns
+    -------
+    seconds : float
+        the fastest of repeat runs
+    peak_mb : float
+        the peak memory tracemalloc traced during one more run, in MB
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start_time = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start_time)
+    state = setup() if setup else None
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak / 1024.0**2
+
+
+def copy_design(design):
+    """ Returns a copy of a design that shares no arrays with it. """
+    return Design(dict(design.data), [dict(meta) for meta in design.meta], design.scaf.copy(), design.stap.copy(),
+                  design.skip.copy(), design.loop.copy(), design.stap_colors.copy(), design.color_offsets.copy(),
+                  design.period, design.lattice)
+
+
+def bench_design(num_helices, num_bases=NUM_BASES, lattice='square', repeat=3, directory=None):
+    """
+    Times the functions of the scripts on one synthetic design, see the module docstring.
+
+    The editing functions run through a DesignSession like in cadnano-beadcatchers.py,
+    so every edit also records its journal entry.
+
+    Returns
+    -------
+    results : list
+        {'benchmark', 'num_helices', 'num_bases', 'lattice', 'seconds', 'peak_mb'} per function
+    """
+    own_directory = directory is None
+    if own_directory:
+        directory = tempfile.mkdtemp(prefix='cadnano_benchmarks_')
+    try:
+        design = synthetic.synthetic_design(num_helices, num_bases, lattice)
+        period = design.period
+        # The edits stay one period inside the margins, where the scaffold and staples of every helix are.
+        first_base, last_base = period // 2 + period, num_bases - 1 - period // 2 - period
+        file_name = os.path.join(directory, 'synthetic_%s_%d_%d.json' % (lattice, num_helices, num_bases))
+        design.save(file_name)
+        cache_dir = os.path.join(directory, cache.CACHE_DIR)
+        cache.load_design(file_name, period, cache_dir, lattice)
+        settings = {'seq_library': {}, 'scaffold_name': 'random'}
+        # The scaffold snakes through all helices, a random maxiscaf sequence of its length is enough.
+        seq_length_ra = DesignSession(design, period, file_name, **settings).scaf_layout()[3]
+        rng = np.random.RandomState(0)
+        settings['scaffold_seq'] = ''.join(np.array(list('ACGT'))[rng.randint(0, 4, int(seq_length_ra.max()))])
+        scaffold_seq = settings['scaffold_seq']
+
+        def session(journaled=True):
+            new_session = DesignSession(copy_design(design), period, file_name, **settings)
+            if journaled:
+                new_session.journal()
+            return new_session
+
+        def traced(parity=None):
+            new_session = session(journaled=False)
+            for strand_parity in [parity] if parity else ['scaf', 'stap']:
+                new_session.design.strands(strand_parity)
+            return new_session
+
+        def joined():
+            new_session = session()
+            for parity in (0, 1):
+                edits.join_staples(new_session.design, np.arange(parity, num_helices, 2),
+                                   synthetic.staple_break_bases(lattice, parity, first_base, last_base - 1))
+            return new_session
+
+        even_pairs = np.arange(0, num_helices - 1, 2)
+        xover_bases = synthetic.staple_crossover_bases(lattice, 0, first_base, last_base)
+        num_periods = (last_base - first_base) // period
+        benchmarks = [
+            ('load_json', lambda state: Design.load(file_name, period, lattice), None),
+            ('load_json cached', lambda state: cache.load_design(file_name, period, cache_dir, lattice), None),
+            ('save_json', lambda state: state.save(os.path.join(directory, 'saved.json')), traced),
+            ('findStaples', lambda state: state.find_staples(), session),
+            ('stapleLength', lambda state: state.staple_lengths(), session),
+            ('give_sequences', lambda state: state.give_sequences(verbose=False), session),
+            ('comp_seq_FN', lambda state: sequences.reverse_complement(scaffold_seq), None),
+            ('insertBreak', lambda state: state.insert_break(np.arange(num_helices), first_base + 4, period, num_periods),
+             traced),
+            ('removeCrossover', lambda state: state.remove_crossover(even_pairs, xover_bases[0], period,
+                                                                     len(xover_bases)), traced),
+            ('insertDeletions', lambda state: state.insert_deletions(first_base + 4, 48, (last_base - first_base) // 48),
+             traced),
+            ('insertScaffCrossover', lambda state: state.insert_scaffold_crossover(even_pairs, even_pairs + 1,
+                                                                                   (first_base + last_base) // 2), traced),
+            ('joinStaples', lambda state: state.join_staples(
+                np.arange(0, num_helices, 2), synthetic.staple_break_bases(lattice, 0, first_base, last_base - 1)[0],
+                period, num_periods), traced),
+            ('autoBreak', lambda state: state.auto_break(21, 49), joined),
+        ]
+        results = []
+        for name, run, setup in benchmarks:
+            seconds, peak_mb = measure(run, setup, repeat)
+            results.append({'benchmark': name, 'num_helices': num_helices, 'num_bases': num_bases, 'lattice': lattice,
+                            'seconds': seconds, 'peak_mb': peak_mb})
+        return results
+    finally:
+        if own_directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def git_commit():
+    """ Returns the commit of the working directory, None outside a git repository. """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_sizes(sizes=SIZES, num_bases=NUM_BASES, lattice='square', repeat=3, verbose=True):
+    """
+    Runs bench_design for every number of helices in sizes.
+
+    Returns
+    -------
+    report : dict
+        'commit', 'python', 'numpy', 'created' and the 'results' of all sizes
+    """
+    results = []
+    for num_helices in sizes:
+        for result in bench_design(num_helices, num_bases, lattice, repeat):
+            if verbose:
+                print('%-22s %5d helices %10.3f ms %10.1f MB' % (result['benchmark'], num_helices,
+                                                                 result['seconds'] * 1e3, result['peak_mb']))
+            results.append(result)
+    return {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}
+
+
+def compare(old_report, new_report, tolerance=1.25):
+    """
+    Returns the benchmarks that take more than tolerance times as long in new_report as in old_report.
+
+    Returns
+    -------
+    slower : list
+        (benchmark, num_helices, old seconds, new seconds) of the benchmarks that ran in both reports
+    """
+    def key(result):
+        return result['benchmark'], result['num_helices'], result['num_bases'], result['lattice']
+    old_seconds = dict((key(result), result['seconds']) for result in old_report['results'])
+    return [(result['benchmark'], result['num_helices'], old_seconds[key(result)], result['seconds'])
+            for result in new_report['results']
+            if key(result) in old_seconds and result['seconds'] > tolerance * old_seconds[key(result)]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Times the cadnano scripts on synthetic designs of growing size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='numbers of helices')
+    parser.add_argument('--num-bases', type=int, default=NUM_BASES, help='bases per helix (default %(default)s)')
+    parser.add_argument('--lattice', choices=sorted(lattices.LATTICES), default='square')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the fastest counts')
+    parser.add_argument('--output', default='benchmarks.json', help='where the results are written')
+    parser.add_argument('--compare', metavar='OLD_OUTPUT', help='report the benchmarks that got slower since OLD_OUTPUT')
+    parser.add_argument('--reverse-complement', action='store_true',
+                        help='only compare comp_seq_FN with the reverse complements of sequences.py')
+    args = parser.parse_args(argv)
+
+    if args.reverse_complement:
+        print_results(bench_reverse_complement())
+        return 0
+    report = bench_sizes(args.sizes, args.num_bases, args.lattice, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print('Results written to', args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(json.load(f), report)
+        for name, num_helices, old_seconds, new_seconds in slower:
+            print('Warning: %s with %d helices takes %.3f ms instead of %.3f ms' % (name, num_helices, new_seconds * 1e3,
+                                                                                  old_seconds * 1e3))
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
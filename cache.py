@@ -0,0 +1,158 @@
+"""
+On-disk cache of parsed and traced cadnano2 designs.
+
+A design is stored as an uncompressed .npz file named after the SHA-1 hash of
+the *.json file, so a changed file never finds an old entry. The entry holds the
+per-base arrays, the helix index map and the traced scaf and stap strands, so a
+warm load neither parses JSON nor traces strands. The lattice and period are not
+stored, they are taken from the arguments of every load like for a *.json file.
+
+Example
+-------
+design = load_design('7x3_input.json')
+>>>> parses and traces on the first run, reads .cadnano_cache/<sha1>.npz afterwards
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+import instrumentation
+from design import Design
+from strands import StrandIndex
+from streaming import process_peak_rss_mb
+
+# Bump this when the layout of the cache files changes, old entries are then ignored.
+CACHE_VERSION = 1
+CACHE_DIR = '.cadnano_cache'
+PARITIES = ('scaf', 'stap')
+
+
+def content_hash(file_name, chunk_size=1 << 20):
+    """ Returns the SHA-1 hex digest of a file. """
+    sha = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def cache_directory(file_name, cache_dir=None):
+    """
+    Returns the cache directory of a *.json file, by default .cadnano_cache next to it.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_name)), CACHE_DIR)
+    return cache_dir
+
+
+def cache_path(file_name, cache_dir=None):
+    """
+    Returns the cache file of a *.json file, see cache_directory.
+    """
+    return os.path.join(cache_directory(file_name, cache_dir),
+                        'v%d-%s.npz' % (CACHE_VERSION, content_hash(file_name)))
+
+
+@instrumentation.staged('load_json')
+def load_design(file_name, period=None, cache_dir=None, lattice=None):
+    """
+    Loads a cadnano2 *.json file from the cache, or parses it, traces it and stores it.
+
+    Parameters
+    ----------
+    file_name : str
+        The name and location of the *.json file
+    period : int
+        The period of repeating segments of the staples, by default the period of the lattice.
+    cache_dir : str
+        where the cache files are kept, by default .cadnano_cache next to file_name
+    lattice : str
+        'square' or 'honeycomb', by default found from the number of bases, see Design.from_json
+
+    Returns
+    -------
+    design : Design
+        with both strand indices traced, design.load_stats['cached'] tells if the cache was used.
+    """
+    start_time = time.time()
+    path = cache_path(file_name, cache_dir)
+    if os.path.exists(path):
+        design = _read(path, period, lattice)
+        design.load_stats = {'seconds': time.time() - start_time, 'process_peak_rss_mb': process_peak_rss_mb(), 'cached': True}
+        return design
+    design = Design.load(file_name, period, lattice)
+    _store(design, path)
+    design.load_stats['cached'] = False
+    design.load_stats['seconds'] = time.time() - start_time
+    return design
+
+
+@instrumentation.staged('save_json')
+def save_design(design, file_name, cache_dir=None):
+    """
+    Saves a design as *.json file and stores it in the cache, so loading it again is warm.
+    """
+    design.save(file_name)
+    _store(design, cache_path(file_name, cache_dir))
+
+
+def store(design, path):
+    """ Writes the arrays and strand indices of a design to path. """
+    arrays = {'scaf': design.scaf, 'stap': design.stap, 'skip': design.skip, 'loop': design.loop,
+              'stap_colors': design.stap_colors, 'color_offsets': design.color_offsets,
+              'header': np.array(json.dumps({'data': design.data, 'meta': design.meta})),
+              'idx': np.array(sorted(design.idx.items()), dtype=np.int64).reshape(-1, 2)}
+    for parity in PARITIES:
+        order, offsets, circular = design.strands(parity).to_arrays()
+        arrays[parity + '_order'] = order
+        arrays[parity + '_offsets'] = offsets
+        arrays[parity + '_circular'] = circular
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    # Write to a temporary file first, so an interrupted run never leaves a broken entry.
+    temporary = path + '.%d.tmp' % os.getpid()
+    with open(temporary, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+def _store(design, path):
+    try:
+        store(design, path)
+    except ValueError:
+        # Designs with broken strands can still be loaded and saved, they are just not cached.
+        design.touch()
+
+
+def _read(path, period, lattice):
+    with np.load(path, allow_pickle=False) as cached:
+        header = json.loads(str(cached['header']))
+        design = Design(header['data'], header['meta'], cached['scaf'], cached['stap'], cached['skip'],
+                        cached['loop'], cached['stap_colors'], cached['color_offsets'], period, lattice)
+        design.idx = dict(cached['idx'].tolist())
+        for parity in PARITIES:
+            design.set_strands(StrandIndex.from_arrays(design, parity, cached[parity + '_order'],
+                                                       cached[parity + '_offsets'], cached[parity + '_circular']))
+    return design
+
+
+def clear_cache(file_name, cache_dir=None):
+    """
+    Removes all cache files from the cache directory of a *.json file, see cache_directory.
+
+    Example
+    -------
+    clear_cache('designs/7x3_input.json')
+    >>>> empties designs/.cadnano_cache
+    """
+    cache_dir = cache_directory(file_name, cache_dir)
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz'):
+            os.remove(os.path.join(cache_dir, name))
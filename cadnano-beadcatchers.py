@@ -2,15 +2,22 @@
 # coding: utf-8
 
                 # Functions:
-#     - load_json(file_name, period=32)
+#     - load_json(file_name, period=None)
 #     - save_json(file_name)
+#     - undo(), redo(), checkpoint(name), checkout(name)
 #     - removeCrossover(helix_num, start, step, num)
 #     - insertBreak(helix_num, start, step, num)
 #     - insertDeletions(start, step)
+#     - autoBreak(min_length, max_length, target, forbidden, xover_distance)
 #     - findStaples()
+#     - validateDesign(raise_error)
 #     - colorCycle(i)
 #     - resetColor()
 #     - colorBased_on_helix()
+#     - colorBased_on_metric(values, bins)
+#     - colorBased_on_domain(bins)
+#     - colorBased_on_gc(staple_seqs, bins)
+#     - colorBased_on_tm(staple_seqs, bins)
 #     - stapleLength()
 #     - removeAllStaples()
 #     - joinStaple()
@@ -22,25 +29,30 @@
 
 import matplotlib.pyplot as plt
 import numpy as np
-import json
 
-def load_json(file_name, period=32):
+import coloring
+import instrumentation
+from session import DesignSession
+
+def load_json(file_name, period=None):
     """
     Loads a .json file in the correct way, so it can still be read by cadnano2.
+    Designs that were loaded or saved before are read from the binary cache, see cache.load_design.
+    While an instrumentation recorder is active, the time and memory of the load are printed.
 
     Parameters
     ----------
     file_name : str
         The name and location of the *.json file
     period : int
-        The period of repeating segments of the staples, in the square lattice this is by default 32.
+        The period of repeating segments of the staples, by default 32 in the square and 21 in the honeycomb lattice.
 
     Returns
     -------
-    data : list
-        all data that is loaded from the *.json file
+    data : Design
+        all data that is loaded from the *.json file, stored in int32 arrays
     vstrands : list
-        vstrands data
+        vstrands data, vstrands[i]['stap'] etc. are views on the arrays of data, write to them in data.editing()
     num_helices : int
         number of helices in the design
     num_bases : int
@@ -53,18 +65,12 @@ def load_json(file_name, period=32):
     -------
     data, vstrands, num_helices, num_bases, idx, polarity, per = load_json('ruler_design_12nov_1353.json')
     """
-    with open(file_name) as f:
-        data = json.load(f)
-
-    vstrands = data['vstrands']
-    num_helices = len(vstrands)
-    num_bases = len(vstrands[0]['scaf'])
-    idx = {}
-    polarity = {}
-    for helix_num in range(num_helices):
-        idx[vstrands[helix_num]['num']] = helix_num
-        polarity[helix_num] = vstrands[idx[helix_num]]['col'] + vstrands[idx[helix_num]]['row']
-    return data, vstrands, num_helices, num_bases, idx, polarity, period
+    global design_session
+    design_session = DesignSession.load(file_name, period)
+    data = design_session.design
+    if instrumentation.enabled():
+        print(data.load_report(file_name))
+    return data, data.vstrands, data.num_helices, data.num_bases, data.idx, data.polarity, data.period
 
 def save_json(file_name):
     """
@@ -75,9 +81,57 @@ def save_json(file_name):
     file_name : str
         The name and location of the *.json file
     """
-    data['vstrands'] = vstrands
-    with open(file_name, 'wb') as outfile:
-        json.dump(data, outfile)
+    _session().save(file_name)
+
+design_session = None
+
+def _session():
+    """
+    Returns the DesignSession of the loaded design, the functions below edit the design through it.
+    A design that was assigned to data in another way gets a new session.
+    """
+    global design_session
+    if design_session is None or design_session.design is not data:
+        design_session = DesignSession(data, data.period)
+    return design_session
+
+def undo():
+    """
+    Undoes the last edit, also one that was made by writing to vstrands in a
+    `with data.editing(...)` block.
+
+    Returns
+    -------
+    name : str
+        e.g. 'insertBreak([0, 2, 4, 6], 39, 32, 6)', None if there is nothing to undo
+    """
+    return _session().undo()
+
+def redo():
+    """
+    Redoes the last undone edit.
+    """
+    return _session().redo()
+
+def checkpoint(name):
+    """
+    Names the current state of the design, to return to it with checkout(name).
+
+    Example
+    -------
+    checkpoint('before breaks')
+    insertBreak([0, 2, 4, 6], 39, per, 6)
+    stapleLength(plot=1)
+    checkout('before breaks')
+    insertBreak([0, 2, 4, 6], 23, per, 6)
+    """
+    return _session().checkpoint(name)
+
+def checkout(name):
+    """
+    Brings the design back to a checkpoint, edits made after it stay in the journal as a branch.
+    """
+    _session().checkout(name)
 
 def removeCrossover(strand, start, step, num, side='left'):
     """
@@ -85,8 +139,8 @@ def removeCrossover(strand, start, step, num, side='left'):
 
     Parameters
     ----------
-    strand : int
-        the strand number of one the two strands of which you want to remove the crossover
+    strand : int or list
+        the strand number(s) of one the two strands of which you want to remove the crossover
     start : int
         the number of the basepair
     step : int
@@ -96,17 +150,7 @@ def removeCrossover(strand, start, step, num, side='left'):
     side : string
         the side at which the staple makes the crossover, ___| is right, |___ is left
     """
-    if (idx[strand]%2 == 0) and (side == 'left') or (idx[strand]%2 != 0) and (side == 'right'):
-        next_strand = vstrands[idx[strand]]['stap'][start][2]
-        # if the first strand is (even & left) or (odd & right):
-        for i in range(num):
-            vstrands[idx[strand]]['stap'][start+i*step][2:] = [-1, -1]
-            vstrands[idx[next_strand]]['stap'][start+i*step][:2] = [-1, -1]
-    else:
-        next_strand = vstrands[idx[strand]]['stap'][start][0]
-        for i in range(num):
-            vstrands[idx[strand]]['stap'][start+i*step][:2] = [-1, -1]
-            vstrands[idx[next_strand]]['stap'][start+i*step][2:] = [-1, -1]
+    _session().remove_crossover(strand, start, step, num, side)
 
 def insertBreak(helix_num, start, step, num, strand='stap'):
     """
@@ -114,8 +158,8 @@ def insertBreak(helix_num, start, step, num, strand='stap'):
 
     Parameters
     ----------
-    strand : int
-        the strand number of where you want to insert a break
+    helix_num : int or list
+        the helix number(s) of where you want to insert a break
     start : int
         the number of the basepair
     step : int
@@ -123,14 +167,7 @@ def insertBreak(helix_num, start, step, num, strand='stap'):
     num : int
         number of times the pattern repeats
     """
-    if polarity[idx[helix_num]] % 2 == 0:
-        for i in range(num):
-            vstrands[idx[helix_num]][strand][start+i*step][:2] = [-1, -1]
-            vstrands[idx[helix_num]][strand][start+1+i*step][2:] = [-1, -1]
-    else:
-        for i in range(num):
-            vstrands[idx[helix_num]][strand][start+i*step][2:] = [-1, -1]
-            vstrands[idx[helix_num]][strand][start+1+i*step][:2] = [-1, -1]
+    _session().insert_break(helix_num, start, step, num, strand)
 
 def insertScaffBreak(helix_num, start, step, num):
     """
@@ -138,8 +175,8 @@ def insertScaffBreak(helix_num, start, step, num):
 
     Parameters
     ----------
-    strand : int
-        the strand number of where you want to insert a break
+    helix_num : int or list
+        the helix number(s) of where you want to insert a break
     start : int
         the number of the basepair
     step : int
@@ -147,7 +184,7 @@ def insertScaffBreak(helix_num, start, step, num):
     num : int
         number of times the pattern repeats
     """
-    return insertBreak(helix_num, start, step, num, strand='scaf')
+    _session().insert_scaffold_break(helix_num, start, step, num)
 
 def insertDeletions(start, step, num):
     """
@@ -159,11 +196,40 @@ def insertDeletions(start, step, num):
         base at which the first deletion is made
     step : int
         the distance between the deletions, in a square lattice this is 48 to compensate the undertwist.
+    num : int
+        number of deletions on every helix that has scaffold in the middle of the design
+    """
+    _session().insert_deletions(start, step, num)
+
+def autoBreak(min_length, max_length, target=None, forbidden=(), xover_distance=3):
+    """
+    Breaks all staples into pieces of min_length to max_length nucleotides, see autobreak.auto_break.
+
+    Parameters
+    ----------
+    min_length, max_length : int
+        the window of staple lengths
+    target : float
+        the preferred staple length, by default the middle of the window
+    forbidden : list
+        (helix_nums, first_base, last_base) regions where no break may go
+    xover_distance : int
+        the least number of bases between a break and a crossover
+
+    Returns
+    -------
+    breaks : array_like
+        [helix_num, base_num] of every break that was inserted
+    unbroken : list
+        the starts of the staples that could not be broken within the window
+
+    Example
+    -------
+    autoBreak(21, 49, forbidden=[([0, 2, 4, 6], 16, 207)])
+    stapleLength(plot=1)
+    save_json('7x3_output.json')
     """
-    for helix_num in idx:
-        if vstrands[idx[helix_num]]['scaf'][num_bases/2] != [-1, -1, -1, -1]:
-            for i in range(num):
-                vstrands[idx[helix_num]]['skip'][start+i*step] = -1
+    return _session().auto_break(min_length, max_length, target, forbidden, xover_distance)
 
 def findStaples():
     """
@@ -174,39 +240,49 @@ def findStaples():
     staples : list
         A list of tuples with the num_helix and the num_base where
         the staple starts [(num_helix, num_base), (0, 154), (1, 14), ..., (14, 158)]
-    num_staples : int
-        Number of staples in the design
 
     Example
     -------
-    staples, num_staples = findStaples()
-        returns the list and number of staples
+    staples = findStaples()
+        returns the list of staples, circular staples have no start and are left out
+
+    Dependends
+    ----------
+    data.strands('stap'), which the editing functions keep up to date.
+    """
+    return _session().find_staples()
+
+def validateDesign(raise_error=False):
+    """
+    Checks that the design is consistent after editing, see validate.validate, and prints the problems.
+
+    Parameters
+    ----------
+    raise_error : bool
+        Use validateDesign(raise_error=True) to stop with a ValueError instead.
+
+    Returns
+    -------
+    messages : list
+        one message per problem, empty for a consistent design
     """
-    # Create a list of two-tuples describing the start of all staples.
-    staples = [(helix_num, base_num) for helix_num in idx
-                                     for base_num, staple in enumerate(vstrands[idx[helix_num]]['stap'])
-                                     if staple[:2] == [-1, -1] and staple[2:] != [-1, -1]]
-    return staples
+    messages = _session().validate(raise_error)
+    for message in messages:
+        print('Warning:', message)
+    return messages
 
 def colorCycle(i):
     """
     This funtion returns a color, and loops back to the first one when it reaches the last one.
     """
-    colors = [13369344, 243362,  1507550, 16204552, 8947848, 12060012, 29184, 5749504, 7536862,  3355443, 11184640, 16225054]
-    return colors[i%len(colors)]
+    return int(coloring.cycle(i))
 
 def resetColor():
     """
     Resets all staples to the color grey
     """
-    staples = findStaples()
-    # empty all lists, so no color data remains
-    for helix_num in idx:
-        vstrands[idx[helix_num]]['stap_colors'] = []
-    # create nested lists with color data, all in grey.
-    for helix_num, base_num in staples:
-        # idx is a dict that maps "user interface" indices to vstand indices.
-        vstrands[idx[helix_num]]['stap_colors'].append([base_num, 8947848])
+    # replace all color data, all in grey.
+    _session().reset_colors()
 
 
 def colorBased_on_helix():
@@ -215,14 +291,9 @@ def colorBased_on_helix():
 
     Dependends
     ----------
-    resetColor()
-        findStaples()
+    DesignSession.color_by_helix()
     """
-    resetColor()
-    for helix_num in idx:
-        num_staples = len(vstrands[idx[helix_num]]['stap_colors'])
-        for staple_num in range(num_staples):
-            vstrands[idx[helix_num]]['stap_colors'][staple_num][1] = colorCycle(helix_num)
+    _session().color_by_helix()
 
 def colorBased_on_length():
     """
@@ -230,22 +301,65 @@ def colorBased_on_length():
 
     Dependends
     ----------
-    resetColor()
-        findStaples()
-    stapleLength()
-        findStaples()
-    """
-    resetColor()
-    staple_info = stapleLength()
-    bins = np.array([0, 32, 40, 41, 47, 49, 1000])
-    inds = np.digitize(staple_info[:, 0], bins)
-    i = 0
-    for helix_num in idx:
-        for color in vstrands[idx[helix_num]]['stap_colors']:
-            # color = base_num, color_code
-            color[1] = colorCycle(inds[i])
-            i += 1
+    DesignSession.color_by_length()
+    """
+    _session().color_by_length([0, 32, 40, 41, 47, 49, 1000])
+
+
+def colorBased_on_metric(values, bins):
+    """
+    This funtions gives each staple a color based on the bin its value falls in.
 
+    Parameters
+    ----------
+    values : array_like
+        one value per staple, in the order of findStaples()
+    bins : array_like
+        the bin edges, see np.digitize
+
+    Example
+    -------
+    import analytics
+    colorBased_on_metric(analytics.path_metrics(data)['num_domains'], [0, 2, 3, 4, 100])
+    """
+    _session().color_by_metric(values, bins)
+
+def colorBased_on_domain(bins=(0, 7, 8, 14, 16, 1000)):
+    """
+    This funtions gives each staple a color based on its longest domain, staples without
+    a domain of 8 or more bases may not bind stably.
+
+    Dependends
+    ----------
+    analytics.path_metrics(data)
+    """
+    _session().color_by_domain(bins)
+
+def _staple_seq_metric(staple_seqs, metric):
+    """
+    Returns the sequence metric of every staple in the order of findStaples(), nan for staples without sequence.
+
+    Parameters
+    ----------
+    staple_seqs : dict
+        maps the (helix_num, base_num) start of a staple to its sequence, e.g.
+        dict((tuple(row[2]), row[-1]) for row in sorted_stap_output_ra) of assign_sequences.py
+    metric : str
+        'gc' or 'tm', see analytics.sequence_metrics
+    """
+    return _session().staple_seq_metric(staple_seqs, metric)
+
+def colorBased_on_gc(staple_seqs, bins=(0, 0.3, 0.4, 0.6, 0.7, 1.01)):
+    """
+    This funtions gives each staple a color based on its GC fraction, see _staple_seq_metric.
+    """
+    colorBased_on_metric(_staple_seq_metric(staple_seqs, 'gc'), bins)
+
+def colorBased_on_tm(staple_seqs, bins=(0, 50, 55, 60, 65, 70, 200)):
+    """
+    This funtions gives each staple a color based on its nearest-neighbor melting temperature, see _staple_seq_metric.
+    """
+    colorBased_on_metric(_staple_seq_metric(staple_seqs, 'tm'), bins)
 
 def stapleLength(plot=0):
     """
@@ -258,7 +372,7 @@ def stapleLength(plot=0):
 
     Dependends
     ----------
-    findStaples()
+    DesignSession.staple_lengths()
 
     Returns
     -------
@@ -267,26 +381,7 @@ def stapleLength(plot=0):
     histogram : plot
         A plot with the staple lengths vs. the frequency
     """
-    staples, num_staples = findStaples()
-    staples_length = []
-    staple_info = np.zeros((num_staples, 6), dtype=int)
-    for staple_num in range(num_staples):
-        helix_num = staples[staple_num][0]
-        base_num = staples[staple_num][1]
-        staple = vstrands[idx[helix_num]]['stap'][base_num]
-        staple_info[staple_num, 1] = helix_num
-        staple_info[staple_num, 2] = base_num
-        i = 1
-        while staple[2:] != [-1, -1] and i < 1000:  # the < 1000 is just for debugging
-            last_helix = vstrands[idx[helix_num]]['stap'][base_num][0]
-            next_helix = vstrands[idx[helix_num]]['stap'][base_num][2]
-            prev_base = vstrands[idx[helix_num]]['stap'][base_num][1]
-            next_base = vstrands[idx[helix_num]]['stap'][base_num][3]
-            helix_num = next_helix
-            base_num = next_base
-            staple = vstrands[idx[next_helix]]['stap'][next_base]
-            i += 1
-        staple_info[staple_num,0] = i
+    staple_info = _session().staple_lengths()
     if plot == 1:
         plt.hist(staple_info[:,0], bins= 10)
         plt.title("Staple length")
@@ -299,9 +394,7 @@ def removeAllStaples():
     """
     This removes all Staples from the structure.
     """
-    for helix_num in idx:
-        for base_num in range(num_bases):
-            vstrands[idx[helix_num]]['stap'][base_num] = [-1, -1, -1, -1]
+    _session().remove_all_staples()
 
 def joinStaple(helix_num, start, step, num):
     """
@@ -309,8 +402,8 @@ def joinStaple(helix_num, start, step, num):
 
     Parameters
     ----------
-    helix_num : int
-        the strand number of where you want to join the staples
+    helix_num : int or list
+        the strand number(s) of where you want to join the staples
     start : int
         the number of the basepair
     step : int
@@ -318,13 +411,7 @@ def joinStaple(helix_num, start, step, num):
     num : int
         number of times the pattern repeats
     """
-    for i in range(num):
-        if polarity[idx[helix_num]]%2 == 0:
-            vstrands[idx[helix_num]]['stap'][start+i*step][:2]= [idx[helix_num],start+1+i*step]
-            vstrands[idx[helix_num]]['stap'][start+1+i*step][2:]= [idx[helix_num],start+i*step]
-        else:
-            vstrands[idx[helix_num]]['stap'][start+i*step][2:]= [idx[helix_num],start+1+i*step]
-            vstrands[idx[helix_num]]['stap'][start+1+i*step][:2]= [idx[helix_num],start+i*step]
+    _session().join_staples(helix_num, start, step, num)
 
 def removeStaples(helix_num, start, step, num):
     """
@@ -332,8 +419,8 @@ def removeStaples(helix_num, start, step, num):
 
     Parameters
     ----------
-    strand : int
-        the strand number of where you want the staples removed
+    helix_num : int or list
+        the strand number(s) of where you want the staples removed
     start : int
         the number of the basepair where the staple starts. Start at the leftmost base.
     step : int
@@ -341,19 +428,7 @@ def removeStaples(helix_num, start, step, num):
     num : int
         number of times the pattern repeats
     """
-    for i in range(num):
-        staple = vstrands[idx[helix_num]]['stap']
-        base_num = start+i*step
-        if polarity[idx[helix_num]]%2!=0:
-            while staple[base_num][2:] != [-1, -1]:
-                staple[base_num] = [-1, -1, -1, -1]
-                base_num += 1
-            staple[base_num] = [-1, -1, -1, -1]
-        else:
-            while staple[base_num][:2] != [-1, -1]:
-                staple[base_num] = [-1, -1, -1, -1]
-                base_num += 1
-            staple[base_num] = [-1, -1, -1, -1]
+    _session().remove_staples(helix_num, start, step, num)
 
 def insertScaffCrossover(up_helix, bot_helix, base_num):
     """
@@ -361,25 +436,14 @@ def insertScaffCrossover(up_helix, bot_helix, base_num):
 
     Parameters
     ----------
-    up_helix : int
+    up_helix : int or array_like
         The number of the top helix.
-    bot_helix : int
+    bot_helix : int or array_like
         The number of the bottom helix.
     base_num : int
         The number of the left base.
     """
-    if polarity[idx[up_helix]]%2 != 0:
-        vstrands[idx[up_helix]]['scaf'][base_num][:2]= [bot_helix, base_num]
-        vstrands[idx[up_helix]]['scaf'][base_num+1][2:]= [bot_helix, base_num+1]
-
-        vstrands[idx[bot_helix]]['scaf'][base_num][2:]= [up_helix, base_num]
-        vstrands[idx[bot_helix]]['scaf'][base_num+1][:2]= [up_helix, base_num+1]
-    else:
-        vstrands[idx[up_helix]]['scaf'][base_num][2:]= [bot_helix, base_num]
-        vstrands[idx[up_helix]]['scaf'][base_num+1][:2]= [bot_helix, base_num+1]
-
-        vstrands[idx[bot_helix]]['scaf'][base_num][:2]= [up_helix, base_num]
-        vstrands[idx[bot_helix]]['scaf'][base_num+1][2:]= [up_helix, base_num+1]
+    _session().insert_scaffold_crossover(up_helix, bot_helix, base_num)
 
 def forcePath(helix_num, start, stop):
     """
@@ -387,7 +451,7 @@ def forcePath(helix_num, start, stop):
 
     Parameters
     ----------
-    helix_num : int
+    helix_num : int or list
         The number of the helix
     start : int
         number of the base of the 3' (or 5') end
@@ -399,12 +463,7 @@ def forcePath(helix_num, start, stop):
     forcePath(6, 19, 210)
     >>>> forces path between staple on base 19 and 210 on helix number 6
     """
-    if polarity[idx[helix_num]]%2 != 0:
-        vstrands[idx[helix_num]]['stap'][start][:2] = [helix_num, stop]
-        vstrands[idx[helix_num]]['stap'][stop][2:] = [helix_num, start]
-    else:
-        vstrands[idx[helix_num]]['stap'][start][2:] = [helix_num, stop]
-        vstrands[idx[helix_num]]['stap'][stop][:2] = [helix_num, start]
+    _session().force_path(helix_num, start, stop)
 
 
 ## Plate design (Incl. William's edits 4 nov)
@@ -414,63 +473,44 @@ def forcePath(helix_num, start, stop):
 data, vstrands, num_helices, num_bases, idx, polarity, per = load_json('7x3_input.json')
 ##############################################
 
-for i in [9, 11, 13]:
-    removeCrossover(i, 39, per, 6, 'right')
-
-for i in [7, 9, 11]:
-    removeCrossover(i, 55, per, 6, 'right')
-
-for i in [0, 2, 4, 6]:
-    insertBreak(i, 39, per, 6)
-
-for i in [14, 16, 18, 20]:
-    insertBreak(i, 23, per, 6)
-
-for i in [2, 4]:
-    removeCrossover(i, 23, 1, 1, 'right')
-
-for i in [9, 11, 13]:
-    insertScaffBreak(i, 64, 48, 3)
-
-for i in [0, 5, 9, 11, 13, 14]:
-    forcePath(i, 16, 207)
-
-for i in [1, 3, 5, 15, 17, 19]:
-    insertScaffCrossover(i, i+1, 127)
-
+removeCrossover([9, 11, 13], 39, per, 6, 'right')
+removeCrossover([7, 9, 11], 55, per, 6, 'right')
+insertBreak([0, 2, 4, 6], 39, per, 6)
+insertBreak([14, 16, 18, 20], 23, per, 6)
+removeCrossover([2, 4], 23, 1, 1, 'right')
+insertScaffBreak([9, 11, 13], 64, 48, 3)
+forcePath([0, 5, 9, 11, 13, 14], 16, 207)
+up_helices = np.array([1, 3, 5, 15, 17, 19])
+insertScaffCrossover(up_helices, up_helices+1, 127)
 insertScaffCrossover(7, 20, 119)
-insertBreak(5, 23, 1, 1)
-insertBreak(7, 23, 1, 1)
+insertBreak([5, 7], 23, 1, 1)
 
 # script doesn't work with forcePath between different helices.
-vstrands[6]['stap'][19] = [6, 20, 6, 210]
-vstrands[7]['stap'][19] = [7, 210, 7, 20]
-vstrands[7]['stap'][210] = [7, 209, 7, 19]
-vstrands[6]['stap'][210] = [6, 19, 6, 209]
+with data.editing('stap', [[6], [7]], [19, 210]):
+    vstrands[6]['stap'][19] = [6, 20, 6, 210]
+    vstrands[7]['stap'][19] = [7, 210, 7, 20]
+    vstrands[7]['stap'][210] = [7, 209, 7, 19]
+    vstrands[6]['stap'][210] = [6, 19, 6, 209]
+validateDesign()
 
 resetColor()
 insertDeletions(20, 48, 4)
 
 ##############################################
+staple_colors = coloring.StapleColors(data)
 # color the staples purple that need to be made longer
-for i in range(1, len(vstrands[20]['stap_colors'])):
-    vstrands[20]['stap_colors'][i][1] = colorCycle(8)
-for i in range(1, len(vstrands[18]['stap_colors'])):
-    if i%2 == 0:
-        vstrands[18]['stap_colors'][i][1] = colorCycle(8)
+staple_colors.set(staple_colors.select(vstrand_nums=[20], where=lambda s: s.rank >= 1), colorCycle(8))
+staple_colors.set(staple_colors.select(vstrand_nums=[18], where=lambda s: (s.rank >= 1) & (s.rank % 2 == 0)),
+                  colorCycle(8))
 
 # color the staples for the DNA-bead attachment sites in orange
-for i in range(len(vstrands[0]['stap_colors'])-1):
-    vstrands[0]['stap_colors'][i][1] = colorCycle(11)
-for i in range(len(vstrands[2]['stap_colors'])):
-    if i%2 == 1:
-        vstrands[2]['stap_colors'][i][1] = colorCycle(11)
+staple_colors.set(staple_colors.select(vstrand_nums=[0], where=lambda s: s.rank < s.count - 1), colorCycle(11))
+staple_colors.set(staple_colors.select(vstrand_nums=[2], where=lambda s: s.rank % 2 == 1), colorCycle(11))
 
 # color the staples that need to be omitted in the first step green
-for i in [2, 4, 6, 14, 16, 18, 20]:
-    vstrands[idx[i]]['stap_colors'][0][1] = colorCycle(7)
-for i in [2, 4, 14, 16, 18]:
-    vstrands[idx[i]]['stap_colors'][-1][1] = colorCycle(7)
+staple_colors.set(staple_colors.select(helix_nums=[2, 4, 6, 14, 16, 18, 20], ranks=[0]), colorCycle(7))
+staple_colors.set(staple_colors.select(helix_nums=[2, 4, 14, 16, 18], ranks=[-1]), colorCycle(7))
+staple_colors.apply()
 ##############################################
 
 save_json('7x3_output.json')
@@ -481,12 +521,15 @@ save_json('7x3_output.json')
 # In[59]:
 
 data, vstrands, num_helices, num_bases, idx, polarity, per = load_json('ruler_input.json')
-insertBreak(0,47,32,107)
-insertBreak(1,47,32,107)
+insertBreak([0, 1], 47, 32, 107)
 insertDeletions(60, 48, 72)
-resetColor()
-for i in range(len(vstrands[0]['stap_colors'])):
-    vstrands[0]['stap_colors'][i-1][1] = colorCycle(i%6)
-    vstrands[1]['stap_colors'][i][1] = colorCycle(i%6)
+staple_colors = coloring.StapleColors(data, reset=True)
+# helix 0 starts with the color of its last staple, helix 1 gets as many colors as helix 0 has staples
+first_helix = staple_colors.select(vstrand_nums=[0])
+num_staples = first_helix.sum()
+staple_colors.set(first_helix, coloring.cycle((staple_colors.rank[first_helix] + 1) % num_staples % 6))
+second_helix = staple_colors.select(vstrand_nums=[1], where=lambda s: s.rank < num_staples)
+staple_colors.set(second_helix, coloring.cycle(staple_colors.rank[second_helix] % 6))
+staple_colors.apply()
 
 save_json('ruler_output.json')
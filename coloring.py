@@ -0,0 +1,137 @@
+"""
+Design-wide staple coloring.
+
+`StapleColors` holds one color per staple, indexed like findStaples(), that is by
+the 5' ends of all linear staples in design order. Selectors turn conditions on the
+helix, start base, length or rank of the staples into boolean masks, colors are
+assigned to a mask in one array operation and apply() writes all stap_colors back
+in one pass.
+
+Example
+-------
+staple_colors = StapleColors(design, reset=True)
+staple_colors.set(staple_colors.select(helix_nums=[0, 2], bases=(16, 80)), PALETTE[11])
+staple_colors.set(staple_colors.select(lengths=(0, 31)), PALETTE[8])
+staple_colors.apply()
+"""
+
+import numpy as np
+
+import sequences
+
+PALETTE = np.array([13369344, 243362, 1507550, 16204552, 8947848, 12060012, 29184, 5749504, 7536862, 3355443,
+                    11184640, 16225054], dtype=np.int64)
+GREY = 8947848
+
+
+def cycle(i):
+    """ Returns the color(s) PALETTE[i % len(PALETTE)], i can be an array. """
+    return PALETTE[np.asarray(i, dtype=np.int64) % len(PALETTE)]
+
+
+class StapleColors(object):
+    """
+    The colors of all staples of a design, one entry per staple in the order of findStaples().
+
+    Parameters
+    ----------
+    design : Design
+    reset : bool
+        Use reset=True to start with all staples grey, otherwise the current stap_colors are read.
+
+    Attributes
+    ----------
+    vstrand_nums, helix_nums, base_nums : array_like
+        the 5' end of every staple
+    lengths : array_like
+        the number of bases of every staple
+    rank : array_like
+        the number of staples that start before it on the same helix, like the index in vstrands[i]['stap_colors']
+    count : array_like
+        the number of staples that start on the same helix
+    colors : array_like
+        the color of every staple
+    """
+
+    def __init__(self, design, reset=False):
+        self.design = design
+        strands = design.strands('stap')
+        keys = np.array(strands.keys(circular=False), dtype=np.int64)
+        self.vstrand_nums, self.base_nums = np.divmod(keys, design.num_bases)
+        self.helix_nums = strands.helix_nums[self.vstrand_nums]
+        self.lengths = strands.lengths(circular=False)
+        counts = np.bincount(self.vstrand_nums, minlength=design.num_helices)
+        self.rank = np.arange(len(keys)) - (np.cumsum(counts) - counts)[self.vstrand_nums]
+        self.count = counts[self.vstrand_nums]
+        self.colors = np.full(len(keys), GREY, dtype=np.int64)
+        if not reset and len(keys):
+            # Every staple keeps the color of the stap_colors row at its 5' end.
+            color_keys = (sequences.segment_ids(design.color_offsets) * design.num_bases
+                          + design.stap_colors[:, 0].astype(np.int64))
+            positions = np.minimum(np.searchsorted(keys, color_keys), len(keys) - 1)
+            found = keys[positions] == color_keys
+            self.colors[positions[found]] = design.stap_colors[found, 1]
+
+    def __len__(self):
+        return len(self.colors)
+
+    def select(self, helix_nums=None, vstrand_nums=None, bases=None, lengths=None, ranks=None, where=None):
+        """
+        Returns a boolean mask of the staples that match all given conditions.
+
+        Parameters
+        ----------
+        helix_nums, vstrand_nums : array_like
+            the helices the staples start on
+        bases : tuple
+            (first_base, last_base), the staples that start in between
+        lengths : tuple
+            (shortest, longest) length
+        ranks : array_like
+            the ranks of the staples on their helix, negative ranks count from the last staple
+        where : callable
+            gets this StapleColors and returns a mask, e.g. lambda s: s.rank % 2 == 1
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if helix_nums is not None:
+            mask &= np.isin(self.helix_nums, helix_nums)
+        if vstrand_nums is not None:
+            mask &= np.isin(self.vstrand_nums, vstrand_nums)
+        if bases is not None:
+            mask &= (self.base_nums >= bases[0]) & (self.base_nums <= bases[1])
+        if lengths is not None:
+            mask &= (self.lengths >= lengths[0]) & (self.lengths <= lengths[1])
+        if ranks is not None:
+            ranks = np.atleast_1d(np.asarray(ranks, dtype=np.int64))
+            mask &= (np.isin(self.rank, ranks[ranks >= 0]) |
+                     np.isin(self.rank - self.count, ranks[ranks < 0]))
+        if where is not None:
+            mask &= np.asarray(where(self), dtype=bool)
+        return mask
+
+    def set(self, selection, colors):
+        """
+        Colors the selected staples.
+
+        Parameters
+        ----------
+        selection : array_like
+            a mask from select(), staple indices, or None for all staples
+        colors : int or array_like
+            one color, or one color per selected staple
+        """
+        if selection is None:
+            selection = slice(None)
+        self.colors[selection] = colors
+
+    def set_bins(self, values, bins, selection=None):
+        """
+        Colors the staples by the bin their value falls in, see np.digitize, values has one entry per staple.
+        """
+        if selection is None:
+            selection = slice(None)
+        self.colors[selection] = cycle(np.digitize(np.asarray(values)[selection], bins))
+
+    def apply(self):
+        """ Writes the colors to the stap_colors of the design, in one pass. """
+        self.design.set_colors(self.vstrand_nums, self.base_nums, self.colors)
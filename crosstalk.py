@@ -0,0 +1,159 @@
+"""
+Sequence cross-talk checker.
+
+Every k-mer of the target sequences (scaffold, staples, handles) is packed into
+an int64 with 2 bits per base and kept in one sorted array. A query is checked
+by packing the k-mers of its reverse complement and looking them all up with
+np.searchsorted, so thousands of handles against a scaffold take milliseconds.
+Hits on the same diagonal are joined into one complementary stretch.
+
+Example
+-------
+hits = check_crosstalk({'handle 0': 'TTACGTTGCA'}, scaffold=maxiscaf_seq, k=6)
+hits[0]
+>>>> ('handle 0', 2, 'scaffold', 4120, 7, 'ACGTTGC')
+"""
+
+import numpy as np
+
+import analytics
+import sequences
+
+
+def kmer_codes(bases, offsets, k):
+    """
+    Packs all k-mers of a batch of sequences.
+
+    Parameters
+    ----------
+    bases, offsets : array_like
+        base indices and offsets, see analytics.encode_bases
+    k : int
+        at most 31
+
+    Returns
+    -------
+    codes, seq_ids, positions : array_like
+        the packed k-mer, the sequence and the position of every k-mer without characters other than ACGT
+    """
+    if not 0 < k < 32:
+        raise ValueError('k must lie between 1 and 31.')
+    num_windows = len(bases) - k + 1
+    if num_windows <= 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(bases, k)
+    codes = windows.dot(4**np.arange(k - 1, -1, -1, dtype=np.int64))
+    invalid = np.zeros(len(bases) + 1, dtype=np.int64)
+    np.cumsum(bases > 3, out=invalid[1:])
+    seq_ids = sequences.segment_ids(offsets)[:num_windows]
+    positions = np.arange(num_windows) - offsets[seq_ids]
+    # Keep the windows that lie within one sequence and hold only ACGT.
+    keep = (positions + k <= np.diff(offsets)[seq_ids]) & (invalid[k:] == invalid[:num_windows])
+    return codes[keep], seq_ids[keep], positions[keep]
+
+
+class KmerIndex(object):
+    """
+    All k-mers of a set of target sequences, sorted by their 2-bit packed code.
+
+    Parameters
+    ----------
+    targets : dict or list
+        {name: sequence}, or a list of sequences that are named by their index
+    k : int
+        the shortest complementary stretch that is reported
+    circular : list
+        names of the targets that are circular, like the scaffold, their k-mers wrap around
+    """
+
+    def __init__(self, targets, k=8, circular=()):
+        self.names, seqs = _named(targets)
+        self.lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+        circular = set(circular)
+        seqs = [seq + seq[:k - 1] if name in circular else seq for name, seq in zip(self.names, seqs)]
+        self.k = k
+        codes, self.seq_ids, self.positions = kmer_codes(*analytics.encode_bases(seqs), k=k)
+        order = np.argsort(codes, kind='stable')
+        self.codes, self.seq_ids, self.positions = codes[order], self.seq_ids[order], self.positions[order]
+
+    def complements(self, queries):
+        """
+        Finds the stretches of at least k bases in the targets that are complementary to a query.
+
+        Parameters
+        ----------
+        queries : dict or list
+            {name: sequence}, or a list of sequences that are named by their index
+
+        Returns
+        -------
+        hits : list
+            (query_name, query_start, target_name, target_start, length, query_stretch) per stretch,
+            longest first. The target stretch is the reverse complement of the query stretch.
+        """
+        names, seqs = _named(queries)
+        rc_seqs = sequences.reverse_complement_batch(seqs)
+        bases, offsets = analytics.encode_bases(rc_seqs)
+        codes, query_ids, rc_positions = kmer_codes(bases, offsets, self.k)
+        first = np.searchsorted(self.codes, codes, side='left')
+        counts = np.searchsorted(self.codes, codes, side='right') - first
+        # Every (query k-mer, matching target k-mer) pair.
+        query_ids, rc_positions = np.repeat(query_ids, counts), np.repeat(rc_positions, counts)
+        matches = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        target_ids, target_positions = self.seq_ids[matches], self.positions[matches]
+        query_positions = np.diff(offsets)[query_ids] - self.k - rc_positions
+        # Along a stretch the query moves forward while the target moves back, query + target is constant.
+        diagonals = query_positions + target_positions
+        order = np.lexsort((query_positions, diagonals, target_ids, query_ids))
+        query_ids, target_ids = query_ids[order], target_ids[order]
+        query_positions, target_positions, diagonals = query_positions[order], target_positions[order], diagonals[order]
+        new = np.ones(len(order), dtype=bool)
+        new[1:] = ((query_ids[1:] != query_ids[:-1]) | (target_ids[1:] != target_ids[:-1]) |
+                   (diagonals[1:] != diagonals[:-1]) | (query_positions[1:] != query_positions[:-1] + 1))
+        starts = np.flatnonzero(new)
+        stops = np.append(starts[1:], len(order)) - 1
+        hits = []
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            query_id, query_start = int(query_ids[start]), int(query_positions[start])
+            length = self.k + stop - start
+            target_id = int(target_ids[start])
+            target_start = int(target_positions[stop]) % self.lengths[target_id]
+            hits.append((names[query_id], query_start, self.names[target_id], int(target_start), length,
+                         seqs[query_id][query_start:query_start + length]))
+        hits.sort(key=lambda hit: -hit[4])
+        return hits
+
+
+def _named(seqs):
+    if isinstance(seqs, dict):
+        return list(seqs.keys()), list(seqs.values())
+    seqs = list(seqs)
+    return list(range(len(seqs))), seqs
+
+
+def check_crosstalk(handles, staples=(), scaffold='', k=8):
+    """
+    Checks the handles against the scaffold, the staples and each other.
+
+    Parameters
+    ----------
+    handles, staples : dict or list
+        {name: sequence}, or lists of sequences that are named 'handle i' and 'staple i'
+    scaffold : str
+        the circular scaffold sequence
+    k : int
+        the shortest complementary stretch that is reported
+
+    Returns
+    -------
+    hits : list
+        see KmerIndex.complements
+    """
+    if not isinstance(handles, dict):
+        handles = dict(('handle %d' % i, seq) for i, seq in enumerate(handles))
+    if not isinstance(staples, dict):
+        staples = dict(('staple %d' % i, seq) for i, seq in enumerate(staples))
+    targets = {'scaffold': scaffold} if scaffold else {}
+    targets.update(staples)
+    targets.update(handles)
+    return KmerIndex(targets, k, circular=['scaffold']).complements(handles)
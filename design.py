@@ -0,0 +1,339 @@
+"""
+Compact, array-backed representation of a cadnano2 design.
+
+The cadnano2 *.json format stores every base of every helix as a nested list
+(scaf, stap) or as a flat list (skip, loop). `Design` keeps these in
+contiguous int32 NumPy arrays and can always write back a *.json file that
+cadnano2 reads exactly as before.
+"""
+
+from contextlib import contextmanager
+
+import numpy as np
+
+import instrumentation
+from lattice import LatticeMap, detect_lattice, get_lattice
+from streaming import ARRAY_KEYS, read_json, stack_vstrands, write_json
+from strands import StrandIndex
+
+
+class VStrand(object):
+    """
+    A view on one helix of a `Design` that can be indexed like the cadnano2 vstrand dict.
+
+    vstrand['stap'] and vstrand['scaf'] return (num_bases, 4) array views,
+    vstrand['skip'] and vstrand['loop'] (num_bases,) views and vstrand['stap_colors']
+    a (num_colors, 2) view of [base_num, color] rows. The views are read-only outside
+    design.editing(), so that the strands and the journal see every write:
+
+    with design.editing('stap', [[6], [7]], [19, 210]):
+        vstrands[6]['stap'][19] = [6, 20, 6, 210]
+        ...
+    """
+    __slots__ = ('design', 'vstrand_num')
+
+    def __init__(self, design, vstrand_num):
+        self.design = design
+        self.vstrand_num = vstrand_num
+
+    def __getitem__(self, key):
+        if key == 'stap_colors':
+            view = self.design.helix_colors(self.vstrand_num)
+        elif key in ARRAY_KEYS:
+            view = getattr(self.design, key)[self.vstrand_num]
+        else:
+            return self.design.meta[self.vstrand_num][key]
+        if not self.design._editing:
+            view.flags.writeable = False
+        return view
+
+    def __setitem__(self, key, value):
+        if key == 'stap_colors':
+            self.design.set_helix_colors(self.vstrand_num, value)
+        elif key in ARRAY_KEYS:
+            with self.design.editing(key, self.vstrand_num, np.arange(self.design.num_bases)):
+                getattr(self.design, key)[self.vstrand_num] = value
+        else:
+            self.design.meta[self.vstrand_num][key] = value
+
+    def __contains__(self, key):
+        return key in self.design.meta[self.vstrand_num]
+
+    def keys(self):
+        return self.design.meta[self.vstrand_num].keys()
+
+
+class Design(object):
+    """
+    A cadnano2 design with all per-base data stored in contiguous int32 arrays.
+
+    Attributes
+    ----------
+    scaf, stap : array_like
+        int32 arrays of shape (num_helices, num_bases, 4) with
+        [prev_helix, prev_base, next_helix, next_base] for every base.
+    skip, loop : array_like
+        int32 arrays of shape (num_helices, num_bases).
+    stap_colors : array_like
+        int32 array of shape (num_colors, 2) with [base_num, color] rows of all helices,
+        the rows of vstrand i are stap_colors[color_offsets[i]:color_offsets[i+1]].
+    color_offsets : array_like
+        int64 array of shape (num_helices + 1,)
+    meta : list
+        the remaining (non-array) entries of every vstrand, e.g. 'num', 'row' and 'col'.
+    data : dict
+        the top level entries of the *.json file, except 'vstrands'.
+    idx : dict
+        maps "user interface" helix numbers to vstrand indices.
+    polarity : dict
+        maps vstrand indices to col + row.
+    lattice : Lattice
+        the square or honeycomb lattice, see lattice.py
+    lattice_map : LatticeMap
+        the polarity, neighbours and crossover positions of the helices
+    period : int
+        The period of repeating segments of the staples, by default the period of the lattice,
+        32 in the square and 21 in the honeycomb lattice.
+    load_stats : dict
+        'seconds' and 'process_peak_rss_mb' of Design.load, None for designs that were not loaded from a file.
+    journal : Journal
+        the journal that records the old values of edited bases, None by default, see journal.py
+
+    Example
+    -------
+    design = Design.load('ruler_input.json')
+    design[0]['stap'][47]
+    >>>> array([ 0, 48,  0, 46], dtype=int32)
+    """
+
+    def __init__(self, data, meta, scaf, stap, skip, loop, stap_colors, color_offsets, period=None, lattice=None):
+        self.data = data
+        self.meta = meta
+        self.scaf = scaf
+        self.stap = stap
+        self.skip = skip
+        self.loop = loop
+        self.stap_colors = stap_colors
+        self.color_offsets = color_offsets
+        self.num_helices, self.num_bases = skip.shape
+        self.lattice = detect_lattice(self.num_bases) if lattice is None else get_lattice(lattice)
+        self.period = self.lattice.period if period is None else period
+        self.lattice_map = LatticeMap.of_design(self.lattice, meta)
+        self.idx = dict((vstrand['num'], vstrand_num) for vstrand_num, vstrand in enumerate(meta))
+        self.polarity = dict(enumerate(self.lattice_map.polarity.tolist()))
+        self.vstrands = [VStrand(self, vstrand_num) for vstrand_num in range(self.num_helices)]
+        self._strands = {}
+        self.load_stats = None
+        self.journal = None
+        self._editing = 0
+
+    @classmethod
+    def from_json(cls, data, period=None, lattice=None):
+        """
+        Creates a Design from the dict that json.load returns for a cadnano2 file.
+
+        Parameters
+        ----------
+        data : dict
+            The loaded *.json data, it is not modified.
+        period : int
+            The period of repeating segments of the staples, by default the period of the lattice.
+        lattice : str
+            'square' or 'honeycomb', by default found from the number of bases like cadnano2 does.
+        """
+        meta = [dict((key, None if key in ARRAY_KEYS else value) for key, value in vstrand.items())
+                for vstrand in data['vstrands']]
+        arrays = dict((key, [np.array(vstrand[key], dtype=np.int32) for vstrand in data['vstrands']])
+                      for key in ARRAY_KEYS)
+        top = dict((key, None if key == 'vstrands' else value) for key, value in data.items())
+        return cls(period=period, lattice=lattice, **stack_vstrands(top, meta, arrays))
+
+    @classmethod
+    def load(cls, file_name, period=None, lattice=None):
+        """
+        Loads a cadnano2 *.json file, one vstrand at a time.
+
+        Parameters
+        ----------
+        file_name : str
+            The name and location of the *.json file
+        period, lattice
+            see from_json
+        """
+        parts, stats = read_json(file_name)
+        design = cls(period=period, lattice=lattice, **parts)
+        design.load_stats = stats
+        return design
+
+    def load_report(self, file_name=''):
+        """
+        Returns a one line report of the time it took to load the design and the peak memory of the process
+        so far, which includes everything that ran before the load.
+        """
+        if self.load_stats is None:
+            return 'Design %s was not loaded from a file.' % file_name
+        peak = self.load_stats['process_peak_rss_mb']
+        cached = ' from cache' if self.load_stats.get('cached') else ''
+        return 'Loaded %s%s in %.3f s, process peak RSS %s MB' % (file_name, cached, self.load_stats['seconds'],
+                                                                  'unknown' if peak is None else '%.1f' % peak)
+
+    def to_json(self):
+        """
+        Returns the design as the dict structure of a cadnano2 *.json file.
+        """
+        scaf = self.scaf.tolist()
+        stap = self.stap.tolist()
+        skip = self.skip.tolist()
+        loop = self.loop.tolist()
+        vstrands = []
+        for vstrand_num, meta in enumerate(self.meta):
+            arrays = {'scaf': scaf[vstrand_num], 'stap': stap[vstrand_num], 'skip': skip[vstrand_num],
+                      'loop': loop[vstrand_num], 'stap_colors': self.helix_colors(vstrand_num).tolist()}
+            vstrand = dict(meta)
+            for key in ARRAY_KEYS:
+                vstrand[key] = arrays[key]
+            vstrands.append(vstrand)
+        data = dict(self.data)
+        data['vstrands'] = vstrands
+        return data
+
+    def save(self, file_name):
+        """
+        Saves the design as a *.json file that can still be read by cadnano2.
+
+        Parameters
+        ----------
+        file_name : str
+            The name and location of the *.json file
+        """
+        write_json(self, file_name)
+
+    def strands(self, parity='stap'):
+        """
+        Returns the StrandIndex of all 'scaf' or 'stap' strands.
+
+        The index is traced once and shared by all callers. The editing functions
+        call edited() to update it locally, touch() makes it trace everything again.
+        """
+        if parity not in self._strands:
+            self._strands[parity] = StrandIndex(self, parity)
+        return self._strands[parity]
+
+    def set_strands(self, strands):
+        """ Uses an already traced StrandIndex, e.g. one that was read from the cache. """
+        self._strands[strands.parity] = strands
+
+    def edited(self, parity, vstrand_nums, base_nums):
+        """
+        Tells the design that the 'scaf' or 'stap' pointers of a few bases were changed.
+
+        A traced StrandIndex is updated locally instead of being traced again.
+
+        Parameters
+        ----------
+        parity : str
+            'scaf' or 'stap'
+        vstrand_nums, base_nums : array_like
+            the edited bases, both are broadcast against each other.
+        """
+        if instrumentation.enabled():
+            instrumentation.count('bases edited', np.broadcast(vstrand_nums, base_nums).size)
+        if parity in self._strands:
+            vstrand_nums, base_nums = np.broadcast_arrays(np.asarray(vstrand_nums, dtype=np.int64),
+                                                          np.asarray(base_nums, dtype=np.int64))
+            try:
+                self._strands[parity].update(self, (vstrand_nums * self.num_bases + base_nums).ravel())
+            except ValueError:
+                self.touch(parity)
+                raise
+
+    @contextmanager
+    def editing(self, key, vstrand_nums=None, base_nums=None):
+        """
+        Wraps writes to the 'scaf', 'stap', 'skip' or 'loop' values of a few bases,
+        or with key='stap_colors' to the staple colors.
+
+        The journal records their old values before the with block and edited()
+        updates the strands after it, if the block raises the strands are traced
+        again when they are needed. Inside the block the views of the vstrands
+        can be written to.
+
+        Example
+        -------
+        with design.editing('stap', [[6], [7]], [19, 210]):
+            design.stap[6, 19] = [6, 20, 6, 210]
+            ...
+        """
+        if key == 'stap_colors':
+            if self.journal is not None:
+                self.journal.record_colors()
+        else:
+            vstrand_nums, base_nums = np.broadcast_arrays(np.asarray(vstrand_nums, dtype=np.int64),
+                                                          np.asarray(base_nums, dtype=np.int64))
+            if self.journal is not None:
+                self.journal.record(key, vstrand_nums, base_nums)
+        self._editing += 1
+        try:
+            yield
+        except BaseException:
+            if key in ('scaf', 'stap'):
+                self.touch(key)
+            raise
+        finally:
+            self._editing -= 1
+        if key in ('scaf', 'stap'):
+            self.edited(key, vstrand_nums, base_nums)
+
+    def touch(self, parity=None):
+        """
+        Tells the design that the 'scaf' or 'stap' pointers (default both) were changed,
+        call this after writing to the arrays directly.
+        """
+        for key in [parity] if parity else list(self._strands):
+            self._strands.pop(key, None)
+
+    def helix_colors(self, vstrand_num):
+        """
+        Returns a view of the [base_num, color] rows of the staples that start on vstrand_num.
+        """
+        return self.stap_colors[self.color_offsets[vstrand_num]:self.color_offsets[vstrand_num + 1]]
+
+    def set_helix_colors(self, vstrand_num, colors):
+        """
+        Replaces the [base_num, color] rows of vstrand_num.
+        """
+        if self.journal is not None:
+            self.journal.record_colors()
+        colors = np.asarray(colors, dtype=np.int32).reshape(-1, 2)
+        start, stop = self.color_offsets[vstrand_num], self.color_offsets[vstrand_num + 1]
+        self.stap_colors = np.concatenate([self.stap_colors[:start], colors, self.stap_colors[stop:]])
+        self.color_offsets[vstrand_num + 1:] += len(colors) - (stop - start)
+
+    def set_colors(self, vstrand_nums, base_nums, colors):
+        """
+        Replaces the [base_num, color] rows of all vstrands at once.
+
+        Parameters
+        ----------
+        vstrand_nums, base_nums, colors : array_like
+            One entry per staple, sorted by vstrand_num.
+        """
+        if self.journal is not None:
+            self.journal.record_colors()
+        self.stap_colors = np.column_stack([base_nums, colors]).astype(np.int32).reshape(-1, 2)
+        counts = np.bincount(np.asarray(vstrand_nums, dtype=np.int64), minlength=self.num_helices)
+        self.color_offsets = np.zeros(self.num_helices + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.color_offsets[1:])
+
+    def helix_num(self, vstrand_num):
+        """ Returns the "user interface" helix number of vstrand_num. """
+        return self.meta[vstrand_num]['num']
+
+    def __len__(self):
+        return self.num_helices
+
+    def __getitem__(self, vstrand_num):
+        return self.vstrands[vstrand_num]
+
+    def __iter__(self):
+        return iter(self.vstrands)
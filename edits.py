@@ -0,0 +1,253 @@
+"""
+Vectorized editing operations on a `Design`.
+
+Every function takes arrays of helix numbers and base numbers and applies the
+edit to all of them in one NumPy operation. A 1-D array of bases is applied to
+every helix, a 2-D array of shape (len(helix_nums), n) gives every helix its own
+bases. All bases are checked before anything is changed, and the changed bases
+are written in design.editing() so the strands and the journal follow them.
+
+Example
+-------
+insert_breaks(design, [0, 2, 4, 6], pattern(39, 32, 6))
+>>>> inserts 6 breaks, 32 bases apart, in the staples of helix 0, 2, 4 and 6
+"""
+
+import numpy as np
+
+import coloring
+import sequences
+
+
+def pattern(start, step, num):
+    """
+    Returns the bases start, start + step, ..., start + (num - 1)*step.
+    """
+    return start + step*np.arange(num, dtype=np.int64)
+
+
+def _rows(design, helix_nums):
+    """ Translates helix numbers to vstrand indices. """
+    helix_nums = np.atleast_1d(np.asarray(helix_nums, dtype=np.int64))
+    missing = [helix_num for helix_num in np.unique(helix_nums).tolist() if helix_num not in design.idx]
+    if missing:
+        raise ValueError('The design has no helices %s.' % missing)
+    return np.array([design.idx[helix_num] for helix_num in helix_nums.tolist()], dtype=np.int64).reshape(helix_nums.shape)
+
+
+def _grid(design, helix_nums, base_nums, width=1):
+    """
+    Returns the flat (helix_nums, rows, bases) of every helix x base combination
+    and checks that base ... base + width - 1 lie in the design.
+    """
+    helix_nums = np.atleast_1d(np.asarray(helix_nums, dtype=np.int64))
+    base_nums = np.asarray(base_nums, dtype=np.int64)
+    if base_nums.ndim < 2:
+        base_nums = base_nums.reshape(1, -1)
+    helix_nums, base_nums = np.broadcast_arrays(helix_nums.reshape(-1, 1), base_nums)
+    helix_nums, base_nums = helix_nums.ravel(), base_nums.ravel()
+    _check_bases(design, base_nums, width)
+    return helix_nums, _rows(design, helix_nums), base_nums
+
+
+def _check_bases(design, base_nums, width=1):
+    if len(base_nums) and (base_nums.min() < 0 or base_nums.max() + width > design.num_bases):
+        raise IndexError('Bases must lie between 0 and %d.' % (design.num_bases - width))
+
+
+def _odd(design, rows):
+    """ Returns True for the rows with an odd polarity. """
+    return design.lattice_map.odd[rows]
+
+
+def insert_breaks(design, helix_nums, base_nums, parity='stap'):
+    """
+    Inserts breaks between base and base + 1.
+
+    Parameters
+    ----------
+    design : Design
+    helix_nums : int or array_like
+        the helices where you want to insert breaks
+    base_nums : array_like
+        the bases, see the module docstring
+    parity : str
+        'stap' (default) or 'scaf'
+    """
+    helix_nums, rows, bases = _grid(design, helix_nums, base_nums, width=2)
+    strand = getattr(design, parity)
+    # The staples of a helix with even polarity run to lower bases, the scaffold to higher bases.
+    odd = _odd(design, rows) != (parity == 'scaf')
+    with design.editing(parity, np.concatenate([rows, rows]), np.concatenate([bases, bases + 1])):
+        strand[rows[~odd], bases[~odd], :2] = -1
+        strand[rows[~odd], bases[~odd] + 1, 2:] = -1
+        strand[rows[odd], bases[odd], 2:] = -1
+        strand[rows[odd], bases[odd] + 1, :2] = -1
+
+
+def join_staples(design, helix_nums, base_nums):
+    """
+    Joins the staples that have a break between base and base + 1.
+    """
+    helix_nums, rows, bases = _grid(design, helix_nums, base_nums, width=2)
+    odd = _odd(design, rows)
+    even = ~odd
+    with design.editing('stap', np.concatenate([rows, rows]), np.concatenate([bases, bases + 1])):
+        design.stap[rows[even], bases[even], :2] = np.column_stack([helix_nums[even], bases[even] + 1])
+        design.stap[rows[even], bases[even] + 1, 2:] = np.column_stack([helix_nums[even], bases[even]])
+        design.stap[rows[odd], bases[odd], 2:] = np.column_stack([helix_nums[odd], bases[odd] + 1])
+        design.stap[rows[odd], bases[odd] + 1, :2] = np.column_stack([helix_nums[odd], bases[odd]])
+
+
+def remove_crossovers(design, helix_nums, base_nums, side='left'):
+    """
+    Removes the staple crossovers that start at the given bases.
+
+    Parameters
+    ----------
+    side : string
+        the side at which the staple makes the crossover, ___| is right, |___ is left
+    """
+    helix_nums, rows, bases = _grid(design, helix_nums, base_nums)
+    # (even & left) or (odd & right) crossovers leave through the next pointer.
+    forward = ~_odd(design, rows) == (side == 'left')
+    partners = np.where(forward, design.stap[rows, bases, 2], design.stap[rows, bases, 0])
+    if (partners == -1).any():
+        raise ValueError('There is no staple crossover at %d of the bases.' % (partners == -1).sum())
+    partner_rows = _rows(design, partners)
+    with design.editing('stap', np.concatenate([rows, partner_rows]), np.concatenate([bases, bases])):
+        design.stap[rows[forward], bases[forward], 2:] = -1
+        design.stap[partner_rows[forward], bases[forward], :2] = -1
+        design.stap[rows[~forward], bases[~forward], :2] = -1
+        design.stap[partner_rows[~forward], bases[~forward], 2:] = -1
+
+
+def insert_deletions(design, base_nums, helix_nums=None):
+    """
+    Inserts deletions (skip = -1) at the given bases.
+
+    Parameters
+    ----------
+    helix_nums : array_like
+        By default all helices that have scaffold in the middle of the design.
+    """
+    if helix_nums is None:
+        rows = np.nonzero((design.scaf[:, design.num_bases//2] != -1).any(axis=1))[0]
+        helix_nums = [design.helix_num(row) for row in rows.tolist()]
+    helix_nums, rows, bases = _grid(design, helix_nums, base_nums)
+    with design.editing('skip', rows, bases):
+        design.skip[rows, bases] = -1
+
+
+def remove_staples(design, helix_nums, base_nums):
+    """
+    Removes the staples from the given (leftmost) base up to where they leave the helix or end.
+
+    The stap_colors rows of removed 5' ends are dropped and the staples that get a
+    new 5' end keep their color there.
+    """
+    helix_nums, rows, bases = _grid(design, helix_nums, base_nums)
+    helix_rows, inverse = np.unique(rows, return_inverse=True)
+    odd = _odd(design, helix_rows)
+    # A staple segment runs to the right until the first base whose next (odd) or prev (even)
+    # is not the base to its right, where the staple ends or leaves the helix.
+    to_right = np.where(odd[:, None, None], design.stap[helix_rows, :, 2:], design.stap[helix_rows, :, :2])
+    own_helix = np.array([design.helix_num(row) for row in helix_rows.tolist()], dtype=np.int64)
+    stop = (to_right[:, :, 0] != own_helix[:, None]) | (to_right[:, :, 1] != np.arange(1, design.num_bases + 1))
+    positions = np.where(stop, np.arange(design.num_bases), design.num_bases)
+    next_stop = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1]
+    ends = next_stop[inverse.ravel(), bases]
+    # Mark every base from start to end with a running sum over +1/-1 boundaries.
+    boundaries = np.zeros((len(helix_rows), design.num_bases + 1), dtype=np.int64)
+    np.add.at(boundaries, (inverse.ravel(), bases), 1)
+    np.add.at(boundaries, (inverse.ravel(), ends + 1), -1)
+    removed_rows, removed_bases = np.nonzero(np.cumsum(boundaries, axis=1)[:, :-1] > 0)
+    removed_rows = helix_rows[removed_rows]
+    # The bases before and after the removed ones, e.g. across a crossover, no longer point to them.
+    removed = np.zeros(design.stap.shape[:2], dtype=bool)
+    removed[removed_rows, removed_bases] = True
+    pointers = design.stap[removed_rows, removed_bases].astype(np.int64)
+    edited_rows, edited_bases, backs = [removed_rows], [removed_bases], []
+    for pointer, back in [(slice(0, 2), slice(2, 4)), (slice(2, 4), slice(0, 2))]:
+        linked = pointers[pointers[:, pointer][:, 0] != -1, pointer]
+        rows, bases = _rows(design, linked[:, 0]), linked[:, 1]
+        outside = ~removed[rows, bases]
+        edited_rows.append(rows[outside])
+        edited_bases.append(bases[outside])
+        backs.append(back)
+    # The bases after the removed ones lose their prev pointer and become 5' ends.
+    new_starts = edited_rows[2] * design.num_bases + edited_bases[2]
+    old_keys = design.strands('stap').strand_of[new_starts]
+    with design.editing('stap', np.concatenate(edited_rows), np.concatenate(edited_bases)):
+        for rows, bases, back in zip(edited_rows[1:], edited_bases[1:], backs):
+            design.stap[rows, bases, back] = -1
+        design.stap[removed_rows, removed_bases] = -1
+    _move_colors(design, removed_rows * design.num_bases + removed_bases, new_starts, old_keys)
+
+
+def _move_colors(design, removed, new_starts, old_keys):
+    """
+    Drops the stap_colors rows of the removed bases and gives every new 5' end
+    the color of the staple (old_keys) it was part of, grey if it had none.
+    """
+    # A base without next pointer is no staple anymore.
+    linked = design.stap.reshape(-1, 4)[new_starts, 2] != -1
+    new_starts, old_keys = new_starts[linked], old_keys[linked]
+    vstrand_nums = sequences.segment_ids(design.color_offsets)
+    base_nums = design.stap_colors[:, 0].astype(np.int64)
+    color_keys = vstrand_nums * design.num_bases + base_nums
+    color_of = dict(zip(color_keys.tolist(), design.stap_colors[:, 1].tolist()))
+    keep = ~np.isin(color_keys, removed)
+    if keep.all() and not len(new_starts):
+        return
+    vstrand_nums = np.concatenate([vstrand_nums[keep], new_starts // design.num_bases])
+    base_nums = np.concatenate([base_nums[keep], new_starts % design.num_bases])
+    colors = np.concatenate([design.stap_colors[keep, 1],
+                             [color_of.get(key, coloring.GREY) for key in old_keys.tolist()]]).astype(np.int64)
+    order = np.lexsort((base_nums, vstrand_nums))
+    design.set_colors(vstrand_nums[order], base_nums[order], colors[order])
+
+
+def insert_scaffold_crossovers(design, up_helix_nums, bot_helix_nums, base_nums):
+    """
+    Inserts scaffold crossovers between up_helix and bot_helix at base and base + 1.
+
+    Parameters
+    ----------
+    up_helix_nums, bot_helix_nums : int or array_like
+        The numbers of the top and bottom helices.
+    base_nums : int or array_like
+        The number of the left base.
+    """
+    up, bot, bases = np.broadcast_arrays(np.asarray(up_helix_nums, dtype=np.int64),
+                                         np.asarray(bot_helix_nums, dtype=np.int64),
+                                         np.asarray(base_nums, dtype=np.int64))
+    up, bot, bases = up.ravel(), bot.ravel(), bases.ravel()
+    _check_bases(design, bases, width=2)
+    up_rows, bot_rows = _rows(design, up), _rows(design, bot)
+    odd = _odd(design, up_rows)
+    with design.editing('scaf', np.concatenate([up_rows, up_rows, bot_rows, bot_rows]),
+                        np.concatenate([bases, bases + 1, bases, bases + 1])):
+        for mask, into, out in [(odd, slice(0, 2), slice(2, 4)), (~odd, slice(2, 4), slice(0, 2))]:
+            u, d, b = up_rows[mask], bot_rows[mask], bases[mask]
+            design.scaf[u, b, into] = np.column_stack([bot[mask], b])
+            design.scaf[u, b + 1, out] = np.column_stack([bot[mask], b + 1])
+            design.scaf[d, b, out] = np.column_stack([up[mask], b])
+            design.scaf[d, b + 1, into] = np.column_stack([up[mask], b + 1])
+
+
+def force_paths(design, helix_nums, starts, stops):
+    """
+    Forces paths between the staple ends start and stop on the same helix.
+    """
+    helix_nums, starts, stops = np.broadcast_arrays(np.asarray(helix_nums, dtype=np.int64),
+                                                    np.asarray(starts, dtype=np.int64),
+                                                    np.asarray(stops, dtype=np.int64))
+    helix_nums, starts, stops = helix_nums.ravel(), starts.ravel(), stops.ravel()
+    _check_bases(design, np.concatenate([starts, stops]))
+    rows = _rows(design, helix_nums)
+    odd = _odd(design, rows)
+    with design.editing('stap', np.concatenate([rows, rows]), np.concatenate([starts, stops])):
+        for mask, into, out in [(odd, slice(0, 2), slice(2, 4)), (~odd, slice(2, 4), slice(0, 2))]:
+            design.stap[rows[mask], starts[mask], into] = np.column_stack([helix_nums[mask], stops[mask]])
+            design.stap[rows[mask], stops[mask], out] = np.column_stack([helix_nums[mask], starts[mask]])
@@ -0,0 +1,155 @@
+"""
+Declarative handle attachment.
+
+A rule is a dict that says which staples get a handle and which handle they get.
+The staples are the rows [color, length, start, end, seq] that give_sequences
+returns. Rules are resolved through dict indexes over the colors, start and end
+pointers of the staples, so every rule only looks at the staples it can match and
+thousands of handles are attached in linear time. The input table is not changed.
+
+Rule keys
+---------
+color, start_helix, start_base, end_helix, end_base : value or list of values
+    the staples that match all of the given keys get the handle
+region : (helix_nums, first_base, last_base)
+    the staples that start on one of the helices between first_base and last_base
+handle : str
+    the handle sequence, or
+handles, key : dict, str
+    the handle for every value of the staple's key, e.g. {16: seq_a, 18: seq_b} and 'end_helix'
+linker : str
+    inserted between the staple and the handle, by default ''
+orientation : str
+    "3'" (default) appends linker + handle to the 3' end, "5'" puts handle + linker before the 5' end
+complement : bool
+    use the reverse complement of the handle, by default False
+
+Example
+-------
+rules = [{'color': 'cyan', 'end_helix': [0, 1], 'linker': 'TT',
+          'handles': {0: eight_mers[0], 1: eight_mers[5]}, 'key': 'end_helix'}]
+new_stap_output_ra, handle_dc = attach_handles(sorted_stap_output_ra, rules)
+"""
+
+import sequences
+import tables
+
+MATCH_KEYS = ('color', 'start_helix', 'start_base', 'end_helix', 'end_base')
+RULE_KEYS = MATCH_KEYS + ('region', 'handle', 'handles', 'key', 'linker', 'orientation', 'complement')
+
+
+def _values(value):
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+class StapleIndex(object):
+    """
+    Dict indexes from every match key value to the staple rows that have it.
+
+    Parameters
+    ----------
+    table : StrandTable
+    """
+
+    def __init__(self, table):
+        columns = [table.color, table.start_helix.tolist(), table.start_base.tolist(), table.end_helix.tolist(),
+                   table.end_base.tolist()]
+        self.fields = [dict(zip(MATCH_KEYS, values)) for values in zip(*columns)]
+        self.index = dict((key, {}) for key in MATCH_KEYS)
+        for row_num, fields in enumerate(self.fields):
+            for key in MATCH_KEYS:
+                self.index[key].setdefault(fields[key], []).append(row_num)
+
+    def candidates(self, conditions):
+        """
+        Returns the row numbers of the staples with the rarest condition value, in table order.
+        """
+        if not conditions:
+            return range(len(self.fields))
+        key, values = min(conditions, key=lambda condition: sum(len(self.index[condition[0]].get(value, ()))
+                                                                for value in condition[1]))
+        return sorted(row_num for value in values for row_num in self.index[key].get(value, ()))
+
+    def matches(self, conditions, region, row_num):
+        fields = self.fields[row_num]
+        for key, values in conditions:
+            if fields[key] not in values:
+                return False
+        if region is not None:
+            helix_nums, first_base, last_base = region
+            return fields['start_helix'] in helix_nums and first_base <= fields['start_base'] <= last_base
+        return True
+
+
+def _conditions(rule):
+    """ Returns the (key, set of values) the staples must match and the region of a rule. """
+    conditions = [(key, set(_values(rule[key]))) for key in MATCH_KEYS if key in rule]
+    region = None
+    if 'region' in rule:
+        helix_nums, first_base, last_base = rule['region']
+        region = (set(_values(helix_nums)), first_base, last_base)
+        conditions.append(('start_helix', region[0]))
+    return conditions, region
+
+
+def _check_rule(rule):
+    unknown = set(rule) - set(RULE_KEYS)
+    if unknown:
+        raise ValueError('Unknown handle rule keys %s.' % sorted(unknown))
+    if ('handle' in rule) == ('handles' in rule):
+        raise ValueError('A handle rule needs either a handle or handles and a key.')
+    if 'handles' in rule and rule.get('key') not in MATCH_KEYS:
+        raise ValueError('The key of a handle rule must be one of %s.' % (MATCH_KEYS,))
+    if rule.get('orientation', "3'") not in ("3'", "5'"):
+        raise ValueError("The orientation of a handle rule must be \"3'\" or \"5'\".")
+
+
+def attach_handles(stap_output_ra, rules):
+    """
+    Attaches handles to the staples that match the rules, in the order of the rules.
+
+    Parameters
+    ----------
+    stap_output_ra : StrandTable or list
+        the staples as returned by give_sequences, or rows [color, length, start, end, seq]
+    rules : list
+        dicts, see the module docstring
+
+    Returns
+    -------
+    new_stap_output_ra : StrandTable
+        a new table in the same order, the sequences include the handles, the length
+        column stays the designed staple length like in the old scripts, see total_length()
+    handle_dc : dict
+        maps 'handle at <end>' (or <start> for 5' handles) to all that was attached there,
+        e.g. to check it with crosstalk.check_crosstalk
+    """
+    for rule in rules:
+        _check_rule(rule)
+    table = tables.as_table(stap_output_ra)
+    index = StapleIndex(table)
+    prefixes = [''] * len(table)
+    suffixes = [''] * len(table)
+    handle_dc = {}
+    for rule in rules:
+        linker = rule.get('linker', '')
+        conditions, region = _conditions(rule)
+        for row_num in index.candidates(conditions):
+            if not index.matches(conditions, region, row_num):
+                continue
+            if 'handle' in rule:
+                handle = rule['handle']
+            else:
+                handle = rule['handles'].get(index.fields[row_num][rule['key']])
+                if handle is None:
+                    continue
+            if rule.get('complement'):
+                handle = sequences.reverse_complement(handle)
+            fields = index.fields[row_num]
+            if rule.get('orientation', "3'") == "3'":
+                suffixes[row_num] += linker + handle
+                handle_dc['handle at [%d, %d]' % (fields['end_helix'], fields['end_base'])] = suffixes[row_num]
+            else:
+                prefixes[row_num] = handle + linker + prefixes[row_num]
+                handle_dc['handle at [%d, %d]' % (fields['start_helix'], fields['start_base'])] = prefixes[row_num]
+    return table.with_seq([prefix + seq + suffix for prefix, seq, suffix in zip(prefixes, table.seq, suffixes)]), handle_dc
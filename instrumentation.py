@@ -0,0 +1,302 @@
+"""
+Opt-in timing, memory and counter instrumentation.
+
+The sequence pipeline and the editing functions mark their stages with
+stage(name) and count their work with count(name, n), e.g. 'bases visited',
+'strands traced' and 'sequences built'. Nothing is recorded unless a Recorder is
+active: stage() then returns one shared no-op context manager and count()
+returns after checking a global, so the marks cost nothing measurable.
+
+While a Recorder is active, every stage records its wall time, the memory that
+Python allocated during it (tracemalloc, with allocations=True) and the counts
+made while it ran, including those of the stages inside it. The records can be
+written as JSON, as a Chrome trace (chrome://tracing, Perfetto, speedscope) or
+as collapsed stacks for flamegraph.pl.
+
+Example
+-------
+with recording() as recorder:
+    scaf_table, stap_table = session.give_sequences()
+recorder.print_summary()
+recorder.write_trace('give_sequences.trace.json')
+"""
+
+from __future__ import print_function
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+_recorder = None
+
+
+class _NullStage(object):
+    """ The stage of a run without recorder, it does nothing. """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    __slots__ = ('recorder', 'name', 'record', 'start', 'start_memory', 'peak_memory')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.recorder._enter(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder._exit(self)
+        return False
+
+
+def enabled():
+    """ Returns True while a Recorder is active, to skip counting work that is expensive to count. """
+    return _recorder is not None
+
+
+def stage(name):
+    """
+    Returns a context manager that records the with block as a stage of the active Recorder.
+
+    Example
+    -------
+    with stage('scaffold layout'):
+        ...
+    """
+    if _recorder is None:
+        return _NULL_STAGE
+    return _Stage(_recorder, name)
+
+
+def count(name, n=1):
+    """ Adds n to the counter name of the running stages. """
+    if _recorder is not None:
+        _recorder.count(name, n)
+
+
+def staged(name=None):
+    """ Makes every call of a function a stage, by default named after the function. """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _Stage(_recorder, stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Recorder(object):
+    """
+    Records the stages and counters of one run, see the module docstring.
+
+    Parameters
+    ----------
+    allocations : bool
+        trace the memory of every stage with tracemalloc, which slows Python allocations down
+
+    Attributes
+    ----------
+    records : list
+        one dict per finished stage, in the order they finished, with 'name', 'path' (the names
+        of the stages it runs in and its own, joined by ';'), 'thread', 'start' and 'seconds'
+        since the recorder started, 'allocated_mb' (memory still allocated at its end),
+        'peak_mb' (the most memory allocated during it) and 'counters'
+    totals : dict
+        all counts, also those made outside a stage
+    """
+
+    def __init__(self, allocations=True):
+        self.allocations = allocations
+        self.records = []
+        self.totals = {}
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, stage):
+        stack = self._stack()
+        path = stack[-1].record['path'] + ';' + stage.name if stack else stage.name
+        stage.record = {'name': stage.name, 'path': path, 'thread': threading.current_thread().name,
+                        'start': 0.0, 'seconds': 0.0, 'allocated_mb': 0.0, 'peak_mb': 0.0, 'counters': {}}
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak_memory = max(stack[-1].peak_memory, peak)
+            # The peak is reset for every stage, the stages around it keep the highest peak they saw.
+            tracemalloc.reset_peak()
+            stage.start_memory = stage.peak_memory = current
+        stack.append(stage)
+        stage.start = time.perf_counter()
+
+    def _exit(self, stage):
+        end = time.perf_counter()
+        stack = self._stack()
+        stack.pop()
+        stage.record['start'] = stage.start - self._origin
+        stage.record['seconds'] = end - stage.start
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(stage.peak_memory, peak)
+            if stack:
+                stack[-1].peak_memory = max(stack[-1].peak_memory, peak)
+            stage.record['allocated_mb'] = (current - stage.start_memory) / 1024.0**2
+            stage.record['peak_mb'] = (peak - stage.start_memory) / 1024.0**2
+        self.records.append(stage.record)
+
+    def count(self, name, n=1):
+        """ Adds n to the counter name of the running stages of this thread and to the totals. """
+        self.totals[name] = self.totals.get(name, 0) + n
+        for running in self._stack():
+            counters = running.record['counters']
+            counters[name] = counters.get(name, 0) + n
+
+    def start(self):
+        """ Makes this the active recorder, see recording(). """
+        global _recorder
+        if _recorder is not None:
+            raise RuntimeError('Another recorder is already active.')
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._origin = time.perf_counter()
+        _recorder = self
+        return self
+
+    def stop(self):
+        """ Stops recording, the records are kept. """
+        global _recorder
+        if _recorder is self:
+            _recorder = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return self
+
+    def summary(self):
+        """
+        Returns one row per stage path, in the order the paths were first entered.
+
+        Returns
+        -------
+        rows : list
+            dicts with 'path', 'calls', 'seconds' (summed), 'self_seconds' (without the stages
+            inside it), 'allocated_mb' (summed), 'peak_mb' (highest) and 'counters' (summed)
+        """
+        rows = {}
+        for record in sorted(self.records, key=lambda record: record['start']):
+            row = rows.get(record['path'])
+            if row is None:
+                row = rows[record['path']] = {'path': record['path'], 'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0,
+                                              'allocated_mb': 0.0, 'peak_mb': 0.0, 'counters': {}}
+            row['calls'] += 1
+            row['seconds'] += record['seconds']
+            row['self_seconds'] += record['seconds']
+            row['allocated_mb'] += record['allocated_mb']
+            row['peak_mb'] = max(row['peak_mb'], record['peak_mb'])
+            for name, n in record['counters'].items():
+                row['counters'][name] = row['counters'].get(name, 0) + n
+        for record in self.records:
+            parent = record['path'].rpartition(';')[0]
+            if parent in rows:
+                rows[parent]['self_seconds'] -= record['seconds']
+        return list(rows.values())
+
+    def print_summary(self):
+        for row in self.summary():
+            counters = ', '.join('%s %d' % item for item in sorted(row['counters'].items()))
+            print('%-50s %5d x %10.3f ms %8.1f MB peak  %s' % ('  ' * row['path'].count(';') + row['path'].split(';')[-1],
+                                                              row['calls'], row['seconds'] * 1e3, row['peak_mb'],
+                                                              counters))
+
+    def to_json(self):
+        """ Returns the records and totals as a dict that json can write. """
+        return {'records': self.records, 'totals': self.totals, 'summary': self.summary()}
+
+    def write_json(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump(self.to_json(), f, indent=1)
+
+    def trace_events(self):
+        """ Returns the stages as complete ('X') events of the Chrome trace event format, times in microseconds. """
+        pid = os.getpid()
+        events = []
+        for record in sorted(self.records, key=lambda record: record['start']):
+            args = dict(record['counters'])
+            if self.allocations:
+                args.update(allocated_mb=record['allocated_mb'], peak_mb=record['peak_mb'])
+            events.append({'name': record['name'], 'cat': 'cadnano', 'ph': 'X', 'pid': pid, 'tid': record['thread'],
+                           'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6, 'args': args})
+        return events
+
+    def write_trace(self, file_name):
+        """ Writes a Chrome trace, it opens in chrome://tracing, ui.perfetto.dev and speedscope.app. """
+        with open(file_name, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
+
+    def collapsed(self):
+        """ Returns the stages as collapsed stacks, 'outer;inner microseconds' lines of the time spent in the stage itself. """
+        return ['%s %d' % (row['path'].replace(' ', '_'), round(max(row['self_seconds'], 0) * 1e6))
+                for row in self.summary()]
+
+    def write_collapsed(self, file_name):
+        """ Writes collapsed stacks, flamegraph.pl file_name > flamegraph.svg draws them. """
+        with open(file_name, 'w') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+
+
+class recording(object):
+    """
+    Records the stages of a with block, see the module docstring.
+
+    Parameters
+    ----------
+    allocations : bool
+        see Recorder
+    """
+
+    def __init__(self, allocations=True):
+        self.recorder = Recorder(allocations)
+
+    def __enter__(self):
+        return self.recorder.start()
+
+    def __exit__(self, *exc_info):
+        self.recorder.stop()
+        return False
+
+
+def start(allocations=True):
+    """ Starts recording until stop(), for scripts that can not put their cells in a with block. """
+    return Recorder(allocations).start()
+
+
+def stop():
+    """ Stops the active recorder and returns it, None if there was none. """
+    recorder = _recorder
+    if recorder is not None:
+        recorder.stop()
+    return recorder
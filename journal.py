@@ -0,0 +1,279 @@
+"""
+Undo/redo journal for the edits of a `Design`.
+
+The design tells its journal which bases an edit is about to change, see
+Design.editing(), and the journal records their old values. commit() compares
+only these bases with their current values and stores the changed ones as a new
+entry. Entries form a tree: undoing a few entries and then committing a new edit
+starts a branch, and all branches share the entries before it. checkout() moves
+the design to any entry by undoing up to the common ancestor and redoing down
+the other branch, so exploring variants costs the diffs of the edits, not a copy
+of the design or a reload.
+
+The scaf, stap, skip and loop arrays and the staple colors are journaled, the
+helix metadata is not. Writes to the arrays outside of design.editing() are not
+journaled either.
+
+Example
+-------
+history = Journal(design)
+edits.insert_breaks(design, [0, 2], edits.pattern(39, 32, 6))
+history.commit('breaks')
+history.checkpoint('with breaks')
+history.undo()
+edits.insert_breaks(design, [0, 2], edits.pattern(23, 32, 6))
+history.commit('other breaks')
+history.checkout('with breaks')
+"""
+
+from contextlib import contextmanager
+
+import numpy as np
+
+import instrumentation
+
+BASE_ARRAYS = ('scaf', 'stap', 'skip', 'loop')
+
+
+class Entry(object):
+    """
+    One committed edit.
+
+    Attributes
+    ----------
+    name : str
+    parent : int
+        the number of the entry before it, -1 for the root
+    changes : dict
+        maps an array name to (flat base indices, old values, new values), and 'colors'
+        to ((old stap_colors, old color_offsets), (new stap_colors, new color_offsets))
+    children : list
+        the numbers of the entries that were committed after it
+    """
+    __slots__ = ('name', 'parent', 'changes', 'children')
+
+    def __init__(self, name, parent, changes):
+        self.name = name
+        self.parent = parent
+        self.changes = changes
+        self.children = []
+
+    def num_bases(self):
+        """ Returns the number of changed bases. """
+        return sum(len(change[0]) for key, change in self.changes.items() if key != 'colors')
+
+
+class Journal(object):
+    """
+    A tree of per-base diffs of a design, see the module docstring.
+
+    Parameters
+    ----------
+    design : Design
+        the design is edited in place by undo, redo and checkout, the journal
+        attaches itself as design.journal
+
+    Attributes
+    ----------
+    entries : list
+        all entries, entries[0] is the state the journal started from
+    current : int
+        the entry the design is at
+    checkpoints : dict
+        maps names to entry numbers
+    """
+
+    def __init__(self, design):
+        self.design = design
+        self.entries = [Entry('start', -1, {})]
+        self.current = 0
+        self.checkpoints = {}
+        self._redo = {}
+        self._depth = 0
+        self._pending = dict((key, []) for key in BASE_ARRAYS)
+        self._pending_colors = None
+        design.journal = self
+
+    def _flat(self, key):
+        """ Returns the array of the design with one row (scaf, stap) or value (skip, loop) per base. """
+        array = getattr(self.design, key)
+        return array.reshape(-1, 4) if array.ndim == 3 else array.reshape(-1)
+
+    def record(self, key, vstrand_nums, base_nums):
+        """ Records the old values of bases that are about to be edited, see Design.editing(). """
+        bases = (np.asarray(vstrand_nums, dtype=np.int64) * self.design.num_bases +
+                 np.asarray(base_nums, dtype=np.int64)).ravel()
+        self._pending[key].append((bases, self._flat(key)[bases]))
+
+    def record_colors(self):
+        """ Records the old staple colors before they are replaced. """
+        if self._pending_colors is None:
+            self._pending_colors = (self.design.stap_colors.copy(), self.design.color_offsets.copy())
+
+    def _diff(self):
+        """ Returns the changes of the recorded bases since the last commit. """
+        changes = {}
+        for key, records in self._pending.items():
+            if not records:
+                continue
+            bases = np.concatenate([record[0] for record in records])
+            old = np.concatenate([record[1] for record in records])
+            # The first record of a base holds its value at the last commit.
+            bases, first = np.unique(bases, return_index=True)
+            old, new = old[first], self._flat(key)[bases]
+            changed = old != new
+            if changed.ndim == 2:
+                changed = changed.any(axis=1)
+            if changed.any():
+                changes[key] = (bases[changed], old[changed], new[changed])
+        if self._pending_colors is not None:
+            old_colors, old_offsets = self._pending_colors
+            if not (np.array_equal(old_colors, self.design.stap_colors) and
+                    np.array_equal(old_offsets, self.design.color_offsets)):
+                changes['colors'] = (self._pending_colors,
+                                     (self.design.stap_colors.copy(), self.design.color_offsets.copy()))
+        return changes
+
+    def _clear(self):
+        for records in self._pending.values():
+            del records[:]
+        self._pending_colors = None
+
+    def _apply(self, changes, new):
+        """ Writes the new (or with new=False the old) values of changes to the design. """
+        for key, change in changes.items():
+            if key == 'colors':
+                stap_colors, color_offsets = change[1 if new else 0]
+                self.design.stap_colors, self.design.color_offsets = stap_colors.copy(), color_offsets.copy()
+                continue
+            bases, values = change[0], change[2 if new else 1]
+            self._flat(key)[bases] = values
+            if key in ('scaf', 'stap'):
+                self.design.edited(key, bases // self.design.num_bases, bases % self.design.num_bases)
+
+    def pending(self):
+        """ Returns True if the design was changed since the last commit. """
+        return bool(self._diff())
+
+    @instrumentation.staged('journal commit')
+    def commit(self, name=''):
+        """
+        Records the changes since the last commit as a new entry after the current one.
+
+        Returns
+        -------
+        entry_num : int
+            the new entry, or the current one if nothing changed
+        """
+        changes = self._diff()
+        self._clear()
+        if not changes:
+            return self.current
+        self.entries.append(Entry(name, self.current, changes))
+        entry_num = len(self.entries) - 1
+        self.entries[self.current].children.append(entry_num)
+        self._redo[self.current] = entry_num
+        self.current = entry_num
+        return entry_num
+
+    def rollback(self):
+        """ Throws away the changes since the last commit. """
+        changes = self._diff()
+        self._clear()
+        self._apply(changes, new=False)
+
+    @contextmanager
+    def transaction(self, name=''):
+        """
+        Commits the edits made in a with block as one entry, or rolls them back if it raises.
+        A transaction inside another one is part of the outer one.
+
+        Example
+        -------
+        with history.transaction('breaks'):
+            insertBreak([0, 2, 4, 6], 39, per, 6)
+            insertBreak([14, 16, 18, 20], 23, per, 6)
+        """
+        if self._depth:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+            return
+        self.commit('uncommitted')
+        self._depth = 1
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            self._depth = 0
+        self.commit(name)
+
+    def undo(self):
+        """
+        Reverts the current entry, uncommitted changes are committed first so they can be redone.
+
+        Returns
+        -------
+        name : str
+            the name of the reverted entry, None if there was nothing to undo
+        """
+        self.commit('uncommitted')
+        entry = self.entries[self.current]
+        if entry.parent == -1:
+            return None
+        self._apply(entry.changes, new=False)
+        self._redo[entry.parent] = self.current
+        self.current = entry.parent
+        return entry.name
+
+    def redo(self):
+        """ Applies the entry that was last undone or committed after the current one, see undo. """
+        self.commit('uncommitted')
+        entry_num = self._redo.get(self.current)
+        if entry_num is None:
+            return None
+        self._apply(self.entries[entry_num].changes, new=True)
+        self.current = entry_num
+        return self.entries[entry_num].name
+
+    def checkpoint(self, name):
+        """ Names the current state, after committing the pending changes. """
+        self.checkpoints[name] = self.commit('uncommitted')
+        return self.checkpoints[name]
+
+    def _ancestors(self, entry_num):
+        path = []
+        while entry_num != -1:
+            path.append(entry_num)
+            entry_num = self.entries[entry_num].parent
+        return path
+
+    def checkout(self, target):
+        """
+        Moves the design to a checkpoint name or entry number, on any branch.
+        """
+        self.commit('uncommitted')
+        target = self.checkpoints.get(target, target)
+        if not isinstance(target, int) or not 0 <= target < len(self.entries):
+            raise KeyError('There is no checkpoint or entry %r.' % (target,))
+        up = self._ancestors(self.current)
+        down = self._ancestors(target)
+        common = set(up) & set(down)
+        for entry_num in up:
+            if entry_num in common:
+                break
+            self._apply(self.entries[entry_num].changes, new=False)
+            self._redo[self.entries[entry_num].parent] = entry_num
+        for entry_num in reversed([entry_num for entry_num in down if entry_num not in common]):
+            self._apply(self.entries[entry_num].changes, new=True)
+            self._redo[self.entries[entry_num].parent] = entry_num
+        self.current = target
+
+    def log(self):
+        """ Returns (entry number, name, number of changed bases) of the entries up to the current one. """
+        return [(entry_num, self.entries[entry_num].name, self.entries[entry_num].num_bases())
+                for entry_num in reversed(self._ancestors(self.current))]
@@ -0,0 +1,200 @@
+"""
+Square and honeycomb lattice geometry.
+
+A `Lattice` holds the rules of one cadnano2 lattice: its period, the neighbours
+of a helix and the bases where staple and scaffold crossovers to each neighbour
+are possible, as boolean lookup arrays over one period. A `LatticeMap` applies
+the rules to the helices of a design: it holds the polarity of every helix, a
+neighbour table with one vstrand index per direction, and answers "can there be
+a staple crossover from this base to that helix" or "is this base on a lattice
+point" for whole arrays of bases with a few table lookups.
+
+Helix i with even polarity (col + row) has its scaffold running to higher bases.
+A helix with even polarity and its neighbour in direction d have the offsets
+neighbors[d] and -neighbors[d] to each other, the crossovers between them are
+at the bases of direction d for both, like in cadnano2. The bases of a crossover
+are its low base b, the crossover connects b and b + 1 on both helices.
+
+Example
+-------
+design.lattice.name
+>>>> 'square'
+design.lattice_map.staple_crossover([0, 0], [1, 2], [31, 31])
+>>>> array([ True, False])
+"""
+
+import numpy as np
+
+
+class Lattice(object):
+    """
+    The rules of a lattice, see the module docstring.
+
+    Parameters
+    ----------
+    name : str
+    period : int
+        the number of bases after which the crossover positions repeat
+    neighbors : tuple
+        the (row, col) offsets of the neighbours of a helix with even polarity, in the order of cadnano2
+    staple_crossovers, scaffold_crossovers : tuple
+        the low bases of the crossovers modulo period, one tuple per neighbour
+    on_lattice : tuple
+        the bases modulo period that lie on a lattice point, for helices with even and odd polarity
+    crossover_loops : bool
+        True if scaffold crossovers get an ssDNA loop, see session.scaf_base_lengths
+
+    Attributes
+    ----------
+    staple_table, scaffold_table : array_like
+        bool arrays of shape (number of neighbours, period), True at the low bases of the crossovers
+    on_lattice_table : array_like
+        bool array of shape (2, period), indexed by polarity % 2 and base % period
+    """
+
+    def __init__(self, name, period, neighbors, staple_crossovers, scaffold_crossovers, on_lattice,
+                 crossover_loops):
+        self.name = name
+        self.period = period
+        self.neighbors = np.array(neighbors, dtype=np.int64).reshape(-1, 2)
+        self.staple_crossovers = staple_crossovers
+        self.scaffold_crossovers = scaffold_crossovers
+        self.crossover_loops = crossover_loops
+        self.staple_table = self._table(staple_crossovers)
+        self.scaffold_table = self._table(scaffold_crossovers)
+        self.on_lattice_table = self._table(on_lattice)
+
+    def _table(self, bases_per_row):
+        table = np.zeros((len(bases_per_row), self.period), dtype=bool)
+        for row, bases in enumerate(bases_per_row):
+            table[row, list(bases)] = True
+        return table
+
+    @property
+    def num_directions(self):
+        return len(self.neighbors)
+
+    def polarity(self, rows, cols):
+        """ Returns the polarity of helices at rows and cols. """
+        return np.asarray(rows, dtype=np.int64) + np.asarray(cols, dtype=np.int64)
+
+    def crossover_bases(self, direction, first_base, last_base, parity='stap'):
+        """ Returns the low bases of the 'stap' or 'scaf' crossovers in direction from first_base to last_base. """
+        table = self.staple_table if parity == 'stap' else self.scaffold_table
+        bases = np.arange(first_base, last_base + 1)
+        return bases[table[direction, bases % self.period]]
+
+    def __repr__(self):
+        return 'Lattice(%r)' % self.name
+
+
+# The crossover positions of cadnano2, the square lattice turns a quarter every 8 bases.
+SQUARE = Lattice('square', 32, neighbors=((0, 1), (1, 0), (0, -1), (-1, 0)),
+                 staple_crossovers=((31,), (23,), (15,), (7,)),
+                 scaffold_crossovers=((4, 15, 26), (7, 18, 28), (10, 20, 31), (2, 12, 23)),
+                 on_lattice=((7, 15, 23, 31), (0, 8, 16, 24)), crossover_loops=True)
+HONEYCOMB = Lattice('honeycomb', 21, neighbors=((0, 1), (-1, 0), (0, -1)),
+                    staple_crossovers=((6,), (13,), (20,)),
+                    scaffold_crossovers=((1, 11), (8, 18), (4, 15)),
+                    on_lattice=((), ()), crossover_loops=False)
+LATTICES = {'square': SQUARE, 'honeycomb': HONEYCOMB}
+
+
+def get_lattice(lattice):
+    """ Returns the Lattice of a name, a Lattice is returned as it is. """
+    if isinstance(lattice, Lattice):
+        return lattice
+    if lattice not in LATTICES:
+        raise ValueError('Unknown lattice %r, use one of %s.' % (lattice, sorted(LATTICES)))
+    return LATTICES[lattice]
+
+
+def detect_lattice(num_bases):
+    """
+    Returns the lattice of a design with num_bases bases per helix, like cadnano2: square if
+    num_bases is a multiple of 32, honeycomb if it is a multiple of 21 and square otherwise.
+    """
+    if num_bases % SQUARE.period and not num_bases % HONEYCOMB.period:
+        return HONEYCOMB
+    return SQUARE
+
+
+class LatticeMap(object):
+    """
+    The helices of a design on a lattice, see the module docstring.
+
+    Parameters
+    ----------
+    lattice : Lattice
+    rows, cols : array_like
+        the lattice position of every vstrand
+
+    Attributes
+    ----------
+    polarity : array_like
+        col + row of every vstrand
+    odd : array_like
+        True for the vstrands with odd polarity, their scaffold runs to lower bases
+    neighbors : array_like
+        int64 array of shape (num_helices, number of directions), the vstrand index of the neighbour
+        in every direction, -1 where there is none
+    """
+
+    def __init__(self, lattice, rows, cols):
+        self.lattice = lattice
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.polarity = lattice.polarity(self.rows, self.cols)
+        self.odd = self.polarity % 2 == 1
+        num_helices = len(self.rows)
+        self.neighbors = np.full((num_helices, lattice.num_directions), -1, dtype=np.int64)
+        if num_helices:
+            # Look the neighbours up in a grid of the positions with an empty border.
+            row_min, col_min = self.rows.min() - 1, self.cols.min() - 1
+            grid = np.full((self.rows.max() - row_min + 2, self.cols.max() - col_min + 2), -1, dtype=np.int64)
+            grid[self.rows - row_min, self.cols - col_min] = np.arange(num_helices)
+            sign = np.where(self.odd, -1, 1)
+            for direction, (d_row, d_col) in enumerate(lattice.neighbors.tolist()):
+                self.neighbors[:, direction] = grid[self.rows - row_min + sign * d_row, self.cols - col_min + sign * d_col]
+
+    @classmethod
+    def of_design(cls, lattice, meta):
+        """ Returns the LatticeMap of the 'row' and 'col' entries of the vstrands of a design. """
+        return cls(lattice, [vstrand['row'] for vstrand in meta], [vstrand['col'] for vstrand in meta])
+
+    def direction(self, vstrand_nums, other_vstrand_nums):
+        """ Returns the direction of the other vstrands seen from vstrand_nums, -1 if they are not neighbours. """
+        vstrand_nums, other_vstrand_nums = np.broadcast_arrays(np.asarray(vstrand_nums, dtype=np.int64),
+                                                               np.asarray(other_vstrand_nums, dtype=np.int64))
+        matches = self.neighbors[vstrand_nums] == other_vstrand_nums[..., None]
+        return np.where(matches.any(axis=-1), matches.argmax(axis=-1), -1)
+
+    def _crossover(self, table, vstrand_nums, other_vstrand_nums, base_nums):
+        direction = self.direction(vstrand_nums, other_vstrand_nums)
+        base_nums = np.asarray(base_nums, dtype=np.int64) % self.lattice.period
+        return (direction != -1) & table[np.maximum(direction, 0), base_nums]
+
+    def staple_crossover(self, vstrand_nums, other_vstrand_nums, base_nums):
+        """ Returns True where a staple crossover can connect base and base + 1 of both vstrands. """
+        return self._crossover(self.lattice.staple_table, vstrand_nums, other_vstrand_nums, base_nums)
+
+    def scaffold_crossover(self, vstrand_nums, other_vstrand_nums, base_nums):
+        """ Returns True where a scaffold crossover can connect base and base + 1 of both vstrands. """
+        return self._crossover(self.lattice.scaffold_table, vstrand_nums, other_vstrand_nums, base_nums)
+
+    def on_lattice(self, vstrand_nums, base_nums):
+        """ Returns True for the bases that lie on a lattice point, vstrand_nums and base_nums are broadcast. """
+        vstrand_nums = np.asarray(vstrand_nums, dtype=np.int64)
+        return self.lattice.on_lattice_table[self.odd[vstrand_nums].astype(np.int64),
+                                             np.asarray(base_nums, dtype=np.int64) % self.lattice.period]
+
+    def neighbor_pairs(self):
+        """
+        Returns (even, other) per direction, the vstrands with even polarity and their neighbours in that direction.
+        """
+        even = np.flatnonzero(~self.odd)
+        pairs = []
+        for direction in range(self.lattice.num_directions):
+            other = self.neighbors[even, direction]
+            pairs.append((even[other != -1], other[other != -1]))
+        return pairs
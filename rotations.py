@@ -0,0 +1,165 @@
+"""
+Scores every rotation of the maxiscaf sequence at once.
+
+Rotating the maxiscaf sequence by offset r gives its base p base r + p of the
+original sequence. A staple domain, a run of consecutive maxiscaf bases, therefore
+reads a window that slides along the sequence with r. Counts over a window are
+differences of prefix sums over the sequence written twice, so a rotation costs
+O(1) per domain and all rotations are scored with NumPy arrays, without assigning
+the sequences again. The melting temperatures are the nearest-neighbor ones of
+analytics.py: their enthalpy and entropy are sums over the dinucleotides of a
+window, which are prefix sums as well. A staple pairs with its domains, so its
+duplex has the same nearest neighbors as the maxiscaf windows read in order.
+
+Example
+-------
+domains = staple_domains(stap_order, stap_offsets, positions, lengths)
+scores = scan_rotations(maxiscaf_seq, *domains)
+best_rotations(scores, 5)
+>>>> array([4120, 4119, 6057, 311, 312])
+"""
+
+import numpy as np
+
+import analytics
+import sequences
+
+_GC = np.frombuffer(b'GCgc', dtype=np.uint8)
+
+
+def staple_domains(stap_order, stap_offsets, positions, lengths):
+    """
+    Splits the staples into domains of consecutive maxiscaf positions.
+
+    Parameters
+    ----------
+    stap_order, stap_offsets : array_like
+        the staple paths, see StrandIndex.flat_paths
+    positions : array_like
+        for every flat base, where its piece starts in the maxiscaf sequence,
+        -1 for bases that do not pair with the maxiscaf
+    lengths : array_like
+        for every flat base, the length of its piece, 0 for skips
+
+    Returns
+    -------
+    starts, stops : array_like
+        the maxiscaf window [start, stop) of every domain
+    staples : array_like
+        the staple every domain belongs to, in increasing order
+    """
+    # Read 3' to 5', a staple runs along the scaffold in increasing positions.
+    pieces = sequences.reverse_segments(np.asarray(stap_order, dtype=np.int64), stap_offsets)
+    staples = sequences.segment_ids(stap_offsets)
+    starts = positions[pieces]
+    stops = starts + lengths[pieces]
+    keep = (starts != -1) & (stops > starts)
+    starts, stops, staples = starts[keep], stops[keep], staples[keep]
+    # A domain continues as long as the next piece of the same staple starts where the last one stopped.
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = (starts[1:] != stops[:-1]) | (staples[1:] != staples[:-1])
+    first = np.flatnonzero(first)
+    last = np.append(first[1:], len(starts)) - 1
+    return starts[first], stops[last], staples[first]
+
+
+def scan_rotations(scaffold_seq, starts, stops, staples, gc_range=(0.3, 0.7), max_homopolymer=5,
+                   max_elements=1 << 22, **tm_kwargs):
+    """
+    Scores every rotation of the maxiscaf sequence.
+
+    Only the staple bases that pair with the maxiscaf are scored, the other bases
+    do not change with the rotation. Homopolymer runs are looked for within domains,
+    runs across a crossover are not counted.
+
+    Parameters
+    ----------
+    scaffold_seq : str
+        the maxiscaf sequence before rotation
+    starts, stops, staples : array_like
+        the domains, see staple_domains
+    gc_range : tuple
+        the lowest and highest GC fraction of a good staple
+    max_homopolymer : int
+        the longest run of one base a good staple may have
+    max_elements : int
+        how many rotation x domain entries are computed at once, this bounds the memory used
+    tm_kwargs
+        na, mg and strand_conc, see analytics.nearest_neighbor_tm
+
+    Returns
+    -------
+    scores : dict
+        arrays with one entry per rotation offset,
+        'num_bad': number of staples with a GC fraction outside gc_range or a longer homopolymer run,
+        'gc_min', 'gc_max': the lowest and highest GC fraction of the staples,
+        'tm_spread': the standard deviation of the nearest-neighbor melting temperatures of the staples.
+    """
+    codes = np.frombuffer(scaffold_seq.upper().encode('ascii', 'replace'), dtype=np.uint8)
+    num_rotations = len(codes)
+    if len(stops) and stops.max() > num_rotations:
+        raise ValueError('The maxiscaf sequence has %d bases, the staples need %d.' % (num_rotations, stops.max()))
+    twice = np.concatenate([codes, codes])
+    gc_sums = np.zeros(len(twice) + 1, dtype=np.int64)
+    np.cumsum(np.isin(twice, _GC), out=gc_sums[1:])
+    # runs[i] is 1 when a homopolymer of max_homopolymer + 1 bases starts at base i.
+    run_length = max_homopolymer + 1
+    same_sums = np.zeros(len(twice), dtype=np.int64)
+    np.cumsum(twice[1:] == twice[:-1], out=same_sums[1:])
+    runs = np.zeros(len(twice) + 1, dtype=np.int64)
+    if run_length <= len(twice):
+        num_starts = len(twice) - run_length + 1
+        runs[:num_starts] = same_sums[run_length - 1:] - same_sums[:num_starts] == run_length - 1
+    run_sums = np.zeros(len(runs) + 1, dtype=np.int64)
+    np.cumsum(runs, out=run_sums[1:])
+    # Nearest-neighbor sums, dinucleotide p is bases p and p + 1.
+    bases = analytics.BASE_INDEX[twice]
+    pairs = 5*bases[:-1] + bases[1:]
+    enthalpy_sums = np.zeros(len(twice))
+    entropy_sums = np.zeros(len(twice))
+    np.cumsum(analytics.NN_ENTHALPY[pairs], out=enthalpy_sums[1:])
+    np.cumsum(analytics.NN_ENTROPY[pairs], out=entropy_sums[1:])
+
+    scores = dict((key, np.zeros(num_rotations)) for key in ('gc_min', 'gc_max', 'tm_spread'))
+    scores['num_bad'] = np.zeros(num_rotations, dtype=np.int64)
+    if not len(staples):
+        return scores
+    staple_first = np.flatnonzero(np.append(True, staples[1:] != staples[:-1]))
+    staple_last = np.append(staple_first[1:], len(staples)) - 1
+    staple_lengths = np.add.reduceat(stops - starts, staple_first)
+    # The domains of a staple follow each other, the last base of one and the first of the next are neighbors.
+    joined = np.flatnonzero(staples[1:] == staples[:-1])
+    # A run must start in [start, stop - run_length] to lie within the domain.
+    run_stops = np.maximum(stops - run_length + 1, starts)
+
+    chunk_size = max(1, max_elements // len(starts))
+    for first_rotation in range(0, num_rotations, chunk_size):
+        rotation = np.arange(first_rotation, min(first_rotation + chunk_size, num_rotations))[:, None]
+        gc_counts = np.add.reduceat(gc_sums[rotation + stops] - gc_sums[rotation + starts], staple_first, axis=1)
+        has_run = np.add.reduceat(run_sums[rotation + run_stops] - run_sums[rotation + starts], staple_first, axis=1) > 0
+        gc_fraction = gc_counts / staple_lengths.astype(np.float64)
+        bad = has_run | (gc_fraction < gc_range[0]) | (gc_fraction > gc_range[1])
+        rows = rotation[:, 0]
+        scores['num_bad'][rows] = bad.sum(axis=1)
+        scores['gc_min'][rows] = gc_fraction.min(axis=1)
+        scores['gc_max'][rows] = gc_fraction.max(axis=1)
+        pair_enthalpy = enthalpy_sums[rotation + stops - 1] - enthalpy_sums[rotation + starts]
+        pair_entropy = entropy_sums[rotation + stops - 1] - entropy_sums[rotation + starts]
+        junctions = 5*bases[rotation + stops[joined] - 1] + bases[rotation + starts[joined + 1]]
+        pair_enthalpy[:, joined] += analytics.NN_ENTHALPY[junctions]
+        pair_entropy[:, joined] += analytics.NN_ENTROPY[junctions]
+        enthalpy = np.add.reduceat(pair_enthalpy, staple_first, axis=1)
+        entropy = np.add.reduceat(pair_entropy, staple_first, axis=1)
+        for ends in (bases[rotation + starts[staple_first]], bases[rotation + stops[staple_last] - 1]):
+            enthalpy += analytics.init_enthalpy(ends)
+            entropy += analytics.init_entropy(ends)
+        scores['tm_spread'][rows] = analytics.melting_temperature(enthalpy, entropy, staple_lengths,
+                                                                  **tm_kwargs).std(axis=1)
+    return scores
+
+
+def best_rotations(scores, num=10):
+    """
+    Returns the num best rotation offsets, with the fewest bad staples and then the smallest Tm spread.
+    """
+    return np.lexsort((scores['tm_spread'], scores['num_bad']))[:num]
@@ -0,0 +1,180 @@
+"""
+Memory-mapped sequence libraries, indexed by sequence length.
+
+A library file holds one block per sequence length. A block stores all its
+sequences back to back as ASCII, so sequence i of length n starts at
+block_offset + i*n. Opening a library only reads the small header, the
+sequences of a length are read from the memory map when they are used.
+
+File layout
+-----------
+MAGIC (8 bytes) | header size (8 bytes, little endian) | header (JSON) | blocks
+The header maps every length to [offset of its block, number of sequences].
+
+Example
+-------
+seq_dc = open_library('130126_1127_designed_seqs_05-69.txt')
+seq_dc[42][0]
+>>>> the first designed sequence of 42 bases
+"""
+
+import json
+import mmap
+import os
+import pickle
+import struct
+
+import numpy as np
+
+MAGIC = b'CNSEQLB1'
+LIBRARY_EXTENSION = '.seqlib'
+
+
+class SequenceBlock(object):
+    """ All sequences of one length, indexed like a list of str. """
+    __slots__ = ('buffer', 'offset', 'length', 'count')
+
+    def __init__(self, buffer, offset, length, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('There are only %d sequences of length %d.' % (self.count, self.length))
+        start = self.offset + i*self.length
+        return self.buffer[start:start + self.length].decode('ascii')
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def as_array(self):
+        """ Returns a (count, length) uint8 view of the ASCII codes, without copying. """
+        return np.frombuffer(self.buffer, dtype=np.uint8, count=self.count*self.length,
+                             offset=self.offset).reshape(self.count, self.length)
+
+
+class SequenceLibrary(object):
+    """
+    A read-only, memory-mapped sequence library that behaves like {length: [sequences]}.
+
+    Sequences that are assigned with library[length] = [...] are kept in memory
+    and hide the block of that length in the file.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a sequence library.' % file_name)
+            header_size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size).decode('ascii'))
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data_offset = len(MAGIC) + 8 + header_size
+        self.index = dict((int(length), tuple(entry)) for length, entry in header['lengths'].items())
+        self.blocks = {}
+        self.extra = {}
+
+    def keys(self):
+        return sorted(set(self.index) | set(self.extra))
+
+    def __contains__(self, length):
+        return length in self.extra or length in self.index
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, length):
+        if length in self.extra:
+            return self.extra[length]
+        if length not in self.blocks:
+            if length not in self.index:
+                raise KeyError('%s has no sequences of length %d.' % (self.file_name, length))
+            offset, count = self.index[length]
+            self.blocks[length] = SequenceBlock(self.buffer, self.data_offset + offset, length, count)
+        return self.blocks[length]
+
+    def __setitem__(self, length, sequences):
+        self.extra[length] = sequences
+
+    def close(self):
+        self.blocks.clear()
+        self.buffer.close()
+
+
+def write_library(file_name, sequences):
+    """
+    Writes a sequence library.
+
+    Parameters
+    ----------
+    file_name : str
+    sequences : dict or list
+        {length: [sequences]} like the designed sequence pickles, or a list of
+        sequences that all have the same length like the ortho 8-mer pickles.
+    """
+    if not isinstance(sequences, dict):
+        sequences = list(sequences)
+        sequences = {len(sequences[0]) if sequences else 0: sequences}
+    blocks, index, offset = [], {}, 0
+    for length in sorted(sequences):
+        block = ''.join(_text(sequence) for sequence in sequences[length]).encode('ascii')
+        if len(block) != length*len(sequences[length]):
+            raise ValueError('Not all sequences in the block of length %d have %d bases.' % (length, length))
+        index[str(length)] = [offset, len(sequences[length])]
+        blocks.append(block)
+        offset += len(block)
+    header = json.dumps({'lengths': index}).encode('ascii')
+    with open(file_name, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for block in blocks:
+            f.write(block)
+
+
+def _text(sequence):
+    return sequence.decode('ascii') if isinstance(sequence, bytes) else sequence
+
+
+def convert_pickle(pickle_file, library_file=None):
+    """
+    Converts a pickled {length: [sequences]} dict or list of sequences to a library file.
+
+    Returns
+    -------
+    library_file : str
+        by default pickle_file + '.seqlib'
+    """
+    if library_file is None:
+        library_file = pickle_file + LIBRARY_EXTENSION
+    with open(pickle_file, 'rb') as f:
+        # The pickles were written by Python 2.
+        sequences = pickle.load(f, encoding='latin1')
+    write_library(library_file, sequences)
+    return library_file
+
+
+def open_library(file_name):
+    """
+    Opens a sequence library, a pickle is converted once to file_name + '.seqlib'.
+    """
+    with open(file_name, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return SequenceLibrary(file_name)
+    library_file = file_name + LIBRARY_EXTENSION
+    if not os.path.exists(library_file) or os.path.getmtime(library_file) < os.path.getmtime(file_name):
+        convert_pickle(file_name, library_file)
+    return SequenceLibrary(library_file)
@@ -0,0 +1,136 @@
+"""
+Fast DNA sequence operations.
+
+Sequences are either str, or uint8 arrays of ASCII codes so that many
+sequences can be handled in one NumPy operation. A batch of sequences is one
+flat code array plus offsets, sequence i is codes[offsets[i]:offsets[i+1]].
+Like comp_seq_FN, every complement is uppercase and characters other than
+ACGT/acgt are left out.
+"""
+
+import numpy as np
+
+_BASES = b'acgtACGT'
+_COMPLEMENT_TABLE = bytes.maketrans(_BASES, b'TGCATGCA')
+_NON_BASES = bytes(code for code in range(256) if code not in _BASES)
+
+# Complement of every ASCII code, 0 for characters that are not a base.
+COMPLEMENT = np.zeros(256, dtype=np.uint8)
+COMPLEMENT[np.frombuffer(_BASES, dtype=np.uint8)] = np.frombuffer(b'TGCATGCA', dtype=np.uint8)
+
+
+def reverse_complement(raw_sequence):
+    """
+    Returns the complementary sequence, 3' to 5' reversed, in uppercase.
+
+    Example
+    -------
+    reverse_complement('aaCGx')
+    >>>> 'CGTT'
+    """
+    encoded = raw_sequence.encode('ascii', 'ignore') if not isinstance(raw_sequence, bytes) else raw_sequence
+    return encoded.translate(_COMPLEMENT_TABLE, _NON_BASES)[::-1].decode('ascii')
+
+
+def encode(sequences):
+    """
+    Returns the flat uint8 codes and the offsets of a list of str.
+    """
+    lengths = [len(sequence) for sequence in sequences]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    # One byte per character, characters outside latin-1 become '?', they are not bases anyway.
+    codes = np.frombuffer(''.join(sequences).encode('latin-1', 'replace'), dtype=np.uint8)
+    return codes, offsets
+
+
+def decode(codes, offsets):
+    """
+    Returns the list of str of flat uint8 codes and offsets.
+    """
+    text = np.ascontiguousarray(codes, dtype=np.uint8).tobytes().decode('latin-1')
+    bounds = offsets.tolist()
+    return [text[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def segment_ids(offsets):
+    """ Returns, for every position of a flat array, the index of its segment. """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def drop_non_bases(codes, offsets):
+    """
+    Leaves out the codes that are 0 and returns the new (codes, offsets).
+    """
+    keep = codes != 0
+    counts = np.bincount(segment_ids(offsets)[keep], minlength=len(offsets) - 1)
+    new_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(counts, out=new_offsets[1:])
+    return codes[keep], new_offsets
+
+
+def reverse_segments(values, offsets):
+    """
+    Returns values with every segment values[offsets[i]:offsets[i+1]] reversed.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    segments = segment_ids(offsets)
+    # Position p of segment [start, stop) comes from position start + stop - 1 - p.
+    return values[offsets[:-1][segments] + offsets[1:][segments] - 1 - np.arange(len(segments))]
+
+
+def gather(codes, starts, lengths, offsets):
+    """
+    Joins the pieces codes[starts[j]:starts[j] + lengths[j]] into sequences.
+
+    Parameters
+    ----------
+    codes : array_like
+        uint8 ASCII codes the pieces are taken from
+    starts, lengths : array_like
+        where every piece starts and how long it is, pieces of length 0 are left out
+    offsets : array_like
+        sequence i is made of the pieces offsets[i] ... offsets[i+1] - 1
+
+    Returns
+    -------
+    codes, offsets : array_like
+        the joined sequences
+
+    Example
+    -------
+    decode(*gather(encode(['ACGT'])[0], [2, 0], [2, 1], [0, 2]))
+    >>>> ['GTA']
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ends[1:])
+    # Position p of the output comes from starts[j] + p - ends[j] for the piece j it lies in.
+    source = np.repeat(np.asarray(starts, dtype=np.int64) - ends[:-1], lengths) + np.arange(ends[-1])
+    return codes[source], ends[np.asarray(offsets, dtype=np.int64)]
+
+
+def reverse_complement_codes(codes, offsets):
+    """
+    Reverse complements every sequence of a batch at once.
+
+    Parameters
+    ----------
+    codes : array_like
+        uint8 ASCII codes of all sequences
+    offsets : array_like
+        sequence i is codes[offsets[i]:offsets[i+1]]
+
+    Returns
+    -------
+    codes, offsets : array_like
+        the reverse complements, without the characters that are not a base
+    """
+    return drop_non_bases(COMPLEMENT[reverse_segments(codes, offsets)], offsets)
+
+
+def reverse_complement_batch(sequences):
+    """
+    Returns the reverse complements of a list of str.
+    """
+    return decode(*reverse_complement_codes(*encode(sequences)))
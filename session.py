@@ -0,0 +1,519 @@
+"""
+Design sessions with explicit state.
+
+A `DesignSession` holds one design together with everything that used to live in
+the module-level globals of cadnano-beadcatchers.py (data, vstrands, idx, ...)
+and assign_sequences.py (seq_dc, maxiscaf_seq, ...). Sessions
+share no state, so independent designs can be edited and sequenced at the same
+time in a thread or process pool. The sequence library is only read.
+
+Example
+-------
+session = DesignSession.load('7x3_input.json')
+session.insert_break([0, 2, 4, 6], 39, session.period, 6)
+session.reset_colors()
+session.save('7x3_output.json')
+
+sequencing = DesignSession.load('7x3_output.json', seq_library=seqlib.open_library(seq_dc_filename),
+                                scaffold_seq=maxiscaf_seq, scaffold_name=maxiscaf_seq_filename)
+scaf_table, stap_table = sequencing.give_sequences()
+"""
+
+from __future__ import print_function
+
+import functools
+
+import numpy as np
+
+import analytics
+import autobreak
+import cache
+import coloring
+import crosstalk
+import edits
+import handles
+import instrumentation
+import journal
+import sequences
+import tables
+import validate
+
+# Names of the cadnano2 staple colors, see initVars() of assign_sequences.py.
+COLOR_NAMES = {13369344: 'red', 16204552: 'red orange', 16225054: 'light orange', 11184640: 'olive',
+               5749504: 'light green', 29184: 'dark green', 243362: 'cyan', 1507550: 'blue', 7536862: 'purple',
+               12060012: 'magenta', 3355443: 'dark gray', 8947848: 'light gray'}
+LENGTH_BINS = (0, 32, 40, 41, 47, 49, 1000)
+
+
+class ScaffoldTooShort(ValueError):
+    """ Raised by give_sequences when the maxiscaf sequence is shorter than the maxiscaf of the design. """
+
+
+def scaf_base_lengths(data, on_lattice_length, off_lattice_length, no_loop_exception_ra):
+    """
+    Returns the number of scaffold bases every base of the design takes, for all bases at once.
+
+    A base takes 1 + skip + loop bases. In a lattice with crossover loops (the square
+    lattice) a scaffold crossover to another helix is followed by an ssDNA loop, unless
+    [helix_num, helix_base_num] is in no_loop_exception_ra.
+
+    Parameters
+    ----------
+    data : Design
+    on_lattice_length, off_lattice_length : int
+        the loop lengths of crossovers placed on and off the lattice points, see LatticeMap.on_lattice
+    no_loop_exception_ra : list
+        [helix_num, helix_base_num] of the crossovers without loop
+
+    Returns
+    -------
+    base_lengths : array_like
+        int64 array of length num_helices * num_bases, indexed by flat base index
+
+    Example
+    -------
+    scaf_base_lengths(data, 2, 0, [[17, 24], [16, 247]])
+    """
+    helix_nums = np.array([data.helix_num(vstrand_num) for vstrand_num in range(data.num_helices)], dtype=np.int64)
+    base_lengths = 1 + data.skip.astype(np.int64) + data.loop
+    if data.lattice.crossover_loops:
+        next_helix_nums = data.scaf[:, :, 2]
+        crossover = (next_helix_nums != helix_nums[:, None]) & (next_helix_nums != -1)
+        # A set finds the exceptions in constant time, however many there are.
+        for helix_num, helix_base_num in set((helix_num, helix_base_num) for helix_num, helix_base_num in no_loop_exception_ra):
+            if helix_num in data.idx and 0 <= helix_base_num < data.num_bases:
+                crossover[data.idx[helix_num], helix_base_num] = False
+        on_lattice = data.lattice_map.on_lattice(np.arange(data.num_helices)[:, None], np.arange(data.num_bases))
+        base_lengths += crossover * np.where(on_lattice, on_lattice_length, off_lattice_length)
+    return base_lengths.ravel()
+
+
+@instrumentation.staged('print_sequences')
+def print_tables(scaf_table, stap_table):
+    """
+    Prints the staples with annotations, the short scaffold strands and the number of bases.
+    """
+    print()
+    print()
+    stap_table = tables.as_table(stap_table)
+    scaf_table = tables.as_table(scaf_table)
+    #Print sorted staple strand sequences with annotations
+    lines = ['%s\tstap strand\t%s\t%dmer\t[%d, %d]\tstart\t[%d, %d]\tend' % row for row in
+             zip(stap_table.seq, stap_table.color or [], stap_table.length.tolist(), stap_table.start_helix.tolist(),
+                 stap_table.start_base.tolist(), stap_table.end_helix.tolist(), stap_table.end_base.tolist())]
+
+    #Print short scaffold-parity strand sequences with annotations
+    short = np.flatnonzero(scaf_table.length < 100).tolist()
+    lines += ['%s\t short scaf strand\t%dmer\t[%d, %d]\tstart\t[%d, %d]\tend'
+              % (scaf_table.seq[i], scaf_table.length[i], scaf_table.start_helix[i], scaf_table.start_base[i],
+                 scaf_table.end_helix[i], scaf_table.end_base[i]) for i in short]
+    if lines:
+        print('\n'.join(lines))
+
+    #Print additional miscellaneous information
+    print("number of stap bases is", int(stap_table.length.sum()))
+    print("number of short scaf bases is", int(scaf_table.length[1:].sum()))
+
+
+def print_crosstalk(handle_dc, stap_table, scaffold_seq, k=8):
+    """
+    Checks the handles against the scaffold, the staples and each other and prints a warning per stretch,
+    see crosstalk.check_crosstalk. The handles of handle_dc are cut off the staples that carry them, so
+    a handle is checked against the designed staple and not against its own copy.
+    """
+    staple_dc = {}
+    for row in stap_table:
+        start, end, seq = row[2], row[3], row[-1]
+        # The 5' handles are at the start of the staple, the 3' handles at its end, see attach_handles.
+        prefix = handle_dc.get('handle at [%d, %d]' % tuple(start), '')
+        suffix = handle_dc.get('handle at [%d, %d]' % tuple(end), '')
+        if prefix and seq.startswith(prefix):
+            seq = seq[len(prefix):]
+        if suffix and seq.endswith(suffix):
+            seq = seq[:len(seq) - len(suffix)]
+        staple_dc['stap [%d, %d]' % tuple(start)] = seq
+    hits = crosstalk.check_crosstalk(handle_dc, staple_dc, scaffold_seq, k)
+    for handle_name, handle_start, target_name, target_start, length, stretch in hits:
+        print("Warning: handle", handle_name, "base", handle_start, "is complementary to", target_name, "base",
+              target_start, "over", length, "bases", stretch)
+    print(len(hits), "complementary stretches of", k, "or more bases found for", len(handle_dc), "handles")
+    return hits
+
+
+def _journaled(edit):
+    """ Makes every call of an editing method one entry of the journal of the session, see undo(). """
+    @functools.wraps(edit)
+    def wrapper(self, *args, **kwargs):
+        name = '%s(%s)' % (edit.__name__, ', '.join([repr(arg) for arg in args] +
+                                                   ['%s=%r' % item for item in kwargs.items()]))
+        with instrumentation.stage(edit.__name__), self.journal().transaction(name):
+            return edit(self, *args, **kwargs)
+    return wrapper
+
+
+class DesignSession(object):
+    """
+    One design with its editing and sequencing state.
+
+    Parameters
+    ----------
+    design : Design
+    period : int
+        The period of repeating segments of the staples, by default design.period.
+    file_name : str
+        where the design was loaded from
+    on_lattice_length, off_lattice_length : int
+        ssDNA loop lengths at scaffold crossovers placed on and off the lattice points, only in a lattice
+        with crossover loops (square), see design.lattice
+    no_loop_exceptions : list
+        [helix_num, base_num] of the scaffold crossovers without loop
+    seq_library : dict or SequenceLibrary
+        designed sequences for every scaffold strand length, only read
+    scaffold_seq : str
+        the maxiscaf sequence, already rotated to its offset
+    scaffold_name : str
+        the file of the maxiscaf sequence, for messages
+    color_names : dict
+        maps cadnano2 colors to names, by default COLOR_NAMES
+
+    Attributes
+    ----------
+    scaf_table, stap_table : StrandTable
+        the results of give_sequences, stap_table sorted by color and with the handles of attach_handles
+    """
+    __slots__ = ('design', 'period', 'file_name', 'history', 'on_lattice_length',
+                 'off_lattice_length', 'no_loop_exceptions', 'seq_library', 'scaffold_seq', 'scaffold_name',
+                 'color_names', 'scaf_table', 'stap_table')
+
+    def __init__(self, design, period=None, file_name='', on_lattice_length=2,
+                 off_lattice_length=0, no_loop_exceptions=(), seq_library=None, scaffold_seq='', scaffold_name='',
+                 color_names=None):
+        self.design = design
+        self.period = design.period if period is None else period
+        self.file_name = file_name
+        self.history = None
+        self.on_lattice_length = on_lattice_length
+        self.off_lattice_length = off_lattice_length
+        self.no_loop_exceptions = list(no_loop_exceptions)
+        self.seq_library = seq_library
+        self.scaffold_seq = scaffold_seq
+        self.scaffold_name = scaffold_name
+        self.color_names = COLOR_NAMES if color_names is None else color_names
+        self.scaf_table = None
+        self.stap_table = None
+
+    @classmethod
+    def load(cls, file_name, period=None, cache_dir=None, lattice=None, **settings):
+        """
+        Loads a cadnano2 *.json file through the cache, see cache.load_design, settings are passed to DesignSession.
+        """
+        return cls(cache.load_design(file_name, period, cache_dir, lattice), period, file_name, **settings)
+
+    def save(self, file_name):
+        """ Saves the design so cadnano2 can read it, and caches it, see cache.save_design. """
+        cache.save_design(self.design, file_name)
+
+    @property
+    def vstrands(self):
+        return self.design.vstrands
+
+    @property
+    def num_helices(self):
+        return self.design.num_helices
+
+    @property
+    def num_bases(self):
+        return self.design.num_bases
+
+    @property
+    def idx(self):
+        return self.design.idx
+
+    @property
+    def polarity(self):
+        return self.design.polarity
+
+    # Journal
+
+    def journal(self):
+        """ Returns the journal of the design, it is made at the first edit. """
+        if self.history is None:
+            self.history = journal.Journal(self.design)
+        return self.history
+
+    def undo(self):
+        return self.journal().undo()
+
+    def redo(self):
+        return self.journal().redo()
+
+    def checkpoint(self, name):
+        return self.journal().checkpoint(name)
+
+    def checkout(self, name):
+        self.journal().checkout(name)
+
+    # Editing, see the functions of the same name in cadnano-beadcatchers.py
+
+    @_journaled
+    def remove_crossover(self, helix_nums, start, step, num, side='left'):
+        edits.remove_crossovers(self.design, helix_nums, edits.pattern(start, step, num), side)
+
+    @_journaled
+    def insert_break(self, helix_nums, start, step, num, strand='stap'):
+        edits.insert_breaks(self.design, helix_nums, edits.pattern(start, step, num), strand)
+
+    @_journaled
+    def insert_scaffold_break(self, helix_nums, start, step, num):
+        edits.insert_breaks(self.design, helix_nums, edits.pattern(start, step, num), 'scaf')
+
+    @_journaled
+    def insert_deletions(self, start, step, num):
+        edits.insert_deletions(self.design, edits.pattern(start, step, num))
+
+    @_journaled
+    def auto_break(self, min_length, max_length, target=None, forbidden=(), xover_distance=3):
+        return autobreak.auto_break(self.design, min_length, max_length, target, forbidden, xover_distance)
+
+    @_journaled
+    def remove_all_staples(self):
+        vstrand_nums, base_nums = np.nonzero((self.design.stap != -1).any(axis=2))
+        with self.design.editing('stap', vstrand_nums, base_nums):
+            self.design.stap[vstrand_nums, base_nums] = -1
+
+    @_journaled
+    def join_staples(self, helix_nums, start, step, num):
+        edits.join_staples(self.design, helix_nums, edits.pattern(start, step, num))
+
+    @_journaled
+    def remove_staples(self, helix_nums, start, step, num):
+        edits.remove_staples(self.design, helix_nums, edits.pattern(start, step, num))
+
+    @_journaled
+    def insert_scaffold_crossover(self, up_helix_nums, bot_helix_nums, base_nums):
+        edits.insert_scaffold_crossovers(self.design, up_helix_nums, bot_helix_nums, base_nums)
+
+    @_journaled
+    def force_path(self, helix_nums, start, stop):
+        edits.force_paths(self.design, helix_nums, start, stop)
+
+    def find_staples(self):
+        """ Returns the (helix_num, base_num) starts of all staples, circular staples are left out. """
+        return self.design.strands('stap').starts()
+
+    def staple_lengths(self):
+        """ Returns an array [staple_length helix_num base_num 0 0 0] per staple, see stapleLength(). """
+        strands = self.design.strands('stap')
+        staples = strands.starts()
+        staple_info = np.zeros((len(staples), 6), dtype=int)
+        staple_info[:, 0] = strands.lengths(circular=False)
+        staple_info[:, 1:3] = np.array(staples, dtype=int).reshape(-1, 2)
+        return staple_info
+
+    def validate(self, raise_error=False):
+        """ Returns the consistency problems of the design, see validate.validate. """
+        return validate.validate(self.design, raise_error)
+
+    # Colors
+
+    def staple_colors(self, reset=False):
+        """ Returns the colors of all staples to edit them at once, see coloring.StapleColors. """
+        return coloring.StapleColors(self.design, reset)
+
+    @_journaled
+    def reset_colors(self):
+        self.staple_colors(reset=True).apply()
+
+    @_journaled
+    def color_by_helix(self):
+        staple_colors = self.staple_colors(reset=True)
+        staple_colors.set(None, coloring.cycle(staple_colors.helix_nums))
+        staple_colors.apply()
+
+    @_journaled
+    def color_by_length(self, bins=LENGTH_BINS):
+        staple_colors = self.staple_colors(reset=True)
+        staple_colors.set_bins(staple_colors.lengths, bins)
+        staple_colors.apply()
+
+    @_journaled
+    def color_by_metric(self, values, bins):
+        """ Colors every staple by the bin of its value, values are in the order of find_staples(). """
+        staple_colors = self.staple_colors()
+        staple_colors.set_bins(values, bins)
+        staple_colors.apply()
+
+    def color_by_domain(self, bins=(0, 7, 8, 14, 16, 1000)):
+        self.color_by_metric(analytics.path_metrics(self.design)['longest_domain'], bins)
+
+    def staple_seq_metric(self, staple_seqs, metric):
+        """
+        Returns the 'gc' or 'tm' of every staple in the order of find_staples(), nan for staples without sequence.
+
+        Parameters
+        ----------
+        staple_seqs : dict
+            maps the (helix_num, base_num) start of a staple to its sequence
+        """
+        seqs = [staple_seqs.get(staple, '') for staple in self.find_staples()]
+        return analytics.sequence_metrics(seqs)[metric]
+
+    def color_by_gc(self, staple_seqs, bins=(0, 0.3, 0.4, 0.6, 0.7, 1.01)):
+        self.color_by_metric(self.staple_seq_metric(staple_seqs, 'gc'), bins)
+
+    def color_by_tm(self, staple_seqs, bins=(0, 50, 55, 60, 65, 70, 200)):
+        self.color_by_metric(self.staple_seq_metric(staple_seqs, 'tm'), bins)
+
+    # Sequencing
+
+    def scaf_layout(self):
+        """
+        Lays out the sequences of all scaf strands with the lattice settings of the session.
+
+        Returns
+        -------
+        scaf_order, scaf_offsets : array_like
+            the flat bases of all scaf strands with ends, see StrandIndex.flat_paths
+        seq_pointer_ra : array_like
+            for every base in scaf_order, where its piece starts in the sequence of its strand
+        seq_length_ra : array_like
+            the sequence length every scaf strand needs, including crossover loops
+        maxiscaf_num : int
+            the index of the maxiscaf, the first of the longest scaf strands
+        """
+        #Number of scaffold bases of every base including skips, loops and crossover loops, summed over every strand
+        base_lengths = scaf_base_lengths(self.design, self.on_lattice_length, self.off_lattice_length,
+                                         self.no_loop_exceptions)
+        scaf_order, scaf_offsets = self.design.strands('scaf').flat_paths(circular=False)
+        running_length = np.zeros(len(scaf_order) + 1, dtype=np.int64)
+        np.cumsum(base_lengths[scaf_order], out=running_length[1:])
+        seq_length_ra = running_length[scaf_offsets[1:]] - running_length[scaf_offsets[:-1]]
+        seq_pointer_ra = running_length[:-1] - np.repeat(running_length[scaf_offsets[:-1]], np.diff(scaf_offsets))
+        maxiscaf_num = int(np.argmax(np.diff(scaf_offsets))) if len(scaf_offsets) > 1 else 0
+        return scaf_order, scaf_offsets, seq_pointer_ra, seq_length_ra, maxiscaf_num
+
+    def give_sequences(self, verbose=True):
+        """
+        Assigns the maxiscaf sequence and the designed sequences of the library to the scaf strands
+        and the complementary sequences to the staples.
+
+        Parameters
+        ----------
+        verbose : bool
+            print the maxiscaf lengths and the sequence of every helix, like give_sequences of assign_sequences.py
+
+        Returns
+        -------
+        scaf_table, stap_table : StrandTable
+            the scaf strands and the staples sorted by color, also stored in the session
+        """
+        with instrumentation.stage('give_sequences'):
+            return self._give_sequences(verbose)
+
+    def _give_sequences(self, verbose):
+        data = self.design
+        num_vstrands, num_helix_bases = data.num_helices, data.num_bases
+
+        #Generate arrays for stap paths and scaf paths, both parities are traced once by the strand index
+        with instrumentation.stage('path discovery'):
+            scaf_strands = data.strands('scaf')
+            stap_strands = data.strands('stap')
+        #Circular strands have no ends and are left out, like in the old scripts, the instrumentation reports them
+        if instrumentation.enabled():
+            for strands in (scaf_strands, stap_strands):
+                instrumentation.count('circular %s strands left out' % strands.parity, len(strands.circular))
+                for key in sorted(strands.circular):
+                    print("Warning: circular", strands.parity, "strand through", strands.pointer(key),
+                          "has no ends and is left out.")
+
+        #Number of scaffold bases of every base, and where it starts in the sequence of its scaf strand
+        with instrumentation.stage('maxiscaf length'):
+            scaf_order, scaf_offsets, seq_pointer_ra, seq_length_ra, maxiscaf_num = self.scaf_layout()
+            maxiscaf_length = int(seq_length_ra[maxiscaf_num]) if len(seq_length_ra) else 0
+
+        if len(self.scaffold_seq) < maxiscaf_length:
+            raise ScaffoldTooShort("Error:  %s only has  %d bases, whereas %d bases are required for %s ."
+                                   % (self.scaffold_name, len(self.scaffold_seq), maxiscaf_length, self.file_name))
+
+        if verbose:
+            print("According to", self.file_name, ", the maxiscaf length should be", maxiscaf_length)
+            print("The maxiscaf sequence length in ", self.scaffold_name, "is", len(self.scaffold_seq))
+            print()
+
+        with instrumentation.stage('scaffold layout'):
+            #Assign scaf base sequences, every length takes the designed sequences of the library in order and the
+            #maxiscaf length the maxiscaf sequence. The library itself is not changed.
+            seq_counter_dc = {}
+            seq_ra = []
+            for seq_length in seq_length_ra.tolist():
+                library_seqs = [self.scaffold_seq] if seq_length == maxiscaf_length else self.seq_library[seq_length]
+                seq_ra.append(library_seqs[seq_counter_dc.get(seq_length, 0)])
+                seq_counter_dc[seq_length] = seq_counter_dc.get(seq_length, 0) + 1
+            #The sequences of all scaf strands are laid out in the uint8 array seq_codes, base flat gets
+            #seq_codes[piece_start[flat]:piece_start[flat] + piece_length[flat]], bases without scaf get '.'
+            seq_codes, seq_offsets = sequences.encode(seq_ra + ['.'])
+            strand_ids = sequences.segment_ids(scaf_offsets)
+            num_flat_bases = num_vstrands*num_helix_bases
+            piece_start = np.full(num_flat_bases, seq_offsets[-2], dtype=np.int64)
+            piece_length = np.ones(num_flat_bases, dtype=np.int64)
+            piece_start[scaf_order] = seq_offsets[strand_ids] + seq_pointer_ra
+            #Like seq[seq_pointer:seq_pointer + 1 + skip + loop], pieces never run past the end of seq
+            piece_length[scaf_order] = np.clip(np.diff(seq_offsets)[strand_ids] - seq_pointer_ra, 0,
+                                               (1 + data.skip.astype(np.int64) + data.loop).ravel()[scaf_order])
+
+        #Print vstrand sequences
+        if verbose:
+            with instrumentation.stage('print helices'):
+                vstrand_codes, vstrand_offsets = sequences.gather(seq_codes, piece_start, piece_length,
+                                                                  np.arange(num_vstrands + 1)*num_helix_bases)
+                lines = ['%02d %s' % (data.helix_num(vstrand_num), vstrand_seq)
+                         for vstrand_num, vstrand_seq in enumerate(sequences.decode(vstrand_codes, vstrand_offsets))]
+                if lines:
+                    print('\n'.join(lines))
+
+        with instrumentation.stage('staple strings'):
+            #Set up stap_color_ra to help with matching caDNAno colors to staple strands, -1 for bases without color
+            stap_color_ra = np.full(num_flat_bases, -1, dtype=np.int64)
+            color_vstrand_nums = sequences.segment_ids(data.color_offsets)
+            stap_color_ra[color_vstrand_nums*num_helix_bases + data.stap_colors[:, 0]] = data.stap_colors[:, 1]
+
+            #Generate staple strand output
+            #Every stap base is the complement of its scaf piece, so a staple is the reverse complement of its pieces 3' to 5'
+            stap_order, stap_offsets = stap_strands.flat_paths(circular=False)
+            pieces = sequences.reverse_segments(stap_order, stap_offsets)
+            stap_codes, stap_seq_offsets = sequences.reverse_complement_codes(
+                *sequences.gather(seq_codes, piece_start[pieces], piece_length[pieces], stap_offsets))
+            stap_firsts, stap_lasts = stap_order[stap_offsets[:-1]], stap_order[stap_offsets[1:] - 1]
+            helix_nums = scaf_strands.helix_nums
+            stap_table = tables.StrandTable(sequences.decode(stap_codes, stap_seq_offsets),
+                                            helix_nums[stap_firsts // num_helix_bases], stap_firsts % num_helix_bases,
+                                            helix_nums[stap_lasts // num_helix_bases], stap_lasts % num_helix_bases,
+                                            [self.color_names[stap_color_int] for stap_color_int in stap_color_ra[stap_firsts].tolist()])
+            instrumentation.count('sequences built', len(stap_table))
+
+        #Generate scaffold strand output
+        with instrumentation.stage('scaffold strings'):
+            scaf_codes, scaf_seq_offsets = sequences.gather(seq_codes, piece_start[scaf_order], piece_length[scaf_order],
+                                                            scaf_offsets)
+            scaf_firsts, scaf_lasts = scaf_order[scaf_offsets[:-1]], scaf_order[scaf_offsets[1:] - 1]
+            self.scaf_table = tables.StrandTable(sequences.decode(scaf_codes, scaf_seq_offsets),
+                                                 helix_nums[scaf_firsts // num_helix_bases], scaf_firsts % num_helix_bases,
+                                                 helix_nums[scaf_lasts // num_helix_bases], scaf_lasts % num_helix_bases)
+            instrumentation.count('sequences built', len(self.scaf_table))
+
+        #Sort staple strands according to caDNAno color
+        with instrumentation.stage('sort'):
+            self.stap_table = stap_table.sorted_by_color()
+        return self.scaf_table, self.stap_table
+
+    def attach_handles(self, rules):
+        """ Attaches handles to stap_table, see handles.attach_handles, and returns the handle_dc. """
+        self.stap_table, handle_dc = handles.attach_handles(self.stap_table, rules)
+        return handle_dc
+
+    def check_handles(self, handle_dc, k=8):
+        """ Prints the complementary stretches of the handles, see print_crosstalk. """
+        return print_crosstalk(handle_dc, self.stap_table, self.scaffold_seq, k)
+
+    def print_sequences(self):
+        print_tables(self.scaf_table, self.stap_table)
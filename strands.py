@@ -0,0 +1,261 @@
+"""
+Strand tracing for cadnano2 designs.
+
+Every base of a `Design` gets a flat index, vstrand_num * num_bases + base_num.
+The [prev, next] pointers of the scaf or stap array are translated once to flat
+successor and predecessor arrays, after which all strands are followed in a
+single pass over the bases, O(total bases). After an edit, only the strands
+that run through the edited bases are traced again.
+
+The pointers must be reciprocal: if base a points to b as next, b points to a as
+prev. Tracing raises a ValueError at the first base that breaks this, instead of
+letting two strands claim the same base, validate.py reports all of them.
+"""
+
+import numpy as np
+
+import instrumentation
+
+
+def flat_links(design, parity):
+    """
+    Translates the pointers of design.scaf or design.stap to flat base indices.
+
+    Parameters
+    ----------
+    design : Design
+    parity : str
+        'scaf' or 'stap'
+
+    Returns
+    -------
+    prev, next : array_like
+        int64 arrays of length num_helices * num_bases, -1 where there is no neighbour.
+    """
+    pointers = getattr(design, parity).reshape(-1, 4)
+    return _to_flat(design, pointers[:, :2]), _to_flat(design, pointers[:, 2:])
+
+
+def _to_flat(design, pointers):
+    """ Translates an (n, 2) array of [helix_num, base_num] pointers to flat base indices. """
+    pointers = pointers.astype(np.int64)
+    helix_nums = pointers[:, 0]
+    linked = helix_nums != -1
+    vstrand_of_num = np.full(max(design.idx) + 1 if design.idx else 1, -1, dtype=np.int64)
+    vstrand_of_num[list(design.idx)] = list(design.idx.values())
+    vstrand_nums = vstrand_of_num[np.where(linked, helix_nums, 0)]
+    if (linked & (vstrand_nums == -1)).any():
+        raise ValueError('The design points to helix numbers that do not exist.')
+    return np.where(linked, vstrand_nums * design.num_bases + pointers[:, 1], -1)
+
+
+class StrandIndex(object):
+    """
+    All strands of one parity of a design.
+
+    A strand is identified by the flat index of its first base, that is its 5' end
+    or, for a circular strand, its lowest flat index. Sorting by this key gives the
+    same order as scanning the design helix by helix and base by base.
+
+    Attributes
+    ----------
+    parity : str
+        'scaf' or 'stap'
+    num_bases : int
+        number of bases per helix
+    helix_nums : array_like
+        maps vstrand indices to "user interface" helix numbers
+    paths : dict
+        maps the key of every strand to the list of flat indices of its bases, 5' to 3'
+    circular : set
+        keys of the strands that have no ends
+    strand_of : array_like
+        the key of the strand every base belongs to, -1 for bases without strand
+
+    Example
+    -------
+    strands = design.strands('stap')
+    strands.starts()
+    >>>> [(0, 154), (1, 14), ..., (14, 158)]
+    """
+
+    def __init__(self, design, parity):
+        self.parity = parity
+        self.num_bases = design.num_bases
+        self.helix_nums = np.array([design.helix_num(vstrand_num) for vstrand_num in range(design.num_helices)],
+                                   dtype=np.int64)
+        with instrumentation.stage('trace %s strands' % parity):
+            self.prev, self.next = flat_links(design, parity)
+            self._next_ra = self.next.tolist()
+            self.paths = {}
+            self.circular = set()
+            self.strand_of = np.full(len(self.next), -1, dtype=np.int64)
+            self._trace(np.arange(len(self.next)))
+
+    @classmethod
+    def from_arrays(cls, design, parity, order, offsets, circular):
+        """
+        Restores an index that was stored with to_arrays(), without tracing the strands again.
+        """
+        self = cls.__new__(cls)
+        self.parity = parity
+        self.num_bases = design.num_bases
+        self.helix_nums = np.array([design.helix_num(vstrand_num) for vstrand_num in range(design.num_helices)],
+                                   dtype=np.int64)
+        self.prev, self.next = flat_links(design, parity)
+        self._next_ra = self.next.tolist()
+        order = np.asarray(order, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        keys = order[offsets[:-1]]
+        self.paths = dict(zip(keys.tolist(), [path.tolist() for path in np.split(order, offsets[1:-1])]))
+        self.circular = set(np.asarray(circular, dtype=np.int64).tolist())
+        self.strand_of = np.full(len(self.next), -1, dtype=np.int64)
+        self.strand_of[order] = np.repeat(keys, np.diff(offsets))
+        return self
+
+    def flat_paths(self, circular=True):
+        """
+        Returns the bases of all strands in the order of keys(circular) as flat arrays.
+
+        Returns
+        -------
+        order : array_like
+            the flat indices of the bases of all strands, one strand after the other
+        offsets : array_like
+            strand i is order[offsets[i]:offsets[i+1]]
+        """
+        keys = self.keys(circular)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(self.paths[key]) for key in keys], out=offsets[1:])
+        order = np.fromiter((base for key in keys for base in self.paths[key]), dtype=np.int64, count=offsets[-1])
+        return order, offsets
+
+    def to_arrays(self):
+        """
+        Returns the strands as flat arrays, see flat_paths().
+
+        Returns
+        -------
+        order, offsets : array_like
+            all strands, including the circular ones
+        circular : array_like
+            the keys of the circular strands
+        """
+        order, offsets = self.flat_paths()
+        return order, offsets, np.array(sorted(self.circular), dtype=np.int64)
+
+    def update(self, design, flat):
+        """
+        Updates the index after the pointers of the bases in flat were changed.
+
+        Only the strands that ran through these bases, or through the bases they
+        point to, are removed and traced again, so splitting or joining a few
+        strands costs time proportional to the length of these strands.
+
+        Parameters
+        ----------
+        design : Design
+            the design this index was made for
+        flat : array_like
+            flat indices of the edited bases
+        """
+        with instrumentation.stage('update %s strands' % self.parity):
+            self._update(design, flat)
+
+    def _update(self, design, flat):
+        flat = np.unique(np.asarray(flat, dtype=np.int64))
+        old_neighbours = np.concatenate([self.prev[flat], self.next[flat]])
+        pointers = getattr(design, self.parity).reshape(-1, 4)[flat]
+        self.prev[flat] = _to_flat(design, pointers[:, :2])
+        self.next[flat] = _to_flat(design, pointers[:, 2:])
+        for base, next in zip(flat.tolist(), self.next[flat].tolist()):
+            self._next_ra[base] = next
+        bases = np.concatenate([flat, old_neighbours, self.prev[flat], self.next[flat]])
+        bases = bases[bases != -1]
+        keys = np.unique(self.strand_of[bases])
+        removed = [bases]
+        for key in keys[keys != -1].tolist():
+            removed.append(self.paths.pop(key))
+            self.circular.discard(key)
+        marked = np.zeros(len(self.next), dtype=bool)
+        for bases in removed:
+            marked[bases] = True
+        candidates = np.flatnonzero(marked)
+        self.strand_of[candidates] = -1
+        self._trace(candidates)
+
+    def _trace(self, candidates):
+        """
+        Follows all strands that start at, or run through, the flat indices in candidates.
+        """
+        num_paths = len(self.paths)
+        prev, next = self.prev[candidates], self.next[candidates]
+        broken = ((prev != -1) & (self.next[prev] != candidates)) | ((next != -1) & (self.prev[next] != candidates))
+        if broken.any():
+            raise ValueError('The %s pointers of %d bases do not point back, the first is at %s.'
+                             % (self.parity, broken.sum(), self.pointer(int(candidates[broken][0]))))
+        starts = candidates[(prev == -1) & (next != -1)]
+        for start in starts.tolist():
+            self._add(self._follow(start, -1, len(candidates)))
+        # Bases that are linked but not reached from any 5' end lie on circular strands.
+        remaining = candidates[next != -1]
+        remaining = remaining[self.strand_of[remaining] == -1]
+        for start in remaining.tolist():
+            if self.strand_of[start] == -1:
+                self._add(self._follow(start, start, len(candidates)), circular=True)
+        if instrumentation.enabled():
+            instrumentation.count('strands traced', len(self.paths) - num_paths)
+            instrumentation.count('bases visited', int((self.strand_of[candidates] != -1).sum()))
+
+    def _follow(self, start, stop, limit):
+        """ Returns the flat indices from start until the next base is stop. """
+        next_ra = self._next_ra
+        path = [start]
+        base = next_ra[start]
+        while base != stop:
+            if base == -1 or len(path) == limit:
+                raise ValueError('The %s strand that starts at %s runs into a loop.'
+                                 % (self.parity, self.pointer(start)))
+            path.append(base)
+            base = next_ra[base]
+        return path
+
+    def _add(self, path, circular=False):
+        key = path[0]
+        self.paths[key] = path
+        self.strand_of[path] = key
+        if circular:
+            self.circular.add(key)
+
+    def keys(self, circular=True):
+        """
+        Returns the keys of all strands in design order.
+
+        Parameters
+        ----------
+        circular : bool
+            Use circular=False to leave out the circular strands.
+        """
+        return sorted(key for key in self.paths if circular or key not in self.circular)
+
+    def pointer(self, flat):
+        """ Returns [helix_num, base_num] of a flat base index. """
+        return [int(self.helix_nums[flat // self.num_bases]), flat % self.num_bases]
+
+    def path(self, key):
+        """ Returns the bases of a strand as a list of [helix_num, base_num], 5' to 3'. """
+        path = np.asarray(self.paths[key])
+        helix_nums = self.helix_nums[path // self.num_bases].tolist()
+        return [list(pointer) for pointer in zip(helix_nums, (path % self.num_bases).tolist())]
+
+    def starts(self):
+        """ Returns the (helix_num, base_num) of the 5' ends of all linear strands. """
+        return [tuple(self.pointer(key)) for key in self.keys(circular=False)]
+
+    def lengths(self, circular=True):
+        """ Returns the number of bases of every strand, in the order of keys(). """
+        return np.array([len(self.paths[key]) for key in self.keys(circular)], dtype=np.int64)
+
+    def ends(self, circular=True):
+        """ Returns the [helix_num, base_num] of the first and last base of every strand. """
+        return [(self.pointer(self.paths[key][0]), self.pointer(self.paths[key][-1])) for key in self.keys(circular)]
@@ -0,0 +1,204 @@
+"""
+Streaming reader and writer for cadnano2 *.json files.
+
+json.load builds the Python lists of the whole file before anything is
+converted, which for large designs costs several times the file size. The
+reader here reads the file in chunks, decodes one vstrand at a time and turns it
+into int32 arrays right away, so at most one helix exists as Python objects.
+The writer emits the file vstrand by vstrand in the layout json.dump uses.
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Per-helix keys of a vstrand that are stored as arrays, all others are kept as is.
+ARRAY_KEYS = ('scaf', 'stap', 'skip', 'loop', 'stap_colors')
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader(object):
+    """ Decodes JSON values from a file that is read in chunks. """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        """ Reads at least size more characters, unless the file ends. """
+        if self.pos > self.chunk_size:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        chunk = self.f.read(max(size, self.chunk_size))
+        self.eof = not chunk
+        self.buf += chunk
+        return not self.eof
+
+    def peek(self):
+        """ Returns the next character that is not whitespace. """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.chunk_size):
+                raise ValueError('Unexpected end of the *.json file.')
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError('Expected %r at character %d, found %r.' % (chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """ Decodes the next value, reading more of the file until it is complete. """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # The value is cut off by the end of the buffer, double what we read.
+                if not self._fill(len(self.buf) - self.pos):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self.buf) and not self.eof and self._fill(self.chunk_size):
+                continue
+            self.pos = end
+            return value
+
+
+def process_peak_rss_mb():
+    """
+    Returns the peak resident memory of this process in MB, or None. That is the peak since the process
+    started, not of the last call, use tracemalloc as in benchmarks.py for the memory of one function.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB, macOS bytes.
+    return peak / 1024.0**2 if sys.platform == 'darwin' else peak / 1024.0
+
+
+def read_json(file_name, chunk_size=CHUNK_SIZE):
+    """
+    Reads a cadnano2 *.json file one vstrand at a time.
+
+    Parameters
+    ----------
+    file_name : str
+        The name and location of the *.json file
+    chunk_size : int
+        number of characters that are read at once
+
+    Returns
+    -------
+    parts : dict
+        the arguments of Design(), that is data, meta, scaf, stap, skip, loop,
+        stap_colors and color_offsets
+    stats : dict
+        'seconds' it took to load the file and 'process_peak_rss_mb' afterwards, the peak of the whole
+        process so far, see process_peak_rss_mb
+    """
+    start_time = time.time()
+    top, meta = {}, []
+    arrays = dict((key, []) for key in ARRAY_KEYS)
+    with open(file_name) as f:
+        reader = _Reader(f, chunk_size)
+        reader.expect('{')
+        while reader.peek() != '}':
+            key = reader.decode()
+            reader.expect(':')
+            if key != 'vstrands':
+                top[key] = reader.decode()
+            else:
+                top[key] = None
+                reader.expect('[')
+                while reader.peek() != ']':
+                    vstrand = reader.decode()
+                    for array_key in ARRAY_KEYS:
+                        arrays[array_key].append(np.array(vstrand[array_key], dtype=np.int32))
+                    meta.append(dict((k, None if k in ARRAY_KEYS else value) for k, value in vstrand.items()))
+                    del vstrand
+                    if reader.peek() == ',':
+                        reader.pos += 1
+                reader.expect(']')
+            if reader.peek() == ',':
+                reader.pos += 1
+    parts = stack_vstrands(top, meta, arrays)
+    stats = {'seconds': time.time() - start_time, 'process_peak_rss_mb': process_peak_rss_mb()}
+    return parts, stats
+
+
+def stack_vstrands(top, meta, arrays):
+    """
+    Joins per-vstrand arrays into the arrays of a Design.
+
+    Parameters
+    ----------
+    top : dict
+        the top level entries of the file
+    meta : list
+        the non-array entries of every vstrand
+    arrays : dict
+        maps every key in ARRAY_KEYS to a list with one array per vstrand, the lists are emptied.
+    """
+    num_helices = len(meta)
+    num_bases = len(arrays['scaf'][0]) if num_helices else 0
+    for vstrand, scaf, stap in zip(meta, arrays['scaf'], arrays['stap']):
+        if len(scaf) != num_bases or len(stap) != num_bases:
+            raise ValueError('All vstrands must have %d bases, helix %d does not.' % (num_bases, vstrand['num']))
+    parts = {'data': top, 'meta': meta}
+    for key, shape in [('scaf', (num_helices, num_bases, 4)), ('stap', (num_helices, num_bases, 4)),
+                       ('skip', (num_helices, num_bases)), ('loop', (num_helices, num_bases))]:
+        parts[key] = np.stack(arrays[key]).reshape(shape) if num_helices else np.zeros(shape, dtype=np.int32)
+        del arrays[key][:]
+    colors = [color.reshape(-1, 2) for color in arrays['stap_colors']]
+    parts['color_offsets'] = np.zeros(num_helices + 1, dtype=np.int64)
+    np.cumsum([len(color) for color in colors], out=parts['color_offsets'][1:])
+    parts['stap_colors'] = np.concatenate(colors) if colors else np.zeros((0, 2), dtype=np.int32)
+    return parts
+
+
+def write_json(design, file_name):
+    """
+    Writes a design vstrand by vstrand, in the same layout as json.dump(design.to_json()).
+
+    Parameters
+    ----------
+    design : Design
+    file_name : str
+        The name and location of the *.json file
+    """
+    with open(file_name, 'w') as f:
+        f.write('{')
+        for key_num, (key, value) in enumerate(design.data.items()):
+            f.write(', ' if key_num else '')
+            f.write(json.dumps(key) + ': ')
+            if key != 'vstrands':
+                f.write(json.dumps(value))
+                continue
+            f.write('[')
+            for vstrand_num, meta in enumerate(design.meta):
+                arrays = {'scaf': design.scaf[vstrand_num], 'stap': design.stap[vstrand_num],
+                          'skip': design.skip[vstrand_num], 'loop': design.loop[vstrand_num],
+                          'stap_colors': design.helix_colors(vstrand_num)}
+                vstrand = dict(meta)
+                for array_key in ARRAY_KEYS:
+                    vstrand[array_key] = arrays[array_key].tolist()
+                f.write(', ' if vstrand_num else '')
+                f.write(json.dumps(vstrand))
+            f.write(']')
+        f.write('}')
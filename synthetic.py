@@ -0,0 +1,288 @@
+"""
+Synthetic cadnano2 designs of any size.
+
+lattice_design() builds the full vstrands of an N x M block of helices in the
+square or honeycomb lattice, like a block drawn in cadnano2: the scaffold snakes
+through the helices row by row, every helix has scaffold and staple on the same
+bases, in the direction of its polarity (col + row), and the staples cross over
+to every neighbouring helix at the positions cadnano2 allows, once per period.
+The scaffold crosses over to the next helix at the legal scaffold crossover
+closest to the end of the helix (see LatticeMap), so its ends on every helix are
+up to one period inside the margins. The staples are broken every period, at the
+BREAK_PHASES of the polarity of the helix, so none of them is circular. Skips and
+loops are empty.
+
+synthetic_design() builds one row of helices, which makes it an input for
+benchmarks.py. Blocks whose scaffold would have to cross over between helices
+that are not neighbours, like a honeycomb block with an odd number of columns,
+raise ValueError.
+
+All pointers are written with array operations, a 20 x 20 block of 10000 bases
+is built in a few seconds. The designs are consistent (see validate.py) and can
+be saved as *.json files that cadnano2 and load_json read.
+
+Example
+-------
+design = lattice_design(6, 10, 512, lattice='honeycomb')
+design.save('honeycomb_6x10.json')
+
+python synthetic.py 20 20 10000 --lattice honeycomb --output honeycomb_20x20.json
+"""
+
+import argparse
+
+import numpy as np
+
+import coloring
+import lattice as lattices
+from design import Design
+
+# The staple breaks modulo period, on helices with even and odd col + row.
+BREAK_PHASES = {'square': (8, 24), 'honeycomb': (3, 10)}
+
+
+def staple_crossover_bases(lattice, direction, first_base, last_base):
+    """
+    Returns the bases p of the staple crossovers from a helix with even col + row to its
+    neighbour number direction, each crossover connects p - 1 and p on both helices.
+    In synthetic_design direction 0 connects helix_num to helix_num + 1 for even helix_num,
+    direction 2 for odd helix_num.
+    """
+    return lattices.get_lattice(lattice).crossover_bases(direction, first_base + 1, last_base - 2) + 1
+
+
+def staple_break_bases(lattice, helix_num, first_base, last_base):
+    """
+    Returns the bases of the staple breaks on helix_num between first_base and last_base, a break at q is
+    between q and q + 1. In synthetic_design helix_num has the parity of col + row.
+    """
+    lattice = lattices.get_lattice(lattice)
+    bases = np.arange(BREAK_PHASES[lattice.name][helix_num % 2], last_base, lattice.period)
+    return bases[bases >= first_base]
+
+
+def snake_order(num_rows, num_cols):
+    """
+    Returns the rows and cols of an N x M block in the order the scaffold runs through it,
+    row by row and every other row from right to left.
+    """
+    rows = np.repeat(np.arange(num_rows), num_cols)
+    cols = np.tile(np.arange(num_cols), num_rows)
+    return rows, np.where(rows % 2 == 1, num_cols - 1 - cols, cols)
+
+
+def neighbor_pairs(rows, cols, lattice):
+    """
+    Finds all pairs of neighbouring helices, see LatticeMap.neighbor_pairs.
+
+    Parameters
+    ----------
+    rows, cols : array_like
+        the lattice position of every helix
+
+    Returns
+    -------
+    pairs : list
+        (even, other) per neighbour direction, the indices of the helices with even col + row
+        and of their neighbours in that direction
+    """
+    return lattices.LatticeMap(lattices.get_lattice(lattice), rows, cols).neighbor_pairs()
+
+
+def _scaffold_route(lattice_map, first_base, last_base):
+    """
+    Returns the first and last base of the scaffold on every helix. The scaffold runs through the helices
+    in order and crosses over to the next one at the scaffold crossover closest to the end of the helix.
+    """
+    lattice = lattice_map.lattice
+    odd = lattice_map.odd
+    entries = np.where(odd, last_base, first_base)
+    exits = np.where(odd, first_base, last_base)
+    helices = np.arange(len(odd) - 1)
+    if not len(helices):
+        return entries, exits
+    even = np.where(odd[helices], helices + 1, helices)
+    direction = lattice_map.direction(even, np.where(odd[helices], helices, helices + 1))
+    if (direction == -1).any():
+        helix_num = int(helices[direction == -1][0])
+        raise ValueError('The scaffold can not cross over from helix %d to helix %d, they are not neighbours.'
+                         % (helix_num, helix_num + 1))
+    # A scaffold crossover with low base b goes from b to b on the way up and from b + 1 to b + 1 on the way down.
+    bases = np.arange(first_base - 1, last_base + 1)
+    allowed = lattice.scaffold_table[direction][:, bases % lattice.period]
+    up = ~odd[helices]
+    allowed &= np.where(up[:, None], bases >= first_base, bases <= last_base - 1)
+    last = len(bases) - 1 - np.argmax(allowed[:, ::-1], axis=1)
+    first = np.argmax(allowed, axis=1)
+    exits[helices] = np.where(up, bases[last], bases[first] + 1)
+    entries[helices + 1] = exits[helices]
+    if (np.where(odd, exits >= entries, exits <= entries)).any():
+        raise ValueError('The helices are too short for crossovers between them, use more bases.')
+    return entries, exits
+
+
+def _strands(rows, cols, num_bases, lattice, first_base, last_base):
+    """
+    Returns the scaf and stap arrays of helices at the given lattice positions, the scaffold runs
+    through them in the given order, the staples cross over to all neighbours and are broken
+    every period.
+    """
+    num_helices = len(rows)
+    helix_nums = np.arange(num_helices, dtype=np.int32)
+    vstrand_nums = np.arange(num_helices)
+    # Helices with even col + row have the scaffold running to higher bases.
+    lattice_map = lattices.LatticeMap(lattices.get_lattice(lattice), rows, cols)
+    odd = lattice_map.odd
+    entries, exits = _scaffold_route(lattice_map, first_base, last_base)
+    lows, highs = np.minimum(entries, exits), np.maximum(entries, exits)
+    bases = np.arange(num_bases, dtype=np.int32)
+    outside = (bases < lows[:, None]) | (bases > highs[:, None])
+    scaf_step = np.where(odd, -1, 1).astype(np.int32)[:, None]
+    scaf = np.full((num_helices, num_bases, 4), -1, dtype=np.int32)
+    stap = np.full((num_helices, num_bases, 4), -1, dtype=np.int32)
+    for strand, step in [(scaf, scaf_step), (stap, -scaf_step)]:
+        strand[:, :, 0] = helix_nums[:, None]
+        strand[:, :, 1] = bases - step
+        strand[:, :, 2] = helix_nums[:, None]
+        strand[:, :, 3] = bases + step
+        strand[outside] = -1
+    scaf[vstrand_nums, entries, :2] = -1
+    scaf[vstrand_nums, exits, 2:] = -1
+    stap[vstrand_nums, exits, :2] = -1
+    stap[vstrand_nums, entries, 2:] = -1
+
+    # The scaffold crosses over to the next helix at the same base.
+    pairs = vstrand_nums[:-1]
+    scaf[pairs, exits[pairs], 2] = pairs + 1
+    scaf[pairs, exits[pairs], 3] = exits[pairs]
+    scaf[pairs + 1, exits[pairs], 0] = pairs
+    scaf[pairs + 1, exits[pairs], 1] = exits[pairs]
+
+    # Staple crossovers at p - 1 and p, the staple on the even helix leaves it at p.
+    for direction, (even, other) in enumerate(lattice_map.neighbor_pairs()):
+        xover_bases = staple_crossover_bases(lattice, direction, first_base, last_base)
+        even, p = [a.ravel() for a in np.meshgrid(even, xover_bases, indexing='ij')]
+        other = np.repeat(other, len(xover_bases))
+        inside = (p - 1 >= np.maximum(lows[even], lows[other])) & (p <= np.minimum(highs[even], highs[other]))
+        even, other, p = even[inside], other[inside], p[inside]
+        stap[even, p, 2:] = np.column_stack([other, p])
+        stap[other, p, :2] = np.column_stack([even, p])
+        stap[other, p - 1, 2:] = np.column_stack([even, p - 1])
+        stap[even, p - 1, :2] = np.column_stack([other, p - 1])
+
+    # Staple breaks between q and q + 1, like insertBreak, the staples of even helices run to lower bases.
+    for parity in (0, 1):
+        break_rows, q = [a.ravel() for a in np.meshgrid(np.flatnonzero(odd == parity), staple_break_bases(
+            lattice, parity, first_base, last_base - 1), indexing='ij')]
+        inside = (q >= lows[break_rows]) & (q + 1 <= highs[break_rows])
+        break_rows, q = break_rows[inside], q[inside]
+        into, out = (slice(2, 4), slice(0, 2)) if parity else (slice(0, 2), slice(2, 4))
+        stap[break_rows, q, into] = -1
+        stap[break_rows, q + 1, out] = -1
+    return scaf, stap
+
+
+def _design(rows, cols, scaf, stap, lattice, color, name):
+    """ Returns the Design of the arrays, with one stap_colors row of color at every staple 5' end. """
+    num_helices, num_bases = scaf.shape[:2]
+    color_offsets = np.zeros(num_helices + 1, dtype=np.int64)
+    if color is None:
+        stap_colors = np.zeros((0, 2), dtype=np.int32)
+    else:
+        color_rows, color_bases = np.nonzero((stap[:, :, :2] == -1).all(axis=2) & (stap[:, :, 2:] != -1).any(axis=2))
+        stap_colors = np.column_stack([color_bases, np.full(len(color_bases), color)]).astype(np.int32)
+        np.cumsum(np.bincount(color_rows, minlength=num_helices), out=color_offsets[1:])
+    meta = [{'stap_colors': None, 'num': helix_num, 'scafLoop': [], 'stap': None, 'stapLoop': [], 'col': col,
+             'skip': None, 'scaf': None, 'row': row, 'loop': None}
+            for helix_num, row, col in zip(range(num_helices), rows.tolist(), cols.tolist())]
+    skip = np.zeros((num_helices, num_bases), dtype=np.int32)
+    loop = np.zeros((num_helices, num_bases), dtype=np.int32)
+    return Design({'name': name, 'vstrands': None}, meta, scaf, stap, skip, loop, stap_colors, color_offsets,
+                  lattice=lattice)
+
+
+def _span(num_bases, lattice, margin):
+    """ Returns the first and last base of the strands. """
+    if margin is None:
+        margin = lattices.get_lattice(lattice).period // 2
+    first_base, last_base = margin, num_bases - 1 - margin
+    if last_base <= first_base:
+        raise ValueError('%d bases leave no room for strands with a margin of %d.' % (num_bases, margin))
+    return first_base, last_base
+
+
+def lattice_design(num_rows, num_cols, num_bases, lattice='square', margin=None, color=coloring.GREY,
+                   name='lattice.json'):
+    """
+    Builds an N x M block of helices, see the module docstring.
+
+    Parameters
+    ----------
+    num_rows, num_cols : int
+        the size of the block, the helices are at rows 0 ... num_rows - 1 and cols 0 ... num_cols - 1
+    num_bases : int
+        the length of every helix, including the empty margins, a multiple of the period of the
+        lattice (32 or 21) makes cadnano2 and load_json find the lattice from it
+    lattice : str
+        'square' or 'honeycomb'
+    margin : int
+        the number of empty bases at both ends of the helices, by default half a period
+    color : int
+        the color of every staple, use color=None to leave stap_colors empty like a design
+        that was never opened in cadnano2
+    name : str
+        the 'name' entry of the design
+
+    Returns
+    -------
+    design : Design
+        helix i is the i-th helix along the scaffold, so its number has the parity of its polarity.
+        A block in which consecutive helices of the scaffold are not neighbours, in the honeycomb
+        lattice every odd num_cols > 1, raises ValueError.
+    """
+    first_base, last_base = _span(num_bases, lattice, margin)
+    rows, cols = snake_order(num_rows, num_cols)
+    scaf, stap = _strands(rows, cols, num_bases, lattice, first_base, last_base)
+    return _design(rows, cols, scaf, stap, lattice, color, name)
+
+
+def synthetic_design(num_helices, num_bases, lattice='square', margin=None, name='synthetic.json'):
+    """
+    Builds one row of num_helices helices of num_bases bases with staples of about one period.
+
+    Parameters
+    ----------
+    num_helices : int
+    num_bases, lattice, margin, name
+        see lattice_design
+
+    Returns
+    -------
+    design : Design
+        helix i has num i, row 0 and col i, the staples are light gray
+    """
+    first_base, last_base = _span(num_bases, lattice, margin)
+    rows, cols = np.zeros(num_helices, dtype=np.int64), np.arange(num_helices)
+    scaf, stap = _strands(rows, cols, num_bases, lattice, first_base, last_base)
+    return _design(rows, cols, scaf, stap, lattice, coloring.GREY, name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Writes an N x M block of helices as cadnano2 *.json file.')
+    parser.add_argument('num_rows', type=int)
+    parser.add_argument('num_cols', type=int)
+    parser.add_argument('num_bases', type=int, help='bases per helix')
+    parser.add_argument('--lattice', choices=sorted(lattices.LATTICES), default='square')
+    parser.add_argument('--margin', type=int, help='empty bases at both ends, by default half a period')
+    parser.add_argument('--output', help='by default <lattice>_<rows>x<cols>.json')
+    args = parser.parse_args(argv)
+    file_name = args.output or '%s_%dx%d.json' % (args.lattice, args.num_rows, args.num_cols)
+    design = lattice_design(args.num_rows, args.num_cols, args.num_bases, args.lattice, args.margin,
+                            name=file_name)
+    design.save(file_name)
+    print(file_name)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,230 @@
+"""
+Columnar tables of staple and scaffold strands, with bulk exporters.
+
+A `StrandTable` keeps one list or array per column. Iterating over it still gives
+the rows [color, length, start, end, seq] (staples) or [length, start, end, seq]
+(scaffold strands) that give_sequences used to return. A row is a `StrandRow`
+that writes items back to the columns, so row[-1] += 'TT' + handle still edits
+the table. Every exporter formats all rows at once and writes them through one
+buffered file.
+
+Example
+-------
+scaf_output_ra, sorted_stap_output_ra, vstrands = give_sequences('7x3_output.json')
+sorted_stap_output_ra.to_tsv('7x3_staples.tsv')
+sorted_stap_output_ra.to_plates('7x3_order.csv', wells=384)
+"""
+
+import csv
+import json
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # only needed for to_parquet
+    pyarrow = None
+
+import sequences
+
+COLUMNS = ('color', 'length', 'start_helix', 'start_base', 'end_helix', 'end_base', 'seq')
+ROW_ITEMS = ('color', 'length', 'start', 'end', 'seq')
+PLATE_SHAPES = {96: (8, 12), 384: (16, 24)}
+BUFFER_SIZE = 1 << 20
+
+
+class StrandRow(list):
+    """
+    A row [color, length, start, end, seq] or [length, start, end, seq] of a StrandTable.
+
+    Writing an item, e.g. row[-1] += 'TT', also writes it to the table. The start
+    and end lists are copies, write them as a whole: row[2] = [helix_num, base_num].
+    """
+    __slots__ = ('table', 'row_num')
+
+    def __init__(self, table, row_num, items):
+        list.__init__(self, items)
+        self.table = table
+        self.row_num = row_num
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            raise TypeError('Write the items of a strand row one at a time.')
+        name = (ROW_ITEMS if self.table.color is not None else ROW_ITEMS[1:])[i]
+        table, row_num = self.table, self.row_num
+        if name in ('start', 'end'):
+            helix_num, base_num = value
+            getattr(table, name + '_helix')[row_num] = helix_num
+            getattr(table, name + '_base')[row_num] = base_num
+            value = [int(helix_num), int(base_num)]
+        else:
+            getattr(table, name)[row_num] = value
+        list.__setitem__(self, i, value)
+
+
+class StrandTable(object):
+    """
+    A table of strands with the columns color (staples only), length, start_helix,
+    start_base, end_helix, end_base and seq.
+
+    Parameters
+    ----------
+    seq : list
+        the sequences, with the handles if any were attached
+    start_helix, start_base, end_helix, end_base : array_like
+    color : list
+        color names, None for scaffold strands
+    length : array_like
+        the designed lengths without handles, by default the lengths of seq
+    """
+
+    def __init__(self, seq, start_helix, start_base, end_helix, end_base, color=None, length=None):
+        self.seq = list(seq)
+        self.length = np.array([len(s) for s in self.seq] if length is None else length, dtype=np.int64)
+        # Copies, row writes of one table must not change another.
+        self.start_helix = np.array(start_helix, dtype=np.int64)
+        self.start_base = np.array(start_base, dtype=np.int64)
+        self.end_helix = np.array(end_helix, dtype=np.int64)
+        self.end_base = np.array(end_base, dtype=np.int64)
+        self.color = None if color is None else list(color)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ Makes a table of rows [color, length, start, end, seq] or [length, start, end, seq]. """
+        rows = list(rows)
+        has_color = bool(rows) and len(rows[0]) == 5
+        starts = np.array([row[-3] for row in rows], dtype=np.int64).reshape(-1, 2)
+        ends = np.array([row[-2] for row in rows], dtype=np.int64).reshape(-1, 2)
+        return cls([row[-1] for row in rows], starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1],
+                   [row[0] for row in rows] if has_color else None, [row[-4] for row in rows])
+
+    def columns(self):
+        """ Returns the columns as a dict, in the order of COLUMNS. """
+        columns = dict((name, getattr(self, name)) for name in COLUMNS)
+        if self.color is None:
+            del columns['color']
+        return columns
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(np.arange(len(self))[i])
+        if i < 0:
+            i += len(self)
+        row = [int(self.length[i]), [int(self.start_helix[i]), int(self.start_base[i])],
+               [int(self.end_helix[i]), int(self.end_base[i])], self.seq[i]]
+        return StrandRow(self, i, row if self.color is None else [self.color[i]] + row)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, order):
+        """ Returns a new table with the rows in order. """
+        order = np.asarray(order, dtype=np.int64)
+        items = order.tolist()
+        return StrandTable([self.seq[i] for i in items], self.start_helix[order], self.start_base[order],
+                           self.end_helix[order], self.end_base[order],
+                           None if self.color is None else [self.color[i] for i in items], self.length[order])
+
+    def sorted_by_color(self):
+        """ Returns a new table sorted by color name, rows with the same color keep their order. """
+        return self.take(sorted(range(len(self)), key=self.color.__getitem__))
+
+    def with_seq(self, seq):
+        """ Returns a new table with other sequences, e.g. with handles, length stays the designed length. """
+        return StrandTable(seq, self.start_helix, self.start_base, self.end_helix, self.end_base, self.color,
+                           self.length)
+
+    def total_length(self):
+        """ Returns the lengths of the sequences, with the handles. """
+        return np.array([len(s) for s in self.seq], dtype=np.int64)
+
+    def to_csv(self, file_name, delimiter=','):
+        """ Writes all columns with a header line. """
+        columns = self.columns()
+        with open(file_name, 'w', newline='', buffering=BUFFER_SIZE) as f:
+            writer = csv.writer(f, delimiter=delimiter, lineterminator='\n')
+            writer.writerow(list(columns))
+            writer.writerows(zip(*[column.tolist() if isinstance(column, np.ndarray) else column
+                                   for column in columns.values()]))
+
+    def to_tsv(self, file_name):
+        self.to_csv(file_name, delimiter='\t')
+
+    def to_columnar(self, file_name):
+        """
+        Writes the table as an uncompressed .npz with one array per column, the
+        sequences and colors as one uint8 array with offsets. See read_columnar.
+        """
+        arrays = dict((name, getattr(self, name)) for name in COLUMNS[1:-1])
+        arrays['seq_codes'], arrays['seq_offsets'] = sequences.encode(self.seq)
+        if self.color is not None:
+            arrays['color_names'] = np.array(json.dumps(self.color))
+        with open(file_name, 'wb') as f:
+            np.savez(f, **arrays)
+
+    def to_parquet(self, file_name):
+        """ Writes the table as a Parquet file, this needs pyarrow. """
+        if pyarrow is None:
+            raise ImportError('to_parquet needs pyarrow, use to_columnar for an .npz without it.')
+        columns = self.columns()
+        pyarrow.parquet.write_table(pyarrow.table(dict((name, pyarrow.array(column))
+                                                       for name, column in columns.items())), file_name)
+
+    def plate_wells(self, wells=96, order='column'):
+        """
+        Returns the plate number (from 1) and well name (e.g. 'A1') of every row.
+
+        Parameters
+        ----------
+        wells : int
+            96 or 384
+        order : str
+            'column' fills A1, B1, ..., 'row' fills A1, A2, ...
+        """
+        if wells not in PLATE_SHAPES:
+            raise ValueError('Plates have %s wells.' % ' or '.join(str(size) for size in sorted(PLATE_SHAPES)))
+        if order not in ('column', 'row'):
+            raise ValueError("order must be 'column' or 'row'.")
+        num_rows, num_columns = PLATE_SHAPES[wells]
+        plates, positions = np.divmod(np.arange(len(self)), wells)
+        if order == 'column':
+            columns, rows = np.divmod(positions, num_rows)
+        else:
+            rows, columns = np.divmod(positions, num_columns)
+        row_names = np.array([chr(ord('A') + row) for row in range(num_rows)])
+        return plates + 1, [row + str(column) for row, column in zip(row_names[rows].tolist(), (columns + 1).tolist())]
+
+    def to_plates(self, file_name, wells=96, order='column', plate_prefix='Plate ', name_prefix='stap'):
+        """
+        Writes an order sheet with the columns Plate Name, Well Position, Name and Sequence.
+
+        Strands are named <name_prefix>_<start_helix>_<start_base>, with the color if there is one.
+        """
+        plates, well_names = self.plate_wells(wells, order)
+        names = ['%s_%d_%d' % (name_prefix, helix, base)
+                 for helix, base in zip(self.start_helix.tolist(), self.start_base.tolist())]
+        if self.color is not None:
+            names = [name + '_' + color.replace(' ', '_') for name, color in zip(names, self.color)]
+        with open(file_name, 'w', newline='', buffering=BUFFER_SIZE) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['Plate Name', 'Well Position', 'Name', 'Sequence'])
+            writer.writerows(zip([plate_prefix + str(plate) for plate in plates.tolist()], well_names, names, self.seq))
+
+
+def read_columnar(file_name):
+    """ Reads a table that was written with StrandTable.to_columnar. """
+    with np.load(file_name, allow_pickle=False) as arrays:
+        color = json.loads(str(arrays['color_names'])) if 'color_names' in arrays else None
+        return StrandTable(sequences.decode(arrays['seq_codes'], arrays['seq_offsets']), arrays['start_helix'],
+                           arrays['start_base'], arrays['end_helix'], arrays['end_base'], color,
+                           arrays['length'] if 'length' in arrays else None)
+
+
+def as_table(rows):
+    """ Returns rows as a StrandTable, a StrandTable is returned as it is. """
+    return rows if isinstance(rows, StrandTable) else StrandTable.from_rows(rows)
@@ -0,0 +1,46 @@
+import numpy as np
+
+import coloring
+import edits
+import synthetic
+import validate
+from autobreak import auto_break
+from strands import StrandIndex
+
+
+def nucleotides(design, path):
+    return int((1 + design.skip.astype(np.int64) + design.loop).ravel()[path].sum())
+
+
+def test_pieces_validate_and_fit_the_window():
+    design = synthetic.lattice_design(4, 6, 672)
+    design.skip[:, 100:600:48] = -1
+    breaks, unbroken = auto_break(design, 21, 60, 42)
+    assert len(breaks)
+    assert validate.find_problems(design) == {}
+    strands = design.strands('stap')
+    for key in strands.keys(circular=False):
+        length = nucleotides(design, strands.paths[key])
+        assert 21 <= length <= 60 or tuple(strands.pointer(key)) in unbroken
+
+
+def test_pieces_keep_the_color_of_their_staple():
+    design = synthetic.lattice_design(4, 6, 672)
+    # Without the breaks of lattice_design the rings of staple crossovers between neighbouring helices
+    # are circular, their pieces turn grey.
+    for parity in (0, 1):
+        helix_nums = [meta['num'] for meta in design.meta if (meta['row'] + meta['col']) % 2 == parity]
+        edits.join_staples(design, helix_nums, synthetic.staple_break_bases('square', parity, 48, 622))
+    before = coloring.StapleColors(design, reset=True)
+    before.set(None, coloring.cycle(np.arange(len(before))))
+    before.apply()
+    original = StrandIndex(design, 'stap')
+    assert original.circular
+    color_of = dict(zip(original.keys(circular=False), before.colors.tolist()))
+    auto_break(design, 21, 60, 42)
+    after = coloring.StapleColors(design)
+    keys = after.vstrand_nums * design.num_bases + after.base_nums
+    assert after.colors.tolist() == [color_of.get(int(original.strand_of[key]), coloring.GREY)
+                                     for key in keys.tolist()]
+    assert validate.find_problems(design) == {}
+
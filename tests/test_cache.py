@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+import cache
+import lattice
+import synthetic
+
+
+def saved_design(directory, num_bases=672):
+    """ Saves a 2 x 3 block, 672 bases are a multiple of 32 and 21, so it loads as square by default. """
+    file_name = str(directory.join('block.json'))
+    synthetic.lattice_design(2, 3, num_bases).save(file_name)
+    return file_name
+
+
+def test_clear_cache_next_to_the_design(tmpdir):
+    design_dir = tmpdir.mkdir('designs')
+    file_name = saved_design(design_dir)
+    cache.load_design(file_name)
+    assert os.path.exists(cache.cache_path(file_name))
+    with tmpdir.mkdir('elsewhere').as_cwd():
+        cache.clear_cache(file_name)
+    assert not os.path.exists(cache.cache_path(file_name))
+    assert cache.load_design(file_name).load_stats['cached'] is False
+
+
+def test_cached_load_uses_the_given_lattice(tmpdir):
+    file_name = saved_design(tmpdir)
+    cold = cache.load_design(file_name)
+    assert cold.lattice is lattice.SQUARE and cold.period == 32
+    warm = cache.load_design(file_name, lattice='honeycomb')
+    assert warm.load_stats['cached']
+    assert warm.lattice is lattice.HONEYCOMB and warm.period == 21
+    assert warm.polarity == dict(enumerate(warm.lattice_map.polarity.tolist()))
+    honeycomb = lattice.LatticeMap(lattice.HONEYCOMB, cold.lattice_map.rows, cold.lattice_map.cols)
+    np.testing.assert_array_equal(warm.lattice_map.neighbors, honeycomb.neighbors)
+    assert cache.load_design(file_name, period=48).period == 48
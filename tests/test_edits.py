@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+import coloring
+import edits
+import validate
+from design import Design
+
+SQUARE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'square.json')
+
+
+
+def colored_square():
+    design = Design.load(SQUARE)
+    staple_colors = coloring.StapleColors(design, reset=True)
+    staple_colors.set(None, coloring.cycle(np.arange(len(staple_colors))))
+    staple_colors.apply()
+    return design
+
+
+
+def color_at(design, helix_num, base_num):
+    rows = design.helix_colors(design.idx[helix_num])
+    return rows[rows[:, 0] == base_num, 1].tolist()
+
+
+
+@pytest.mark.parametrize('base_num, removed, new_start', [
+    # The segment 50..63 of helix 4 leaves to helix 3 at 63, the staple continues at 49.
+    (50, (50, 63), (4, 49)),
+    # The segment 108..111 holds the 5' end at 111, the staple continues at 107.
+    (108, (108, 111), (4, 107))])
+def test_remove_staples_stops_at_crossovers(base_num, removed, new_start):
+    design = colored_square()
+    strands = design.strands('stap')
+    key = int(strands.strand_of[design.idx[4] * design.num_bases + base_num])
+    color = color_at(design, *strands.pointer(key))
+    num_empty = (design.stap == -1).all(axis=2).sum()
+    edits.remove_staples(design, [4], [base_num])
+    assert (design.stap[design.idx[4], removed[0]:removed[1] + 1] == -1).all()
+    assert (design.stap == -1).all(axis=2).sum() == num_empty + removed[1] - removed[0] + 1
+    assert validate.validate(design) == []
+    assert color_at(design, *new_start) == color
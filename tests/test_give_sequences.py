@@ -0,0 +1,63 @@
+"""
+give_sequences and print_sequences against stored output.
+
+tests/data/square.json and honeycomb.json are synthetic.lattice_design blocks
+with staple and scaffold breaks, skips, loops and colors by helix. The expected
+*.txt outputs were printed by give_sequences and print_sequences of the original
+assign_sequences.py, with library() and scaffold_seq() below as seq_dc and
+maxiscaf_seq, loops of 2 bases at the scaffold crossovers on the square lattice
+points and no loop after [0, 111].
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import instrumentation
+import synthetic
+from session import DesignSession
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+NO_LOOP_EXCEPTIONS = [[0, 111]]
+
+
+def library(max_length=400, num=4):
+    """ Returns num random sequences of every length up to max_length. """
+    rng = np.random.RandomState(1)
+    return dict((length, [''.join(np.array(list('ACGT'))[rng.randint(0, 4, length)]) for _ in range(num)])
+                for length in range(1, max_length))
+
+
+def scaffold_seq(length=2000):
+    return ''.join(np.array(list('ACGT'))[np.random.RandomState(0).randint(0, 4, length)])
+
+
+@pytest.mark.parametrize('name', ['square', 'honeycomb'])
+def test_output_matches_stored_output(name, tmpdir, capsys):
+    design_session = DesignSession.load(os.path.join(DATA, name + '.json'), cache_dir=str(tmpdir),
+                                        no_loop_exceptions=NO_LOOP_EXCEPTIONS, seq_library=library(),
+                                        scaffold_seq=scaffold_seq(), scaffold_name='scaffold.txt')
+    design_session.give_sequences()
+    design_session.print_sequences()
+    with open(os.path.join(DATA, name + '.txt')) as f:
+        expected = f.read().replace('DATA', DATA)
+    assert capsys.readouterr().out == expected
+
+
+def test_circular_scaffold_is_left_out(capsys):
+    design = synthetic.lattice_design(1, 2, 64)
+    # Close the scaffold into a ring, like the ring of staples it pairs with.
+    design.scaf[1, 16, 2:] = [0, 16]
+    design.scaf[0, 16, :2] = [1, 16]
+    design.edited('scaf', [1, 0], [16, 16])
+    design_session = DesignSession(design, seq_library=library(), scaffold_seq=scaffold_seq(),
+                                   scaffold_name='scaffold.txt')
+    assert len(design_session.scaf_layout()[3]) == 0
+    scaf_table = design_session.give_sequences()[0]
+    assert len(scaf_table) == 0
+    assert 'circular' not in capsys.readouterr().out
+    with instrumentation.recording(allocations=False) as recorder:
+        design_session.give_sequences()
+    assert recorder.totals['circular scaf strands left out'] == 1
+    assert 'Warning: circular scaf strand through [0, 16]' in capsys.readouterr().out
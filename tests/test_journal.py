@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import coloring
+import edits
+import synthetic
+from journal import BASE_ARRAYS, Journal
+from strands import StrandIndex
+
+
+def snapshot(design):
+    arrays = dict((key, getattr(design, key).copy()) for key in BASE_ARRAYS)
+    arrays['stap_colors'], arrays['color_offsets'] = design.stap_colors.copy(), design.color_offsets.copy()
+    return arrays
+
+
+def assert_state(design, arrays):
+    for key, array in arrays.items():
+        np.testing.assert_array_equal(getattr(design, key), array)
+
+
+def color_by_helix(design):
+    staple_colors = coloring.StapleColors(design, reset=True)
+    staple_colors.set(None, coloring.cycle(staple_colors.helix_nums))
+    staple_colors.apply()
+
+
+def test_undo_redo_and_checkout_restore_the_design():
+    design = synthetic.lattice_design(3, 4, 256)
+    history = Journal(design)
+    start = snapshot(design)
+    edits.insert_breaks(design, [0, 1, 2, 5], [40, 72, 104])
+    edits.insert_deletions(design, [20, 148])
+    color_by_helix(design)
+    history.commit('breaks')
+    history.checkpoint('with breaks')
+    breaks = snapshot(design)
+    history.undo()
+    assert_state(design, start)
+    edits.remove_staples(design, [1, 6], [50, 90])
+    history.commit('removed')
+    removed = snapshot(design)
+    history.checkout('with breaks')
+    assert_state(design, breaks)
+    assert design.strands('stap').paths == StrandIndex(design, 'stap').paths
+    history.checkout(history.entries[0].children[1])
+    assert_state(design, removed)
+    assert history.undo() == 'removed'
+    assert history.redo() == 'removed'
+    assert_state(design, removed)
+
+
+def test_entries_hold_only_the_edited_bases():
+    design = synthetic.lattice_design(3, 4, 256)
+    history = Journal(design)
+    assert history.commit('nothing') == 0 and len(history.entries) == 1
+    edits.insert_breaks(design, [0], [52])
+    # Breaking the broken staple again changes nothing.
+    edits.insert_breaks(design, [0], [52])
+    entry = history.entries[history.commit('break')]
+    assert sorted(entry.changes) == ['stap']
+    assert (entry.changes['stap'][0] // design.num_bases).tolist() == [0, 0]
+    assert (entry.changes['stap'][0] % design.num_bases).tolist() == [52, 53]
+    edits.insert_breaks(design, [0], [52])
+    assert not history.pending()
+    assert history.commit('again') == 1
+
+
+def test_transaction_rolls_back_when_it_raises():
+    design = synthetic.lattice_design(3, 4, 256)
+    history = Journal(design)
+    design.strands('stap')
+    start = snapshot(design)
+    with pytest.raises(IndexError):
+        with history.transaction('breaks'):
+            edits.insert_breaks(design, [0, 1], [40, 72])
+            color_by_helix(design)
+            edits.insert_breaks(design, [2], [300])
+    assert_state(design, start)
+    assert len(history.entries) == 1
+    assert design.strands('stap').paths == StrandIndex(design, 'stap').paths
+
+
+def test_helix_writes_are_journaled():
+    design = synthetic.lattice_design(1, 2, 64)
+    history = Journal(design)
+    start = snapshot(design)
+    design[0]['skip'] = -1
+    with design.editing('loop', 1, [3, 4]):
+        design.loop[1, 3:5] = 2
+    history.commit('skips and loops')
+    assert history.entries[1].num_bases() == 66
+    history.undo()
+    assert_state(design, start)
@@ -0,0 +1,22 @@
+import numpy as np
+
+import analytics
+import rotations
+
+
+def test_tm_spread_is_the_nearest_neighbor_tm_of_the_staples():
+    rng = np.random.RandomState(2)
+    scaffold_seq = ''.join(np.array(list('ACGT'))[rng.randint(0, 4, 300)])
+    # Three staples, the second has three domains and the last ends at the end of the sequence.
+    starts = np.array([0, 40, 70, 110, 150, 270])
+    stops = np.array([32, 56, 78, 126, 181, 300])
+    staples = np.array([0, 1, 1, 1, 2, 3])
+    scores = rotations.scan_rotations(scaffold_seq, starts, stops, staples, max_elements=50)
+    twice = scaffold_seq * 2
+    for rotation in [0, 1, 17, 299]:
+        staple_seqs = [''.join(twice[rotation + start:rotation + stop] for start, stop in
+                               zip(starts[staples == staple], stops[staples == staple])) for staple in range(4)]
+        tm = analytics.sequence_metrics(staple_seqs)['tm']
+        assert np.isclose(scores['tm_spread'][rotation], tm.std())
+        gc = analytics.sequence_metrics(staple_seqs)['gc']
+        assert np.isclose(scores['gc_min'][rotation], gc.min()) and np.isclose(scores['gc_max'][rotation], gc.max())
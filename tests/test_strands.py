@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import edits
+import synthetic
+from strands import StrandIndex
+
+
+def assert_same_strands(design, parity):
+    """ The locally updated index of design must equal a fresh trace. """
+    updated, traced = design.strands(parity), StrandIndex(design, parity)
+    assert updated.paths == traced.paths
+    assert updated.circular == traced.circular
+    np.testing.assert_array_equal(updated.strand_of, traced.strand_of)
+
+
+def test_update_matches_fresh_trace():
+    design = synthetic.lattice_design(3, 4, 256)
+    design.strands('stap'), design.strands('scaf')
+    edits.insert_breaks(design, [0, 1, 2, 5], [40, 72, 104])
+    assert_same_strands(design, 'stap')
+    edits.join_staples(design, [0, 5], [72])
+    assert_same_strands(design, 'stap')
+    # The staple of helix 0 leaves it through its next pointer at base 32 to its neighbour.
+    assert design.stap[0, 32, 2] != 0
+    edits.remove_crossovers(design, [0], [32], 'left')
+    assert_same_strands(design, 'stap')
+    edits.remove_staples(design, [1, 6], [50, 90])
+    assert_same_strands(design, 'stap')
+    edits.insert_breaks(design, [0, 1, 3], [40, 60], 'scaf')
+    assert_same_strands(design, 'scaf')
+    assert len(design.strands('scaf').paths) == 7
+
+
+def test_circular_strand():
+    design = synthetic.lattice_design(1, 2, 64)
+    scaf = design.strands('scaf')
+    assert len(scaf.paths) == 1 and not scaf.circular
+    # Close the scaffold: its 3' end on helix 1 at base 16 links to its 5' end on helix 0.
+    design.scaf[1, 16, 2:] = [0, 16]
+    design.scaf[0, 16, :2] = [1, 16]
+    design.edited('scaf', [1, 0], [16, 16])
+    assert scaf.circular == {16}
+    assert scaf.lengths().tolist() == [64]
+    assert scaf.starts() == []
+    assert_same_strands(design, 'scaf')
+
+
+def test_non_reciprocal_pointers_are_rejected():
+    design = synthetic.lattice_design(1, 2, 64)
+    design.stap[0, 30, 2:] = [1, 30]
+    with pytest.raises(ValueError, match='do not point back'):
+        StrandIndex(design, 'stap')
+
+
+def test_non_reciprocal_edit_drops_the_index():
+    design = synthetic.lattice_design(1, 2, 64)
+    design.strands('stap')
+    design.stap[0, 30, 2:] = [1, 30]
+    with pytest.raises(ValueError, match='do not point back'):
+        design.edited('stap', 0, 30)
+    assert 'stap' not in design._strands
+
+
+def test_vstrand_views_are_read_only_outside_editing():
+    design = synthetic.lattice_design(1, 2, 64)
+    with pytest.raises(ValueError, match='read-only'):
+        design[0]['stap'][30] = -1
+    with pytest.raises(ValueError, match='read-only'):
+        design[0]['stap_colors'][0, 1] = 0
+    design.strands('stap')
+    with design.editing('stap', [0, 0], [30, 31]):
+        design[0]['stap'][30, :2] = -1
+        design[0]['stap'][31, 2:] = -1
+    assert_same_strands(design, 'stap')
+
+
+def test_failed_editing_drops_the_index():
+    design = synthetic.lattice_design(1, 2, 64)
+    design.strands('stap')
+    with pytest.raises(RuntimeError):
+        with design.editing('stap', 0, 30):
+            design.stap[0, 30, :2] = -1
+            raise RuntimeError('interrupted')
+    assert 'stap' not in design._strands
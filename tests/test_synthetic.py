@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+import lattice as lattices
+import synthetic
+import validate
+from strands import StrandIndex
+
+
+@pytest.mark.parametrize('lattice, num_rows, num_cols, num_bases', [
+    ('square', 3, 4, 256), ('square', 3, 3, 256), ('honeycomb', 3, 4, 252), ('honeycomb', 1, 5, 252)])
+def test_lattice_design_has_legal_crossovers_and_broken_staples(lattice, num_rows, num_cols, num_bases):
+    design = synthetic.lattice_design(num_rows, num_cols, num_bases, lattice=lattice)
+    assert validate.validate(design) == []
+    assert not StrandIndex(design, 'stap').circular
+    scaffold = StrandIndex(design, 'scaf')
+    assert len(scaffold.paths) == 1 and not scaffold.circular
+    lattice_map = lattices.LatticeMap(lattices.get_lattice(lattice), *synthetic.snake_order(num_rows, num_cols))
+    next_helix = design.scaf[:, :, 2]
+    rows, bases = np.nonzero((next_helix != -1) & (next_helix != np.arange(design.num_helices)[:, None]))
+    assert len(rows) == design.num_helices - 1
+    # The scaffold leaves a helix with odd polarity at base + 1 of the crossover.
+    odd = lattice_map.odd[rows]
+    even, other = np.where(odd, rows + 1, rows), np.where(odd, rows, rows + 1)
+    assert lattice_map.scaffold_crossover(even, other, bases - odd).all()
+
+
+def test_honeycomb_with_odd_num_cols_is_rejected():
+    with pytest.raises(ValueError, match='not neighbours'):
+        synthetic.lattice_design(2, 3, 252, lattice='honeycomb')
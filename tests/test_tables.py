@@ -0,0 +1,50 @@
+import handles
+import tables
+from session import print_crosstalk
+
+
+def staple_table():
+    return tables.StrandTable(['ACGT', 'GGCCAA'], [0, 1], [7, 15], [0, 2], [0, 8], ['red', 'cyan'])
+
+
+def test_row_writes_go_to_the_columns():
+    table = staple_table()
+    for row in table:
+        if row[0] == 'cyan':
+            row[-1] += 'TT' + 'ACGTACGT'
+    assert table.seq == ['ACGT', 'GGCCAATTACGTACGT']
+    assert table[1][-1] == 'GGCCAATTACGTACGT'
+    row = table[0]
+    row[3] = [5, 12]
+    row[0] = 'blue'
+    assert row == ['blue', 4, [0, 7], [5, 12], 'ACGT']
+    assert table[0] == row
+    assert (table.end_helix.tolist(), table.end_base.tolist(), table.color) == ([5, 2], [12, 8], ['blue', 'cyan'])
+
+
+def test_row_writes_stay_in_their_table():
+    table = staple_table()
+    other = table.with_seq(table.seq)
+    other[0][2] = [3, 3]
+    assert table[0][2] == [0, 7]
+
+
+def test_handles_keep_the_designed_length(tmpdir):
+    table, handle_dc = handles.attach_handles(staple_table(), [{'color': 'cyan', 'handle': 'ACGTACGT', 'linker': 'TT'}])
+    assert table.seq[1] == 'GGCCAATTACGTACGT'
+    assert table.length.tolist() == [4, 6]
+    assert table.total_length().tolist() == [4, 16]
+    assert table.take([1, 0]).length.tolist() == [6, 4]
+    file_name = str(tmpdir.join('staples.npz'))
+    table.to_columnar(file_name)
+    assert tables.read_columnar(file_name).length.tolist() == [4, 6]
+
+
+def test_handles_are_checked_against_the_designed_staples():
+    # The second handle is the complement of the first, each one matches the other but not its attached copy.
+    rules = [{'color': 'red', 'handle': 'GATTACAGGC'},
+             {'color': 'cyan', 'handle': 'GATTACAGGC', 'complement': True, 'orientation': "5'"}]
+    table, handle_dc = handles.attach_handles(staple_table(), rules)
+    hits = print_crosstalk(handle_dc, table, '')
+    assert sorted(hit[2] for hit in hits) == sorted(handle_dc)
+    assert print_crosstalk(handle_dc, staple_table(), '') == hits
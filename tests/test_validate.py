@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import synthetic
+import validate
+
+
+def test_synthetic_design_is_consistent():
+    assert validate.validate(synthetic.lattice_design(2, 2, 64)) == []
+
+
+@pytest.mark.parametrize('base_num', [64, -1])
+def test_color_row_outside_the_last_helix(base_num):
+    design = synthetic.lattice_design(2, 2, 64)
+    design.stap_colors[-1, 0] = base_num
+    problems = validate.find_problems(design)
+    np.testing.assert_array_equal(problems['bases have a stap_colors row outside the helix'], [[3, base_num]])
+    assert '1 bases have a stap_colors row outside the helix, at [3, %d]' % base_num in validate.validate(design)
+
+
+def test_color_row_before_the_first_helix():
+    design = synthetic.lattice_design(2, 2, 64)
+    design.stap_colors[0, 0] = -1
+    messages = validate.validate(design)
+    assert '1 bases have a stap_colors row outside the helix, at [0, -1]' in messages
+    assert '1 bases start a staple without a stap_colors row, at [0, 40]' in messages
@@ -0,0 +1,167 @@
+"""
+Consistency checks for a `Design`.
+
+Every check compares whole arrays, so a 100-helix design is validated in a few
+milliseconds and validate() can run after every batch of edits, e.g. after
+writing to vstrands[i]['stap'] by hand. A problem is reported with the
+[helix_num, base_num] of the bases where it was found.
+
+Checks
+------
+reciprocity : every prev/next pointer points into the design and back
+polarity : the scaf and stap of a helix run in the direction of its polarity,
+    crossovers connect helices of opposite polarity
+skip/loop : skip is 0 or -1, loop is 0 or more, never both on one base, only on bases with scaffold
+colors : every staple 5' end has a stap_colors row and every row belongs to a 5' end
+
+Example
+-------
+validate(design)
+>>>> ['2 stap bases point to a base that does not point back, at [6, 20], [6, 210]']
+"""
+
+import numpy as np
+
+import sequences
+
+MAX_EXAMPLES = 5
+
+
+def _flat(design, pointers):
+    """
+    Translates [helix_num, base_num] pointers to flat indices.
+
+    Returns
+    -------
+    flat : array_like
+        -1 where there is no pointer or it points outside the design
+    outside : array_like
+        True where a pointer points outside the design or is half -1
+    """
+    helix_nums = pointers[:, 0].astype(np.int64)
+    base_nums = pointers[:, 1].astype(np.int64)
+    linked = (helix_nums != -1) | (base_nums != -1)
+    vstrand_of_num = np.full(max(max(design.idx) + 1 if design.idx else 1, 1), -1, dtype=np.int64)
+    vstrand_of_num[list(design.idx)] = list(design.idx.values())
+    known = (helix_nums >= 0) & (helix_nums < len(vstrand_of_num)) & (base_nums >= 0) & (base_nums < design.num_bases)
+    vstrand_nums = np.where(known, vstrand_of_num[np.where(known, helix_nums, 0)], -1)
+    inside = linked & (vstrand_nums != -1)
+    return np.where(inside, vstrand_nums * design.num_bases + base_nums, -1), linked & ~inside
+
+
+def strand_problems(design, parity):
+    """
+    Returns the flat indices of the bases with reciprocity and polarity problems of 'scaf' or 'stap'.
+
+    Returns
+    -------
+    problems : dict
+        maps a description to an array of flat indices
+    """
+    pointers = getattr(design, parity).reshape(-1, 4)
+    prev_flat, prev_outside = _flat(design, pointers[:, :2])
+    next_flat, next_outside = _flat(design, pointers[:, 2:])
+    flat = np.arange(len(prev_flat))
+    has_prev, has_next = prev_flat != -1, next_flat != -1
+    problems = {'point outside the design': np.flatnonzero(prev_outside | next_outside),
+                'point to a base that does not point back':
+                    np.flatnonzero((has_next & (prev_flat[np.where(has_next, next_flat, 0)] != flat)) |
+                                   (has_prev & (next_flat[np.where(has_prev, prev_flat, 0)] != flat)))}
+    # On a helix with even polarity the scaffold runs to higher bases and the staples to lower bases.
+    odd = design.lattice_map.odd
+    forward = ~odd == (parity == 'scaf')
+    vstrand_nums = flat // design.num_bases
+    target_vstrands = next_flat // design.num_bases
+    same_helix = has_next & (target_vstrands == vstrand_nums)
+    step = next_flat - flat
+    problems['run against the polarity of their helix'] = np.flatnonzero(
+        same_helix & (np.abs(step) == 1) & (step != np.where(forward[vstrand_nums], 1, -1)))
+    problems['cross over to a helix with the same polarity'] = np.flatnonzero(
+        has_next & ~same_helix & (odd[vstrand_nums] == odd[np.where(has_next, target_vstrands, 0)]))
+    return problems
+
+
+def skip_loop_problems(design):
+    """ Returns the flat indices of the bases with impossible skip or loop values, see strand_problems. """
+    skip, loop = design.skip.ravel(), design.loop.ravel()
+    no_scaffold = (design.scaf.reshape(-1, 4) == -1).all(axis=1)
+    return {'have a skip other than 0 or -1': np.flatnonzero((skip != 0) & (skip != -1)),
+            'have a negative loop': np.flatnonzero(loop < 0),
+            'have both a skip and a loop': np.flatnonzero((skip != 0) & (loop != 0)),
+            'have a skip or loop but no scaffold': np.flatnonzero(((skip != 0) | (loop != 0)) & no_scaffold)}
+
+
+def color_problems(design):
+    """
+    Returns the flat indices of the staple ends and stap_colors rows that do not match, see strand_problems.
+    Rows with a base outside the helix have no flat index, they are given as [vstrand_num, base_num] rows.
+    """
+    offsets = np.asarray(design.color_offsets, dtype=np.int64)
+    if (len(offsets) != design.num_helices + 1 or offsets[0] != 0 or (np.diff(offsets) < 0).any()
+            or offsets[-1] != len(design.stap_colors)):
+        raise ValueError('The color offsets do not match the %d stap_colors rows.' % len(design.stap_colors))
+    base_nums = design.stap_colors[:, 0].astype(np.int64)
+    vstrand_nums = sequences.segment_ids(offsets)
+    outside = (base_nums < 0) | (base_nums >= design.num_bases)
+    color_keys = (vstrand_nums * design.num_bases + base_nums)[~outside]
+    # The 5' ends of the staples, the same bases as findStaples() but without tracing the strands.
+    stap = design.stap.reshape(-1, 4)
+    ends = np.flatnonzero((stap[:, :2] == -1).all(axis=1) & (stap[:, 2:] != -1).any(axis=1))
+    colored = np.isin(ends, color_keys)
+    doubled = np.zeros(len(color_keys), dtype=bool)
+    order = np.argsort(color_keys, kind='stable')
+    doubled[order[1:]] = color_keys[order[1:]] == color_keys[order[:-1]]
+    return {'start a staple without a stap_colors row': ends[~colored],
+            'have a stap_colors row but no staple start': color_keys[~np.isin(color_keys, ends)],
+            'have more than one stap_colors row': color_keys[doubled],
+            'have a stap_colors row outside the helix': np.column_stack([vstrand_nums[outside], base_nums[outside]])}
+
+
+def find_problems(design):
+    """
+    Runs all checks.
+
+    Returns
+    -------
+    problems : dict
+        maps a description, e.g. 'stap bases point outside the design', to an array
+        of flat indices, or of [vstrand_num, base_num] rows for bases outside the helices,
+        only problems that were found are included
+    """
+    problems = {}
+    for parity in ('scaf', 'stap'):
+        for description, flat in strand_problems(design, parity).items():
+            problems['%s bases %s' % (parity, description)] = flat
+    for description, flat in skip_loop_problems(design).items():
+        problems['bases ' + description] = flat
+    for description, flat in color_problems(design).items():
+        problems['bases ' + description] = flat
+    return dict((description, flat) for description, flat in problems.items() if len(flat))
+
+
+def validate(design, raise_error=False):
+    """
+    Checks a design and returns one message per problem, an empty list for a consistent design.
+
+    Parameters
+    ----------
+    design : Design
+    raise_error : bool
+        Use raise_error=True to raise a ValueError with all messages instead.
+    """
+    helix_nums = np.array([design.helix_num(vstrand_num) for vstrand_num in range(design.num_helices)], dtype=np.int64)
+    messages = []
+    for description, flat in find_problems(design).items():
+        if flat.ndim == 2:
+            pointers = np.unique(flat, axis=0)
+        else:
+            flat = np.unique(flat)
+            pointers = np.column_stack([flat // design.num_bases, flat % design.num_bases])
+        shown = pointers[:MAX_EXAMPLES]
+        examples = ', '.join('[%d, %d]' % pointer for pointer in zip(helix_nums[shown[:, 0]].tolist(),
+                                                                    shown[:, 1].tolist()))
+        more = ', ...' if len(pointers) > MAX_EXAMPLES else ''
+        messages.append('%d %s, at %s%s' % (len(pointers), description, examples, more))
+    if raise_error and messages:
+        raise ValueError('The design is not consistent:\n' + '\n'.join(messages))
+    return messages